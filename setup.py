@@ -18,6 +18,7 @@ METADATA = {
 
 # Basic/common package dependencies
 REQUIRES = [
+    "defusedxml",
     "dj-database-url",
     "django~=2.2.10",
     "django-fas",
@@ -60,7 +60,6 @@ Requires:          python3-requests
 Requires:          python3-whitenoise
 Requires:          rpm-build
 Requires:          rsync-daemon
-Requires:          yum-utils
 Requires:          MTA
 # systemd
 Requires:            systemd
@@ -122,6 +121,7 @@ install -p -d -m 0775 htdocs/media \
     %{buildroot}%{scls_statedir}/htdocs/media
 install -p -d -m 0775 htdocs/repos \
     %{buildroot}%{scls_statedir}/htdocs/repos
+install -p -d -m 0775 %{buildroot}%{scls_statedir}/cache
 
 # install separate directory for sqlite db
 install -p -d -m 0775 db \
@@ -139,6 +139,10 @@ install -p -D -m 0644 conf/rsyncd/rsyncd.conf \
 install -p -D -m 0644 conf/rsyncd/softwarecollections-rsyncd.service \
     %{buildroot}%{_unitdir}/softwarecollections-rsyncd.service
 
+# install softwarecollections-syncd.service
+install -p -D -m 0644 conf/syncd/softwarecollections-syncd.service \
+    %{buildroot}%{_unitdir}/softwarecollections-syncd.service
+
 # create ghost secret_key
 touch %{buildroot}%{scls_statedir}/secret_key
 
@@ -157,7 +161,7 @@ touch %{buildroot}%{scls_statedir}/secret_key
 
 %post
 # systemd
-%systemd_post softwarecollections-rsyncd.service
+%systemd_post softwarecollections-rsyncd.service softwarecollections-syncd.service
 
 # create secret key
 test -e %{secret_key} || (
@@ -204,10 +208,10 @@ service httpd condrestart
 
 
 %preun
-%systemd_preun softwarecollections-rsyncd.service
+%systemd_preun softwarecollections-rsyncd.service softwarecollections-syncd.service
 
 %postun
-%systemd_postun_with_restart softwarecollections-rsyncd.service
+%systemd_postun_with_restart softwarecollections-rsyncd.service softwarecollections-syncd.service
 
 
 
@@ -224,10 +228,12 @@ service httpd condrestart
 %config(noreplace) %{_sysconfdir}/sysconfig/%{name}.env
 %{_unitdir}/httpd.service.d/%{name}-environment.override.conf
 %{_unitdir}/softwarecollections-rsyncd.service
+%{_unitdir}/softwarecollections-syncd.service
 %{scls_statedir}/htdocs/wsgi.py*
 %attr(755,root,root) %dir %{scls_statedir}/htdocs/static
 %attr(775,root,%{group_name}) %dir %{scls_statedir}/htdocs/repos
 %attr(775,root,%{group_name}) %dir %{scls_statedir}/htdocs/media
+%attr(775,root,%{group_name}) %dir %{scls_statedir}/cache
 %attr(750,postgres,%{group_name}) %dir %{scls_statedir}/db
 %ghost %{scls_statedir}/secret_key
 
@@ -1,30 +1,138 @@
-import requests
+import copy
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+import requests
 from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 COPR_API_URL = getattr(settings, 'COPR_API_URL', 'http://copr-fe.cloud.fedoraproject.org/api')
+# timeouts (connect, read) in seconds for each request
+COPR_API_TIMEOUT = getattr(settings, 'COPR_API_TIMEOUT', (5, 30))
+# number of retries of failed requests (with exponential backoff)
+COPR_API_RETRIES = getattr(settings, 'COPR_API_RETRIES', 3)
+# number of concurrent requests in batch calls
+COPR_API_WORKERS = getattr(settings, 'COPR_API_WORKERS', 8)
+# number of responses remembered for conditional requests
+CONDITIONAL_CACHE_SIZE = 1024
+# time in seconds for which cached responses are considered fresh
+COPR_CACHE_TTL = getattr(settings, 'COPR_CACHE_TTL', 300)
+# time in seconds for which expired responses are served while being refreshed
+COPR_CACHE_STALE = getattr(settings, 'COPR_CACHE_STALE', 86400)
+# time in seconds for which missing coprs (404) are remembered
+COPR_CACHE_NEGATIVE_TTL = getattr(settings, 'COPR_CACHE_NEGATIVE_TTL', 60)
+# time in seconds after which a stuck background refresh may be retried
+REFRESH_TIMEOUT = 300
+
+logger = logging.getLogger(__name__)
 
 
 class CoprException(Exception):
     pass
 
 
+class CoprNotFound(CoprException):
+    pass
+
+
+def create_session(retries=COPR_API_RETRIES, pool_size=COPR_API_WORKERS):
+    """ create HTTP session with keep-alive connection pool and retries """
+    retry = Retry(
+        total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    return HTTP session shared by all proxies in this process
+    (pooled connections must not be shared with forked processes)
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = create_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+class ConditionalCache:
+    """ remembers validators of recent responses to make conditional requests """
+
+    def __init__(self, size=CONDITIONAL_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                self.entries.move_to_end(url)
+            return entry
+
+    def set(self, url, etag, last_modified, data):
+        with self.lock:
+            self.entries[url] = (etag, last_modified, data)
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+_conditional_cache = ConditionalCache()
+
+
 class CoprProxy:
-    def __init__(self, copr_url=COPR_API_URL):
+    def __init__(self, copr_url=COPR_API_URL, session=None, timeout=COPR_API_TIMEOUT):
         self.copr_url = copr_url[-1] == '/' and copr_url[:-1] or copr_url
+        self.session = session or get_session()
+        self.timeout = timeout
 
     def _get(self, path):
-        response = requests.get(self.copr_url + path)
+        url = self.copr_url + path
+        headers = {}
+        cached = _conditional_cache.get(url)
+        if cached:
+            etag, last_modified, data = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            return copy.deepcopy(data)
+        if response.status_code == 404:
+            raise CoprNotFound('Not found: {}'.format(url))
         if response.status_code != 200:
             response.raise_for_status()
-        return json.loads(response.text)
+        data = json.loads(response.text)
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if etag or last_modified:
+            _conditional_cache.set(url, etag, last_modified, copy.deepcopy(data))
+        return data
 
     def coprnames(self, username):
         """ return list of copr names """
         try:
             data = self._get('/coprs/{}/'.format(username))
             return [copr['name'] for copr in data['repos']]
+        except CoprNotFound:
+            raise
         except Exception as e:
             raise CoprException('Failed to get copr names: {}'.format(e))
 
@@ -34,6 +142,89 @@ class CoprProxy:
             data = self._get('/coprs/{}/{}/detail/'.format(username, coprname))
             data['detail']['username'] = username
             return data['detail']
+        except CoprNotFound:
+            raise
         except Exception as e:
             raise CoprException('Failed to get copr detail: {}'.format(e))
 
+    def coprdetails(self, coprs, max_workers=COPR_API_WORKERS):
+        """
+        return details of many coprs fetched concurrently
+        as a dict indexed by (username, coprname) pairs,
+        coprs, which failed to be fetched, are logged and left out
+        """
+        def fetch(copr):
+            try:
+                return copr, self.coprdetail(*copr)
+            except CoprException as e:
+                logger.warning('{}/{}: {}'.format(copr[0], copr[1], e))
+                return copr, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(
+                (copr, detail)
+                for copr, detail in executor.map(fetch, set(coprs))
+                if detail is not None
+            )
+
+
+def run_in_background(func, *args):
+    thread = threading.Thread(target=func, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+class CachedCoprProxy(CoprProxy):
+    """
+    CoprProxy with responses shared through the configured django cache
+
+    Fresh responses are served from the cache, expired ones are served
+    while being refreshed in the background and missing coprs (404)
+    are remembered for a short time.
+    With fresh=True, the Copr API is always asked and the cache is updated.
+    """
+
+    def __init__(self, *args, fresh=False, **kwargs):
+        super(CachedCoprProxy, self).__init__(*args, **kwargs)
+        self.fresh = fresh
+
+    def _cache_key(self, path):
+        return 'copr:' + hashlib.sha1((self.copr_url + path).encode('utf-8')).hexdigest()
+
+    def _get(self, path):
+        key = self._cache_key(path)
+        if not self.fresh:
+            entry = cache.get(key)
+            if entry is not None:
+                expires, data = entry
+                if expires < time.time():
+                    self._revalidate(path, key)
+                if data is None:
+                    raise CoprNotFound('Not found: {}'.format(self.copr_url + path))
+                return data
+        return self._fetch(path, key)
+
+    def _fetch(self, path, key):
+        try:
+            data = super(CachedCoprProxy, self)._get(path)
+        except CoprNotFound:
+            cache.set(key, (time.time() + COPR_CACHE_NEGATIVE_TTL, None), COPR_CACHE_NEGATIVE_TTL)
+            raise
+        cache.set(key, (time.time() + COPR_CACHE_TTL, data), COPR_CACHE_TTL + COPR_CACHE_STALE)
+        return data
+
+    def _revalidate(self, path, key):
+        # only one process refreshes the expired response,
+        # the flag expires by itself if the refreshing process dies
+        if cache.add(key + ':refresh', True, REFRESH_TIMEOUT):
+            run_in_background(self._refresh, path, key)
+
+    def _refresh(self, path, key):
+        try:
+            self._fetch(path, key)
+        except CoprNotFound:
+            pass
+        except Exception as e:
+            logger.warning('Failed to refresh {}: {}'.format(path, e))
+        finally:
+            cache.delete(key + ':refresh')
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.translation import ungettext, ugettext as _
-from .models import SoftwareCollection, OtherRepo, Repo, Score
+from .models import SoftwareCollection, OtherRepo, Repo, Score, DownloadStat, SyncRequest, SYNC_PRIORITY_USER
 
 class SoftwareCollectionAdmin(admin.ModelAdmin):
     list_display = ('slug', 'get_title_tag', 'get_copr_tags', 'review_req', 'approved', 'auto_sync', 'need_sync', 'last_synced', 'last_modified')
@@ -20,6 +20,7 @@ class SoftwareCollectionAdmin(admin.ModelAdmin):
 
     def request_sync(self, request, queryset):
         rows_updated = queryset.update(need_sync = True)
+        SyncRequest.enqueue(queryset.values_list('id', flat=True), SYNC_PRIORITY_USER)
         self.message_user(request, ungettext(
             'Sync was requested for %(count)d collection',
             'Sync was requested for %(count)d collections',
@@ -31,3 +32,12 @@ admin.site.register(OtherRepo)
 admin.site.register(SoftwareCollection, SoftwareCollectionAdmin)
 admin.site.register(Repo)
 admin.site.register(Score)
+admin.site.register(DownloadStat)
+
+
+class SyncRequestAdmin(admin.ModelAdmin):
+    list_display = ('scl', 'priority', 'requested')
+    list_filter  = ('priority',)
+    ordering     = ('priority', 'requested')
+
+admin.site.register(SyncRequest, SyncRequestAdmin)
@@ -0,0 +1,125 @@
+"""Buffered download statistics
+
+Instead of writing to the database on each download, the download view
+appends a line with the repo id and the date to a local buffer file.
+The buffer is periodically aggregated by the `scldownloads` command
+into per-repo per-day counters and the download counters of repos and collections.
+"""
+
+import os
+import time
+from collections import Counter
+from datetime import date, datetime
+from glob import escape, glob
+from typing import Dict, Iterable, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from flock import LOCK_EX, Flock
+
+from .models import DownloadStat, Repo, SoftwareCollection
+
+# Time in seconds to let writers, which opened the buffer before it was rotated, finish
+GRACE_PERIOD = 1.0
+
+Key = Tuple[int, date]  # (repo id, day of download)
+
+
+def record(path: str, repo_id: int) -> None:
+    """Append download event to the buffer.
+
+    A single short write to a file opened with O_APPEND is atomic,
+    so the buffer may be shared by all web workers without locking.
+
+    Arguments:
+        path: Path to the buffer file.
+        repo_id: Id of the downloaded repo.
+    """
+
+    line = "{} {}\n".format(repo_id, timezone.localdate().isoformat()).encode("ascii")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def aggregate(lines: Iterable[str]) -> Dict[Key, int]:
+    """Count download events per repo and day; malformed lines are ignored."""
+
+    counts = Counter()
+    for line in lines:
+        try:
+            repo_id, day = line.split()
+            counts[(int(repo_id), datetime.strptime(day, "%Y-%m-%d").date())] += 1
+        except ValueError:
+            continue
+    return counts
+
+
+def store(counts: Dict[Key, int]) -> int:
+    """Add aggregated downloads to per-day statistics and download counters.
+
+    Arguments:
+        counts: Number of downloads indexed by (repo id, date).
+
+    Returns:
+        Number of stored downloads (events of deleted repos are dropped).
+    """
+
+    scl_ids = dict(
+        Repo.objects.filter(id__in={repo_id for repo_id, _ in counts}).values_list(
+            "id", "scl_id"
+        )
+    )
+    repo_totals, scl_totals = Counter(), Counter()
+    with transaction.atomic():
+        for (repo_id, day), count in sorted(counts.items()):
+            if repo_id not in scl_ids:
+                continue
+            updated = DownloadStat.objects.filter(repo_id=repo_id, date=day).update(
+                count=F("count") + count
+            )
+            if not updated:
+                DownloadStat.objects.create(repo_id=repo_id, date=day, count=count)
+            repo_totals[repo_id] += count
+            scl_totals[scl_ids[repo_id]] += count
+        for repo_id, count in repo_totals.items():
+            Repo.objects.filter(id=repo_id).update(download_count=F("download_count") + count)
+        for scl_id, count in scl_totals.items():
+            SoftwareCollection.objects.filter(id=scl_id).update(
+                download_count=F("download_count") + count
+            )
+    return sum(repo_totals.values())
+
+
+def flush(path: str, grace: float = GRACE_PERIOD) -> int:
+    """Aggregate the buffer into the database.
+
+    The buffer is rotated first, so that the web workers are never blocked.
+    Rotated files left by an interrupted run are processed as well.
+
+    Arguments:
+        path: Path to the buffer file.
+        grace: Time to wait for writers of the rotated buffer.
+
+    Returns:
+        Number of stored downloads.
+    """
+
+    with Flock(os.open(os.path.dirname(path) or ".", 0), LOCK_EX):
+        if os.path.exists(path):
+            os.rename(path, "{}.{}".format(path, int(time.time() * 1000)))
+            time.sleep(grace)
+        stored = 0
+        for rotated in sorted(glob(escape(path) + ".*")):
+            with open(rotated) as buffer:
+                counts = aggregate(buffer)
+            # the rotated buffer is removed before the commit, so that it is never
+            # counted twice (the downloads are lost if the commit itself fails)
+            with transaction.atomic():
+                stored += store(counts)
+                os.unlink(rotated)
+        return stored
+
@@ -1,23 +1,29 @@
 from captcha.fields import CaptchaField
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.forms.forms import pretty_name
 from django.utils.translation import ugettext_lazy as _
 from django.utils.safestring import mark_safe
-from softwarecollections.copr import CoprProxy
+from softwarecollections.copr import CachedCoprProxy
 from tagging.forms import TagField
 
 from .models import (
     SoftwareCollection, Copr, Repo, Score,
-    POLICY_CHOICES_TEXT, POLICY_CHOICES_LABEL
+    POLICY_CHOICES_TEXT, POLICY_CHOICES_LABEL,
+    REPO_CHOICES_CACHE_KEY, REPO_CHOICES_CACHE_TTL,
 )
 
 PER_PAGE_CHOICES = ((10, '10 per page'), (25, '25 per page'), (50, '50 per page'))
 
+# search results are ordered by relevance unless another order is chosen
+ORDER_BY_RELEVANCE = 'relevance'
+
 ORDER_BY_CHOICES = (
     ('-create_date',    _('Sort: recently created')),
     ('-score',          _('Sort: score')),
     ('title',           _('Sort: title')),
+    (ORDER_BY_RELEVANCE, _('Sort: relevance')),
 # Not using stats that don't matter for non-copr SCLs
 #    ('-download_count', _('Sort: download count')),
 #    ('-last_modified',  _('Sort: recently built')),
@@ -66,7 +72,7 @@ class _CoprForm(forms.ModelForm):
                 copr_username = ''
         if copr_username:
             try:
-                self.coprnames = CoprProxy().coprnames(copr_username)
+                self.coprnames = CachedCoprProxy().coprnames(copr_username)
             except:
                 self.coprnames = []
         else:
@@ -398,6 +404,18 @@ class RateForm(forms.ModelForm):
         }
 
 
+def get_repo_choices():
+    """ return choices of repo filter, cached until any repo is saved or deleted """
+    choices = cache.get(REPO_CHOICES_CACHE_KEY)
+    if choices is None:
+        choices = [('', 'All repos')] + sorted([
+            (r['name'], r['name'].capitalize().replace('-', ' ', 1).replace('-', ' - '))
+            for r in Repo.objects.values('name').distinct()
+        ])
+        cache.set(REPO_CHOICES_CACHE_KEY, choices, REPO_CHOICES_CACHE_TTL)
+    return choices
+
+
 class FilterForm(forms.Form):
     search      = forms.CharField(required=False, max_length=999,
                     widget=forms.TextInput(attrs={'class': 'form-control',
@@ -423,8 +441,5 @@ class FilterForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super(FilterForm, self).__init__(*args, **kwargs)
-        self.fields['repo'].choices = [('', 'All repos')] + sorted([
-            (r['name'], r['name'].capitalize().replace('-', ' ', 1).replace('-', ' - '))
-            for r in Repo.objects.values('name').distinct()
-        ])
+        self.fields['repo'].choices = get_repo_choices()
 
@@ -1,8 +1,6 @@
 import logging
 import os
 
-from optparse import make_option
-
 from django.core.management.base import CommandError
 
 from multiprocessing import Pool, cpu_count
@@ -29,20 +27,22 @@ def createrepo(args):
 
 
 class Command(LoggingBaseCommand):
-    option_list = LoggingBaseCommand.option_list + (
-        make_option(
+    help = 'Rebuild metadata for all repos. ' \
+           'Optionaly you may specify one or more slug of particular repo to be processed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'args', metavar='repo_slug', nargs='*',
+            help='Slug of particular repo to be processed',
+        )
+        parser.add_argument(
             '-P', '--max-procs', action='store', dest='max_procs', default=cpu_count(),
             help='Run up to MAX_PROCS processes at a time (default {})'.format(cpu_count())
-        ),
-        make_option(
+        )
+        parser.add_argument(
             '-t', '--timeout', action='store', dest='timeout', default=None,
             help='Timeout in seconds for each run of createrepo',
-        ),
-    )
-
-    args = '[ <repo_slug> ... ]'
-    help = 'Rebuild metadata for all repos. ' \
-           'Optionaly you may specify one or more slug of particular repo to be processed.'
+        )
 
     def handle(self, *args, **options):
         self.configure_logging(options['verbosity'])
@@ -61,8 +61,8 @@ class Command(LoggingBaseCommand):
         with Pool(processes=int(options['max_procs'])) as pool:
             errors += sum(pool.map(
                 createrepo,
-                [(scl, timeout) for scl in repos],
+                [(repo, timeout) for repo in repos],
             ))
             if errors > 0:
-                raise CommandError('Failed to rebuild release RPMs: {} error(s)'.format(errors))
+                raise CommandError('Failed to create repos: {} error(s)'.format(errors))
 
@@ -0,0 +1,33 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from softwarecollections.management.commands import LoggingBaseCommand
+from softwarecollections.scls import downloads
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(LoggingBaseCommand):
+    help = 'Aggregate buffered download events into per-day download statistics ' \
+           'and download counters of repos and collections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--buffer', action='store', dest='buffer', default=settings.DOWNLOAD_STATS_BUFFER,
+            help='Path to the buffer of download events (default {})'.format(
+                settings.DOWNLOAD_STATS_BUFFER),
+        )
+
+    def handle(self, *args, **options):
+        self.configure_logging(options['verbosity'])
+        if not options['buffer']:
+            logger.info('DOWNLOAD_STATS_BUFFER is not configured, nothing to do')
+            return
+        try:
+            stored = downloads.flush(str(options['buffer']))
+        except Exception as e:
+            raise CommandError('Failed to aggregate downloads: {}'.format(e))
+        logger.info('Stored {} download(s)'.format(stored))
@@ -1,8 +1,6 @@
 import logging
 import os
 
-from optparse import make_option
-
 from django.core.management.base import CommandError
 
 from multiprocessing import Pool, cpu_count
@@ -31,20 +29,22 @@ def dump_provides(args):
 
 
 class Command(LoggingBaseCommand):
-    option_list = LoggingBaseCommand.option_list + (
-        make_option(
+    help = 'Dump provides for all collections. ' \
+           'Optionaly you may specify one or more slug of particular SCLs to be dumped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'args', metavar='scl_slug', nargs='*',
+            help='Slug of particular SCL to be dumped',
+        )
+        parser.add_argument(
             '-P', '--max-procs', action='store', dest='max_procs', default=cpu_count(),
             help='Run up to MAX_PROCS processes at a time (default {})'.format(cpu_count())
-        ),
-        make_option(
+        )
+        parser.add_argument(
             '-t', '--timeout', action='store', dest='timeout', default=None,
             help='Timeout in seconds for each run of dump_provides',
-        ),
-    )
-
-    args = '[ <scl_slug> ... ]'
-    help = 'Dump provides for all collections. ' \
-           'Optionaly you may specify one or more slug of particular SCLs to be dumped.'
+        )
 
     def handle(self, *args, **options):
         self.configure_logging(options['verbosity'])
@@ -1,14 +1,13 @@
 import logging
 import os
 
-from optparse import make_option
-
 from django.core.management.base import CommandError
 
 from multiprocessing import Pool, cpu_count
 
 from softwarecollections.management.commands import LoggingBaseCommand
-from softwarecollections.scls.models import SoftwareCollection
+from softwarecollections.scls.models import RelatedRequest, SoftwareCollection, chunks
+from softwarecollections.scls.relations import load_provides, update_relations
 
 
 logger = logging.getLogger(__name__)
@@ -28,37 +27,77 @@ def find_related(args):
     return 0
 
 
+def read_requires(args):
+    scl, timeout = args
+
+    # scl.read_requires()
+    logger.info('Reading requires of {}'.format(scl.slug))
+    try:
+        return scl.id, scl.read_requires(timeout)
+    except Exception as e:
+        logger.error('Failed to read requires of {}: {}'.format(scl.slug, e))
+        return scl.id, None
+
+
+def relate(pool, scls, timeout, provides=None):
+    """ read requires of given collections in the pool and update their relations,
+        return the number of errors """
+    results = pool.map(
+        read_requires,
+        [(scl, timeout) for scl in scls],
+    )
+    # relations of collections with unreadable requires are kept as they are
+    requires = dict(
+        (scl_id, names) for scl_id, names in results if names is not None
+    )
+    RelatedRequest.enqueue(scl_id for scl_id, names in results if names is None)
+    added, removed = update_relations(requires, provides)
+    logger.info('Relations of {} collections updated: {} added, {} removed'.format(
+        len(requires), added, removed))
+    return len(results) - len(requires)
+
+
 class Command(LoggingBaseCommand):
-    option_list = LoggingBaseCommand.option_list + (
-        make_option(
+    help = 'Find related collections for collections, which provides or requires have changed. ' \
+           'Optionaly you may specify one or more slug of particular SCLs to be processed. ' \
+           'With --all, the dependency graph of the whole catalogue is computed at once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'args', metavar='scl_slug', nargs='*',
+            help='Slug of particular SCL to be processed',
+        )
+        parser.add_argument(
+            '-A', '--all', action='store_true', dest='all', default=False,
+            help='Process all collections, not only those affected by changed provides.',
+        )
+        parser.add_argument(
             '-P', '--max-procs', action='store', dest='max_procs', default=cpu_count(),
             help='Run up to MAX_PROCS processes at a time (default {})'.format(cpu_count())
-        ),
-        make_option(
+        )
+        parser.add_argument(
             '-t', '--timeout', action='store', dest='timeout', default=None,
             help='Timeout in seconds for each run of find_related',
-        ),
-    )
-
-    args = '[ <scl_slug> ... ]'
-    help = 'Find related collections for all collections. ' \
-           'Optionaly you may specify one or more slug of particular SCLs to be processed.'
+        )
 
     def handle(self, *args, **options):
         self.configure_logging(options['verbosity'])
-        errors = 0
+        timeout = options['timeout'] and int(options['timeout'])
         if args:
-            scls = []
-            for slug in args:
-                try:
-                    scls.append(SoftwareCollection.objects.get(slug=slug))
-                except Exception as e:
-                    logger.error(str(e))
-                    errors += 1
+            self.handle_collections(args, int(options['max_procs']), timeout)
         else:
-            scls = SoftwareCollection.objects.all()
-        timeout = options['timeout'] and int(options['timeout'])
-        with Pool(processes=int(options['max_procs'])) as pool:
+            self.handle_graph(int(options['max_procs']), timeout, options['all'])
+
+    def handle_collections(self, slugs, max_procs, timeout):
+        errors = 0
+        scls = []
+        for slug in slugs:
+            try:
+                scls.append(SoftwareCollection.objects.get(slug=slug))
+            except Exception as e:
+                logger.error(str(e))
+                errors += 1
+        with Pool(processes=max_procs) as pool:
             errors += sum(pool.map(
                 find_related,
                 [(scl, timeout) for scl in scls],
@@ -66,3 +105,19 @@ class Command(LoggingBaseCommand):
             if errors > 0:
                 raise CommandError('Failed to find relations: {} error(s)'.format(errors))
 
+    def handle_graph(self, max_procs, timeout, all=False):
+        # the requests are put back, if the relations are not updated
+        with RelatedRequest.taken() as scl_ids:
+            if all:
+                scls = SoftwareCollection.objects.all()
+                provides = load_provides()
+            else:
+                scls = [
+                    scl for ids in chunks(sorted(scl_ids))
+                    for scl in SoftwareCollection.objects.filter(id__in=ids)
+                ]
+                provides = None
+            with Pool(processes=max_procs) as pool:
+                errors = relate(pool, scls, timeout, provides)
+        if errors > 0:
+            raise CommandError('Failed to find relations: {} error(s)'.format(errors))
@@ -1,8 +1,6 @@
 import logging
 import os
 
-from optparse import make_option
-
 from django.core.management.base import CommandError
 
 from multiprocessing import Pool, cpu_count
@@ -15,7 +13,11 @@ logger = logging.getLogger(__name__)
 
 
 def rpmbuild(args):
-    repo, timeout = args
+    repo, timeout, force = args
+
+    if not force and not repo.needs_rpmbuild():
+        logger.debug('Release RPM for {} is up to date'.format(repo.slug))
+        return 0
 
     # repo.rpmbuild()
     logger.info('Building RPM for {}'.format(repo.slug))
@@ -37,20 +39,26 @@ def rpmbuild(args):
 
 
 class Command(LoggingBaseCommand):
-    option_list = LoggingBaseCommand.option_list + (
-        make_option(
+    help = 'Rebuild release RPMs, which inputs (title, description, ...) have changed. ' \
+           'Optionaly you may specify one or more slug of particular repo to be processed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'args', metavar='repo_slug', nargs='*',
+            help='Slug of particular repo to be processed',
+        )
+        parser.add_argument(
+            '-f', '--force', action='store_true', dest='force', default=False,
+            help='Rebuild release RPMs even if they are up to date.',
+        )
+        parser.add_argument(
             '-P', '--max-procs', action='store', dest='max_procs', default=cpu_count(),
             help='Run up to MAX_PROCS processes at a time (default {})'.format(cpu_count())
-        ),
-        make_option(
+        )
+        parser.add_argument(
             '-t', '--timeout', action='store', dest='timeout', default=None,
             help='Timeout in seconds for each step (rpmbuild, createrepo)',
-        ),
-    )
-
-    args = '[ <repo_slug> ... ]'
-    help = 'Rebuild all release RPMs. ' \
-           'Optionaly you may specify one or more slug of particular repo to be processed.'
+        )
 
     def handle(self, *args, **options):
         self.configure_logging(options['verbosity'])
@@ -59,18 +67,17 @@ class Command(LoggingBaseCommand):
             repos = []
             for slug in args:
                 try:
-                    repos.append(Repo.objects.get(slug=slug))
+                    repos.append(Repo.objects.select_related('scl__maintainer').get(slug=slug))
                 except Exception as e:
                     logger.error(str(e))
                     errors += 1
         else:
-            repos = Repo.objects.all()
+            repos = Repo.objects.select_related('scl__maintainer')
         timeout = options['timeout'] and int(options['timeout'])
         with Pool(processes=int(options['max_procs'])) as pool:
             errors += sum(pool.map(
                 rpmbuild,
-                [(scl, timeout) for scl in repos],
+                [(repo, timeout, options['force']) for repo in repos],
             ))
             if errors > 0:
                 raise CommandError('Failed to rebuild release RPMs: {} error(s)'.format(errors))
-
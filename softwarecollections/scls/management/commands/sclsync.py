@@ -1,86 +1,106 @@
 import logging
 import os
 
-from optparse import make_option
-
 from django.core.management.base import CommandError
 
-from multiprocessing import Pool, cpu_count
+from multiprocessing import BoundedSemaphore, Pool, cpu_count
 
 from softwarecollections.management.commands import LoggingBaseCommand
-from softwarecollections.scls.models import SoftwareCollection
+from softwarecollections.scls.models import (
+    SoftwareCollection, SyncRequest, prefetch_copr_details, set_content_slots,
+    SYNC_PRIORITY_USER, SYNC_PRIORITY_ALL,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
 def sync(args):
-    scl, timeout = args
+    request, timeout = args
+    scl = request.scl
     exit_code = 0
 
+    # the request is taken off the queue before the sync starts,
+    # so that a request made meanwhile is served by the next run
+    SyncRequest.objects.filter(pk=request.pk).delete()
+
     # scl.sync()
-    logger.info('Syncing {}'.format(scl.slug))
+    logger.info('Syncing {} ({})'.format(scl.slug, request.get_priority_display()))
     try:
         scl.sync(timeout)
         if not scl.auto_sync:
             scl.need_sync = False
-            scl.save()
+            scl.save(update_fields=['need_sync'])
     except Exception as e:
         logger.error('Failed to sync {}: {}'.format(scl.slug, e))
         exit_code += 1
 
-    # scl.dump_provides()
-    logger.info('Dumping provides for {}'.format(scl.slug))
-    try:
-        scl.dump_provides(timeout)
-    except Exception as e:
-        logger.error('Failed to dump provides for {}: {}'.format(scl.slug, e))
-        exit_code += 1
-
-    return exit_code
+    return scl.slug, exit_code
 
 
 class Command(LoggingBaseCommand):
-    option_list = LoggingBaseCommand.option_list + (
-        make_option(
+    help = 'Sync all SCLs (marked with need_sync flag or queued for sync) with Copr repos. '\
+           'User requests are served first, then auto_sync collections, then the rest. '\
+           'Optionaly you may specify one or more slug of particular SCLs to be synced.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'args', metavar='scl_slug', nargs='*',
+            help='Slug of particular SCL to be synced',
+        )
+        parser.add_argument(
             '-A', '--all', action='store_true', dest='all', default=False,
             help='Sync all collections, regardless the need_sync flag.',
-        ),
-        make_option(
+        )
+        parser.add_argument(
             '-P', '--max-procs', action='store', dest='max_procs', default=cpu_count(),
             help='Run up to MAX_PROCS processes at a time (default {})'.format(cpu_count())
-        ),
-        make_option(
+        )
+        parser.add_argument(
             '-t', '--timeout', action='store', dest='timeout', default=None,
-            help='Timeout in seconds for each step of sync (reposync, rpmbuild, createrepo, dump_provides)',
-        ),
-    )
-
-    args = '[ <scl_slug> ... ]'
-    help = 'Sync all SCLs (marked with need_sync flag) with Copr repos. '\
-           'Optionaly you may specify one or more slug of particular SCLs to be synced.'
+            help='Timeout in seconds for each step of sync (mirror, rpmbuild, createrepo, dump_provides)',
+        )
 
     def handle(self, *args, **options):
         self.configure_logging(options['verbosity'])
         errors = 0
         if args:
-            scls = []
+            scl_ids = []
             for slug in args:
                 try:
-                    scls.append(SoftwareCollection.objects.get(slug=slug))
+                    scl_ids.append(SoftwareCollection.objects.get(slug=slug).id)
                 except Exception as e:
                     logger.error(str(e))
                     errors += 1
-        elif options['all']:
-            scls = SoftwareCollection.objects.all()
+            SyncRequest.enqueue(scl_ids, SYNC_PRIORITY_USER)
         else:
-            scls = SoftwareCollection.objects.filter(need_sync=True)
+            # collections marked by need_sync (requested by the user or auto_sync)
+            # are queued along with the requests made from the web
+            SyncRequest.enqueue_need_sync()
+            if options['all']:
+                SyncRequest.enqueue(
+                    SoftwareCollection.objects.values_list('id', flat=True), SYNC_PRIORITY_ALL,
+                )
+            scl_ids = None
+        requests = SyncRequest.schedule(scl_ids)
         timeout = options['timeout'] and int(options['timeout'])
-        with Pool(processes=int(options['max_procs'])) as pool:
-            errors += sum(pool.map(
+        # fetch details of all coprs at once, workers get them with the collections
+        prefetch_copr_details([copr for request in requests for copr in request.scl.all_coprs])
+        max_procs = int(options['max_procs'])
+        # repos of each collection are processed in parallel threads,
+        # but no more than max_procs repos are processed at a time in total
+        with Pool(
+            processes=max_procs,
+            initializer=set_content_slots,
+            initargs=(BoundedSemaphore(max_procs),),
+        ) as pool:
+            # requests are handed out one by one in the order of the queue,
+            # so that a large collection does not hold back the others
+            for done, (slug, exit_code) in enumerate(pool.imap_unordered(
                 sync,
-                [(scl, timeout) for scl in scls],
-            ))
+                [(request, timeout) for request in requests],
+            ), 1):
+                errors += exit_code
+                logger.info('Finished {} ({}/{})'.format(slug, done, len(requests)))
             if errors > 0:
                 raise CommandError('Failed to sync SCLs: {} error(s)'.format(errors))
-
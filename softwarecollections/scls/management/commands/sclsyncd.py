@@ -0,0 +1,249 @@
+import logging
+import os
+import signal
+import threading
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db import close_old_connections, connections
+from django.utils.timezone import utc
+
+from flock import Flock, LOCK_EX, LOCK_NB
+from multiprocessing import BoundedSemaphore, Pool, cpu_count
+
+from softwarecollections.management.commands import LoggingBaseCommand
+from softwarecollections.scls.models import (
+    RelatedRequest, SoftwareCollection, SyncRequest, chunks, prefetch_copr_details,
+    set_content_slots,
+)
+
+from .sclrelated import relate
+from .sclsync import sync
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_CACHE_KEY = 'sclsyncd:status'
+
+
+def sync_job(args):
+    # workers live long, connections closed by the database server are replaced
+    close_old_connections()
+    return sync(args)
+
+
+def get_status():
+    """ return the last status published by the running daemon (or None) """
+    return cache.get(STATUS_CACHE_KEY)
+
+
+class Command(LoggingBaseCommand):
+    help = 'Keep syncing SCLs with Copr repos. ' \
+           'The daemon keeps its worker processes running, polls the sync queue, ' \
+           'syncs the queued collections (mirror, rpmbuild, createrepo, dump_provides) ' \
+           'and updates the relations of affected collections when the queue is drained.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-P', '--max-procs', action='store', dest='max_procs', default=cpu_count(),
+            help='Run up to MAX_PROCS processes at a time (default {})'.format(cpu_count())
+        )
+        parser.add_argument(
+            '-t', '--timeout', action='store', dest='timeout', default=None,
+            help='Timeout in seconds for each step of sync (mirror, rpmbuild, createrepo, dump_provides)',
+        )
+        parser.add_argument(
+            '-i', '--interval', action='store', dest='interval', default=10,
+            help='Poll the sync queue every INTERVAL seconds (default 10)',
+        )
+        parser.add_argument(
+            '-a', '--auto-sync-interval', action='store', dest='auto_sync_interval', default=600,
+            help='Sync collections with auto_sync enabled every AUTO_SYNC_INTERVAL seconds (default 600)',
+        )
+        parser.add_argument(
+            '-l', '--lockfile', action='store', dest='lockfile', default='/run/sclsyncd.lock',
+            help='Lock file preventing concurrent runs (default /run/sclsyncd.lock)',
+        )
+        parser.add_argument(
+            '-1', '--once', action='store_true', dest='once', default=False,
+            help='Exit as soon as the queue is drained.',
+        )
+        parser.add_argument(
+            '-s', '--status', action='store_true', dest='status', default=False,
+            help='Print the status of the running daemon and exit.',
+        )
+
+    def handle(self, *args, **options):
+        self.configure_logging(options['verbosity'])
+        if options['status']:
+            self.print_status()
+            return
+        self.max_procs          = int(options['max_procs'])
+        self.timeout            = options['timeout'] and int(options['timeout'])
+        self.interval           = float(options['interval'])
+        self.auto_sync_interval = timedelta(seconds=int(options['auto_sync_interval']))
+        self.once               = options['once']
+        self.running            = {}    # scl_id -> (slug, AsyncResult)
+        self.failed             = {}    # scl_id -> time of the last failure
+        self.failing            = False # the last poll failed
+        self.stopping           = threading.Event()
+        self.wakeup             = threading.Event()
+        self.status = {
+            'pid':      os.getpid(),
+            'started':  self.now(),
+            'running':  [],
+            'queued':   0,
+            'synced':   0,
+            'failed':   0,
+            'related':  None,
+        }
+
+        # the lock is released by the kernel when the process dies,
+        # so there is no stale lock file to be removed after a crash
+        with open(options['lockfile'], 'a+') as lockfile:
+            try:
+                with Flock(lockfile, LOCK_EX | LOCK_NB):
+                    lockfile.truncate(0)
+                    lockfile.write('{}\n'.format(os.getpid()))
+                    lockfile.flush()
+                    self.serve()
+            except BlockingIOError:
+                raise CommandError('sclsyncd is already running ({})'.format(options['lockfile']))
+
+    def serve(self):
+        handlers = {
+            signal.SIGTERM: self.stop,
+            signal.SIGINT:  self.stop,
+            signal.SIGUSR1: lambda signum, frame: self.wakeup.set(),
+        }
+        handlers = dict(
+            (signum, signal.signal(signum, handler)) for signum, handler in handlers.items()
+        )
+        try:
+            self.run_pool()
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def run_pool(self):
+        # forked workers must not share the connection of the parent
+        connections.close_all()
+        with Pool(
+            processes=self.max_procs,
+            initializer=set_content_slots,
+            initargs=(BoundedSemaphore(self.max_procs),),
+        ) as pool:
+            logger.info('sclsyncd started with {} workers'.format(self.max_procs))
+            while not self.stopping.is_set():
+                try:
+                    close_old_connections()
+                    self.collect()
+                    self.dispatch(pool)
+                    if not self.running and self.status['queued'] == 0:
+                        self.update_relations(pool)
+                        if self.once:
+                            break
+                except Exception as e:
+                    # the daemon must survive any failure (e.g. unavailable database);
+                    # admins are notified once, not on every poll until it recovers
+                    if self.failing:
+                        logger.warning('sclsyncd loop still failing: {}'.format(e))
+                    else:
+                        logger.exception('sclsyncd loop failed')
+                        self.failing = True
+                else:
+                    if self.failing:
+                        logger.info('sclsyncd loop recovered')
+                        self.failing = False
+                self.publish()
+                self.wakeup.wait(0.1 if self.once else self.interval)
+                self.wakeup.clear()
+            # let the running syncs finish, they would be left locked otherwise
+            for slug, result in self.running.values():
+                result.wait()
+            self.collect()
+        self.publish()
+        logger.info('sclsyncd stopped')
+
+    def stop(self, signum, frame):
+        logger.info('Stopping sclsyncd (waiting for {} running syncs)'.format(len(self.running)))
+        self.stopping.set()
+        self.wakeup.set()
+
+    def collect(self):
+        """ collect results of finished syncs """
+        finished = [scl_id for scl_id, (slug, result) in self.running.items() if result.ready()]
+        for scl_id in finished:
+            slug, result = self.running.pop(scl_id)
+            try:
+                slug, exit_code = result.get()
+            except Exception as e:
+                logger.error('Failed to sync {}: {}'.format(slug, e))
+                exit_code = 1
+            if exit_code:
+                # failed collections are retried later, not on every poll
+                self.failed[scl_id] = self.now()
+                self.status['failed'] += 1
+            else:
+                self.status['synced'] += 1
+
+    def dispatch(self, pool):
+        """ hand queued requests to free workers in order of the queue
+
+            Only as many requests as there are free workers are taken,
+            so that a request made later with higher priority
+            does not wait behind the whole queue.
+        """
+        retry_before = self.now() - self.auto_sync_interval
+        SyncRequest.enqueue_need_sync(auto_synced_before=retry_before)
+        self.failed = dict(
+            (scl_id, failed) for scl_id, failed in self.failed.items() if failed > retry_before
+        )
+        requests = [
+            request for request in SyncRequest.schedule()
+            if request.scl_id not in self.running and request.scl_id not in self.failed
+        ]
+        free = max(self.max_procs - len(self.running), 0)
+        self.status['queued'] = len(requests)
+        if not free or not requests:
+            return
+        requests = requests[:free]
+        prefetch_copr_details([copr for request in requests for copr in request.scl.all_coprs])
+        for request in requests:
+            logger.info('Dispatching {} ({})'.format(request.scl.slug, request.get_priority_display()))
+            self.running[request.scl_id] = (
+                request.scl.slug,
+                pool.apply_async(sync_job, ((request, self.timeout),)),
+            )
+        self.status['queued'] -= len(requests)
+
+    def update_relations(self, pool):
+        """ update relations of collections affected by changed provides """
+        with RelatedRequest.taken() as scl_ids:
+            if not scl_ids:
+                return
+            logger.info('Updating relations of {} collections'.format(len(scl_ids)))
+            relate(pool, [
+                scl for ids in chunks(sorted(scl_ids))
+                for scl in SoftwareCollection.objects.filter(id__in=ids)
+            ], self.timeout)
+        self.status['related'] = self.now()
+
+    def publish(self):
+        self.status['running'] = sorted(slug for slug, result in self.running.values())
+        self.status['heartbeat'] = self.now()
+        cache.set(STATUS_CACHE_KEY, self.status, None)
+
+    def print_status(self):
+        status = get_status()
+        if status is None:
+            raise CommandError('No status of sclsyncd is available')
+        for key in ('pid', 'started', 'heartbeat', 'queued', 'synced', 'failed', 'related'):
+            self.stdout.write('{}: {}'.format(key, status.get(key)))
+        for slug in status['running']:
+            self.stdout.write('running: {}'.format(slug))
+
+    @staticmethod
+    def now():
+        return datetime.now().replace(tzinfo=utc)
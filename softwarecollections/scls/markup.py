@@ -0,0 +1,81 @@
+"""Rendering of Markdown texts of collections
+
+Descriptions, instructions and commands are written in Markdown and
+rendered on every page showing them, which used to be the largest part
+of the time spent rendering the lists of collections.
+
+The rendered HTML (and the truncated preview of descriptions) is cached
+under the hash of the source text, so the cached value never gets stale:
+changed text simply gets a new key. Models warm the cache when saved
+(see SoftwareCollection.save) and each process keeps the most recently
+used fragments in memory to avoid a round trip to the shared cache.
+"""
+
+import hashlib
+from functools import lru_cache
+
+import markdown2
+from django.core.cache import cache
+from django.utils.safestring import SafeText, mark_safe
+from django.utils.text import Truncator
+
+# Time in seconds to keep rendered fragments in the shared cache
+# (memcached does not accept longer relative timeouts than 30 days)
+CACHE_TTL = 30 * 24 * 3600
+
+# Number of rendered fragments kept in memory of each process
+LOCAL_CACHE_SIZE = 1024
+
+# Number of words of the description shown in the list of collections
+PREVIEW_WORDS = 50
+
+# Placeholder of the "read more" link in truncated previews,
+# replaced by the link when rendered (see the readmore filter)
+MORE = "<!--more-->"
+
+
+def _cached(variant: str, text: str, build) -> SafeText:
+    key = "markdown:{}:{}".format(variant, hashlib.sha1(text.encode("utf-8")).hexdigest())
+    html = cache.get(key)
+    if html is None:
+        html = build()
+        cache.set(key, html, CACHE_TTL)
+    return mark_safe(html)
+
+
+@lru_cache(maxsize=LOCAL_CACHE_SIZE)
+def render(text: str, safe: bool = True) -> SafeText:
+    """Render Markdown text to HTML.
+
+    Arguments:
+        text: Markdown source.
+        safe: Strip raw HTML of the source (same as the `markdown:"safe"` filter).
+
+    Returns:
+        Rendered HTML.
+    """
+
+    return _cached(
+        "safe" if safe else "html",
+        text,
+        lambda: markdown2.markdown(text, safe_mode=safe),
+    )
+
+
+@lru_cache(maxsize=LOCAL_CACHE_SIZE)
+def preview(text: str, words: int = PREVIEW_WORDS) -> SafeText:
+    """Render Markdown text to HTML truncated to the given number of words.
+
+    Arguments:
+        text: Markdown source, rendered in safe mode.
+        words: Number of words to keep.
+
+    Returns:
+        Truncated HTML with the MORE placeholder where the text was cut off.
+    """
+
+    return _cached(
+        "preview-{}".format(words),
+        text,
+        lambda: Truncator(render(text)).words(words, truncate=MORE, html=True),
+    )
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0004_other_repos_default_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repo',
+            name='upstream_checksum',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Upstream metadata checksum'),
+        ),
+        migrations.AddField(
+            model_name='repo',
+            name='upstream_modified',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Upstream last modified'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0005_repo_upstream'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Provide',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(db_index=True, verbose_name='Name')),
+                ('scl', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='provides', to='scls.SoftwareCollection')),
+            ],
+            options={
+                'unique_together': {('scl', 'name')},
+            },
+        ),
+    ]
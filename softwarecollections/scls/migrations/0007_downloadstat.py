@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0006_provide'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownloadStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('count', models.IntegerField(default=0, verbose_name='Downloads')),
+                ('repo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_stats', to='scls.Repo')),
+            ],
+            options={
+                'unique_together': {('repo', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0007_downloadstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repo',
+            name='rpmbuild_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Release package inputs hash'),
+        ),
+    ]
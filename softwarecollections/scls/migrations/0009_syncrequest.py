@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0008_repo_rpmbuild_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priority', models.SmallIntegerField(choices=[(0, 'User request'), (1, 'Auto sync'), (2, 'All collections')], db_index=True, default=0, verbose_name='Priority')),
+                ('requested', models.DateTimeField(auto_now_add=True, verbose_name='Requested')),
+                ('scl', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_request', to='scls.SoftwareCollection')),
+            ],
+            options={
+                'ordering': ('priority', 'requested'),
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def request_related(apps, schema_editor):
+    # the requires index is empty, relations of all collections are recomputed once
+    RelatedRequest      = apps.get_model('scls', 'RelatedRequest')
+    SoftwareCollection  = apps.get_model('scls', 'SoftwareCollection')
+
+    RelatedRequest.objects.bulk_create(
+        RelatedRequest(scl_id=scl_id)
+        for scl_id in SoftwareCollection.objects.values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0009_syncrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requested', models.DateTimeField(auto_now_add=True, verbose_name='Requested')),
+                ('scl', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='related_request', to='scls.SoftwareCollection')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Require',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(db_index=True, verbose_name='Name')),
+                ('scl', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='required_names', to='scls.SoftwareCollection')),
+            ],
+            options={
+                'unique_together': {('scl', 'name')},
+            },
+        ),
+        migrations.RunPython(request_related, migrations.RunPython.noop),
+    ]
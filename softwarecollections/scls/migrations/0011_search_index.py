@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# keep in sync with softwarecollections.scls.search
+PG_VECTOR = (
+    "(setweight(to_tsvector('simple'::regconfig, coalesce(\"name\", '')), 'A')"
+    " || setweight(to_tsvector('simple'::regconfig, coalesce(\"title\", '')), 'B')"
+    " || setweight(to_tsvector('simple'::regconfig, coalesce(\"description\", '')), 'C'))"
+)
+
+PG_CREATE = [
+    'CREATE INDEX "scls_softwarecollection_search" ON "scls_softwarecollection" '
+    'USING GIN ({})'.format(PG_VECTOR),
+]
+
+PG_DROP = [
+    'DROP INDEX IF EXISTS "scls_softwarecollection_search"',
+]
+
+# Note that SQLite schema editor rebuilds the table on most schema changes,
+# which drops the triggers; they need to be recreated by such migration.
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE scls_softwarecollection_fts USING fts5("
+    "name, title, description, content='scls_softwarecollection', content_rowid='id')",
+    "CREATE TRIGGER scls_softwarecollection_fts_insert AFTER INSERT ON scls_softwarecollection BEGIN "
+    "INSERT INTO scls_softwarecollection_fts(rowid, name, title, description) "
+    "VALUES (new.id, new.name, new.title, new.description); END",
+    "CREATE TRIGGER scls_softwarecollection_fts_delete AFTER DELETE ON scls_softwarecollection BEGIN "
+    "INSERT INTO scls_softwarecollection_fts(scls_softwarecollection_fts, rowid, name, title, description) "
+    "VALUES ('delete', old.id, old.name, old.title, old.description); END",
+    "CREATE TRIGGER scls_softwarecollection_fts_update AFTER UPDATE OF name, title, description "
+    "ON scls_softwarecollection BEGIN "
+    "INSERT INTO scls_softwarecollection_fts(scls_softwarecollection_fts, rowid, name, title, description) "
+    "VALUES ('delete', old.id, old.name, old.title, old.description); "
+    "INSERT INTO scls_softwarecollection_fts(rowid, name, title, description) "
+    "VALUES (new.id, new.name, new.title, new.description); END",
+    "INSERT INTO scls_softwarecollection_fts(scls_softwarecollection_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS scls_softwarecollection_fts_insert",
+    "DROP TRIGGER IF EXISTS scls_softwarecollection_fts_delete",
+    "DROP TRIGGER IF EXISTS scls_softwarecollection_fts_update",
+    "DROP TABLE IF EXISTS scls_softwarecollection_fts",
+]
+
+
+def has_fts5(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.scls_fts5_check USING fts5(name)")
+        cursor.execute("DROP TABLE temp.scls_fts5_check")
+        return True
+    except Exception:
+        return False
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            statements = PG_CREATE
+        elif connection.vendor == 'sqlite' and has_fts5(cursor):
+            statements = SQLITE_CREATE
+        else:
+            # other databases use the fallback search without index
+            statements = []
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            statements = PG_DROP
+        elif connection.vendor == 'sqlite':
+            statements = SQLITE_DROP
+        else:
+            statements = []
+        for statement in statements:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0010_require_relatedrequest'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='softwarecollection',
+            index=models.Index(fields=['-approved', '-create_date', '-id'], name='scls_list_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='softwarecollection',
+            index=models.Index(fields=['-approved', 'title', 'id'], name='scls_list_title_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def index_provides(apps, schema_editor):
+    # provides dumped before the index existed are read from the .provides files,
+    # so that the relations are not computed from an incomplete index
+    Provide             = apps.get_model('scls', 'Provide')
+    ProvidesIndex       = apps.get_model('scls', 'ProvidesIndex')
+    SoftwareCollection  = apps.get_model('scls', 'SoftwareCollection')
+
+    indexed = set(Provide.objects.values_list('scl_id', flat=True).distinct())
+    for scl_id, slug in SoftwareCollection.objects.values_list('id', 'slug').iterator():
+        try:
+            with open(os.path.join(settings.REPOS_ROOT, slug, '.provides')) as f:
+                names = set(line.rstrip('\n') for line in f) - {''}
+        except FileNotFoundError:
+            continue
+        Provide.objects.bulk_create(
+            [Provide(scl_id=scl_id, name=name) for name in sorted(names)],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        indexed.add(scl_id)
+    ProvidesIndex.objects.bulk_create(
+        [ProvidesIndex(scl_id=scl_id) for scl_id in sorted(indexed)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scls', '0012_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProvidesIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+                ('scl', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='provides_index', to='scls.SoftwareCollection')),
+            ],
+        ),
+        migrations.RunPython(index_provides, migrations.RunPython.noop),
+    ]
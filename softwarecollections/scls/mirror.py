@@ -0,0 +1,280 @@
+"""Parallel mirroring of yum repositories
+
+Replacement for reposync: the repository metadata are read directly
+and only missing or changed packages are downloaded, concurrently
+and over pooled HTTP connections.
+No global lock is needed, so collections can be mirrored in parallel.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, TextIO
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .repodata import (
+    Package,
+    RepoDataError,
+    find_primary,
+    hash_name,
+    iter_packages,
+    open_compressed,
+    parse_repomd,
+)
+
+logger = logging.getLogger(__name__)
+
+#: Default number of concurrent downloads per collection
+MAX_WORKERS = 4
+
+#: Timeouts (connect, read) in seconds for each HTTP request
+HTTP_TIMEOUT = (10, 300)
+
+CHUNK_SIZE = 1024 * 1024
+
+#: File in the mirror directory recording checksums of verified packages
+CHECKSUMS_FILE = ".checksums"
+
+
+class MirrorError(Exception):
+    pass
+
+
+def get_max_workers() -> int:
+    return int(getattr(settings, "REPOS_MIRROR_WORKERS", MAX_WORKERS))
+
+
+def create_session(pool_size: Optional[int] = None) -> requests.Session:
+    """Create HTTP session with connection pool large enough for all workers."""
+
+    pool_size = pool_size or get_max_workers()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return HTTP session shared by all mirrors in this process.
+
+    Warm connections are reused by subsequent syncs of the same worker,
+    but they must not be shared with forked processes.
+    """
+
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = create_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+class RepoMirror:
+    """Mirror of single yum repository in local directory.
+
+    Packages are stored under their location from primary.xml,
+    as reposync does. Local files which are not part of the remote
+    repository (e.g. the release RPMs) are left untouched.
+    """
+
+    def __init__(
+        self,
+        baseurl: str,
+        destdir: str,
+        session: Optional[requests.Session] = None,
+        log: Optional[TextIO] = None,
+    ):
+        self.baseurl = baseurl.rstrip("/")
+        self.destdir = os.path.normpath(destdir)
+        self.session = session or create_session()
+        self.log = log
+        self.checksums = None
+
+    def _log(self, message: str):
+        logger.debug(message)
+        if self.log is not None:
+            self.log.write(message + "\n")
+            self.log.flush()
+
+    def _url(self, location: str) -> str:
+        return "{}/{}".format(self.baseurl, location)
+
+    def _path(self, location: str) -> str:
+        path = os.path.normpath(os.path.join(self.destdir, location))
+        if not path.startswith(os.path.join(self.destdir, "")):
+            raise MirrorError("Invalid package location: {}".format(location))
+        return path
+
+    def _get(self, location: str, **kwargs) -> requests.Response:
+        response = self.session.get(
+            self._url(location), timeout=HTTP_TIMEOUT, **kwargs
+        )
+        response.raise_for_status()
+        return response
+
+    def fetch_repomd(self) -> bytes:
+        """Download content of remote repomd.xml."""
+
+        return self._get("repodata/repomd.xml").content
+
+    def list_packages(self, repomd: bytes) -> List[Package]:
+        """List packages of the remote repository described by repomd."""
+
+        try:
+            primary = find_primary(parse_repomd(repomd))
+            if primary is None:
+                raise MirrorError("No primary metadata in {}".format(self.baseurl))
+            with self._get(primary.location, stream=True) as response:
+                response.raw.decode_content = True
+                stream = open_compressed(response.raw, primary.location)
+                return list(iter_packages(stream))
+        except RepoDataError as err:
+            raise MirrorError(str(err)) from err
+
+    def load_checksums(self):
+        """Read checksums of the packages verified by previous syncs."""
+
+        try:
+            with open(os.path.join(self.destdir, CHECKSUMS_FILE)) as f:
+                self.checksums = json.load(f)
+        except (OSError, ValueError):
+            self.checksums = {}
+
+    def save_checksums(self):
+        """Store checksums of the verified packages (atomically)."""
+
+        path = os.path.join(self.destdir, CHECKSUMS_FILE)
+        os.makedirs(self.destdir, exist_ok=True)
+        with open(path + ".part", "w") as f:
+            json.dump(self.checksums, f, sort_keys=True)
+        os.replace(path + ".part", path)
+
+    def is_current(self, package: Package) -> bool:
+        """Check that the local copy of the package is up to date.
+
+        Rebuilt package may keep its name and size, so the checksum
+        recorded when the package was downloaded must match as well.
+        Packages mirrored before the checksums were recorded are verified
+        by computing the checksum of the local file (once).
+        """
+
+        if self.checksums is None:
+            self.load_checksums()
+        checksum = "{}:{}".format(package.checksum_type, package.checksum)
+        path = self._path(package.location)
+        try:
+            if os.path.getsize(path) != package.size:
+                return False
+        except FileNotFoundError:
+            return False
+        recorded = self.checksums.get(package.location)
+        if recorded is None:
+            digest = hashlib.new(hash_name(package.checksum_type))
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() == package.checksum:
+                self.checksums[package.location] = recorded = checksum
+        return recorded == checksum
+
+    def download(self, package: Package, deadline: Optional[float] = None):
+        """Download single package and verify its checksum.
+
+        The package is written to temporary file first and moved in place
+        only after successful verification, so that the mirror never contains
+        partially downloaded packages.
+        """
+
+        if deadline is not None and time.monotonic() > deadline:
+            raise MirrorError("Timeout while mirroring {}".format(self.baseurl))
+
+        path = self._path(package.location)
+        partial = path + ".part"
+        digest = hashlib.new(hash_name(package.checksum_type))
+
+        self._log(self._url(package.location))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with self._get(package.location, stream=True) as response:
+                with open(partial, "wb") as out:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        digest.update(chunk)
+                        out.write(chunk)
+            if digest.hexdigest() != package.checksum:
+                raise MirrorError("Checksum mismatch: {}".format(package.location))
+            os.replace(partial, path)
+            if self.checksums is not None:
+                self.checksums[package.location] = "{}:{}".format(
+                    package.checksum_type, package.checksum
+                )
+        except Exception:
+            self._log("FAILED")
+            try:
+                os.unlink(partial)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def sync(
+        self,
+        repomd: Optional[bytes] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Package]:
+        """Bring the local mirror up to date.
+
+        Arguments:
+            repomd: Already downloaded repomd.xml; fetched if not provided.
+            executor: Pool used for concurrent downloads;
+                a private one is created if not provided.
+            timeout: Overall time limit in seconds.
+
+        Returns:
+            List of downloaded packages.
+        """
+
+        deadline = timeout and time.monotonic() + timeout
+        if repomd is None:
+            repomd = self.fetch_repomd()
+
+        packages = self.list_packages(repomd)
+        self.load_checksums()
+        missing = [pkg for pkg in packages if not self.is_current(pkg)]
+        self._log(
+            "{}: {} package(s) to download".format(self.baseurl, len(missing))
+        )
+
+        def download(package):
+            self.download(package, deadline)
+
+        try:
+            if executor is None:
+                with ThreadPoolExecutor(max_workers=get_max_workers()) as own_executor:
+                    list(own_executor.map(download, missing))
+            else:
+                list(executor.map(download, missing))
+        finally:
+            # packages removed from the repository are forgotten
+            locations = {pkg.location for pkg in packages}
+            self.checksums = dict(
+                (location, checksum)
+                # downloads of a shared executor may still be running after failure
+                for location, checksum in list(self.checksums.items())
+                if location in locations
+            )
+            self.save_checksums()
+
+        return missing
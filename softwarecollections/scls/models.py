@@ -1,28 +1,44 @@
+import hashlib
+import heapq
+import json
+import logging
 import markdown2
 import os
 import requests
 import shutil
 import time
-from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from glob import glob
+from itertools import groupby, zip_longest
 from datetime import datetime
-from django.db import models
-from django.db.models import Avg
+from django.db import models, transaction
+from django.db.models import Avg, F
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
 from flock import Flock, LOCK_EX
-from softwarecollections.copr import CoprProxy
-from subprocess import call, check_call, check_output, CalledProcessError
+from softwarecollections.copr import CachedCoprProxy
+from subprocess import check_call, CalledProcessError
 from tagging.models import Tag
 from tagging.registry import register
 from tagging.utils import edit_string_for_tags
 
+from . import markup, repodata, rpmheader, rpmwriter
+from .mirror import RepoMirror, get_max_workers, get_session
+from .repodata import RepoDataError
 from .validators import validate_name
 
 
+logger = logging.getLogger(__name__)
+
+
 def check_call_log(args, **kwargs):
     try:
         kwargs['stderr'].write(' '.join(args) + '\n')
@@ -36,6 +52,64 @@ def check_call_log(args, **kwargs):
         kwargs['stderr'].flush()
 
 
+DEPENDENCY_TAGS = {
+    'provides': rpmheader.RPMTAG_PROVIDENAME,
+    'requires': rpmheader.RPMTAG_REQUIRENAME,
+}
+
+# number of values used in one query (SQLite has a limit of 999 variables)
+CHUNK_SIZE = 500
+
+# number of attempts to run createrepo_c and the delay (in seconds)
+# before the first retry, which is doubled after each failure
+CREATEREPO_TRIES = 5
+CREATEREPO_BACKOFF = 1
+
+# default number of repos of one collection processed at a time
+CONTENT_WORKERS = 4
+
+# semaphore limiting the number of repos processed at a time
+# by all the processes sharing it (see set_content_slots)
+_content_slots = None
+
+def set_content_slots(semaphore):
+    """
+    share the semaphore to limit the number of repos processed at a time,
+    used as the initializer of the pool of sclsync processes
+    """
+    global _content_slots
+    _content_slots = semaphore
+
+def chunks(values, size=CHUNK_SIZE):
+    """ split sequence of values to chunks of given size """
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def dependency_names(dependencies):
+    """ return sorted unique names of dependencies without versions """
+    return sorted(set(dependency.split(' ', 1)[0] for dependency in dependencies))
+
+def read_provides(lines):
+    """ yield provides from lines of .provides file """
+    for line in lines:
+        line = line.rstrip('\n')
+        if line:
+            yield line
+
+def merge_unique(sorted_iterables):
+    """ merge sorted iterables to one sorted stream without duplicates """
+    for value, _group in groupby(heapq.merge(*sorted_iterables)):
+        yield value
+
+def has_provides(path):
+    """ check, whether the .provides file contains at least one provide """
+    try:
+        with open(path) as provides:
+            return next(read_provides(provides), None) is not None
+    except FileNotFoundError:
+        return False
+
+
 
 ICON_NAMES = sorted(tuple(
     name[:-4]
@@ -54,6 +128,27 @@ def get_icon_url(icon_name):
 SPECFILE = os.path.join(os.path.dirname(__file__), 'scl-release.spec')
 VERSION = '1'
 RELEASE = '2'
+# date of the last change of the release package (see scl-release.spec),
+# used as build time to make the native builds reproducible
+BUILDTIME = 1399248000
+
+def get_specfile_digest():
+    """ return digest of scl-release.spec (computed once per process) """
+    global _specfile_digest
+    if _specfile_digest is None:
+        with open(SPECFILE, 'rb') as specfile:
+            _specfile_digest = hashlib.sha256(specfile.read()).hexdigest()
+    return _specfile_digest
+
+_specfile_digest = None
+
+# content of the yum repo file in the release package (see scl-release.spec)
+REPO_CONFIG = '''[{pkg_name}]
+name={scl_title} - {repo_name}
+baseurl=https://www.softwarecollections.org{repo_baseurl}
+enabled=1
+gpgcheck=0
+'''
 
 
 
@@ -91,6 +186,23 @@ POLICY_CHOICES_LABEL = [(key, POLICY_LABEL[key]) for key in POLICIES]
 
 
 
+def prefetch_copr_details(coprs):
+    """
+    fetch details of many coprs concurrently
+    and store them as the (cached) detail of each copr
+    """
+    coprs = [copr for copr in coprs if 'detail' not in copr.__dict__]
+    if coprs:
+        # sync needs current data, the cache is updated for web workers
+        details = CachedCoprProxy(fresh=True).coprdetails(
+            (copr.username, copr.name) for copr in coprs
+        )
+        for copr in coprs:
+            if (copr.username, copr.name) in details:
+                copr.detail = details[(copr.username, copr.name)]
+
+
+
 class Copr(models.Model):
     username    = models.CharField(_('Copr User'), max_length=100,
                     help_text=_('Username of Copr user (Note that the packages must be built in Copr.)'))
@@ -105,7 +217,7 @@ class Copr(models.Model):
 
     @cached_property
     def detail(self):
-        return CoprProxy().coprdetail(self.username, self.name)
+        return CachedCoprProxy().coprdetail(self.username, self.name)
 
     @property
     def additional_repos(self):
@@ -166,6 +278,10 @@ class OtherRepo(models.Model):
     def get_icon_url(self):
         return get_icon_url(self.icon)
 
+    @property
+    def command_html(self):
+        return markup.render(self.command)
+
     def sync(self, timeout=None):
         response = requests.head('{}/repodata/repomd.xml'.format(self.url))
         if response.status_code != 200:
@@ -177,6 +293,10 @@ class OtherRepo(models.Model):
         self.last_synced = datetime.now().replace(tzinfo=utc)
         self.save()
 
+    def save(self, *args, **kwargs):
+        super(OtherRepo, self).save(*args, **kwargs)
+        markup.render(self.command)
+
 
 
 class SoftwareCollection(models.Model):
@@ -221,6 +341,11 @@ class SoftwareCollection(models.Model):
         # this is not necessarry, but as a side effect, it creates index,
         # which may be useful
         unique_together = (('maintainer', 'name'),)
+        # used by keyset pagination of collection lists
+        indexes = [
+            models.Index(fields=['-approved', '-create_date', '-id'], name='scls_list_created_idx'),
+            models.Index(fields=['-approved', 'title', 'id'], name='scls_list_title_idx'),
+        ]
 
     def __str__(self):
         return self.slug
@@ -257,13 +382,26 @@ class SoftwareCollection(models.Model):
     def get_repos_url(self):
         return os.path.join(settings.REPOS_URL, self.slug)
 
-    def get_repos_config(self):
-        return os.path.join(settings.REPOS_ROOT, self.slug, 'copr-repos.conf')
-
     @property
     def policy_text(self):
         return POLICY_TEXT[self.policy]
 
+    @property
+    def policy_text_html(self):
+        return markup.render(self.policy_text, safe=False)
+
+    @property
+    def description_html(self):
+        return markup.render(self.description)
+
+    @property
+    def description_preview_html(self):
+        return markup.preview(self.description)
+
+    @property
+    def instructions_html(self):
+        return markup.render(self.instructions)
+
     @cached_property
     def all_collaborators(self):
         return list(self.collaborators.all())
@@ -323,13 +461,9 @@ class SoftwareCollection(models.Model):
 
     def sync(self, timeout=None):
         with self.lock:
-            # create repos config
-            repos_config = [
-                '[main]\nreposdir=\ncachedir={cache_root}\nkeepcache=0\n'.format(cache_root=self.get_cache_root())
-            ]
             last_modified  = None
-            download_count = 0
             all_repos      = []
+            prefetch_copr_details(self.all_coprs)
             for copr in self.all_coprs:
                 if copr.last_modified:
                     if last_modified:
@@ -342,23 +476,11 @@ class SoftwareCollection(models.Model):
                         repo.delete()
                     else:
                         # update existing repos
+                        repo.copr = copr
                         repo.copr_url = copr.yum_repos[repo.name]
-                        repo.save()
-                        repos_config.append(
-                            '[{name}]\nname={name}\nbaseurl={url}\ngpgcheck=0\n'.format(
-                                name = repo.name,
-                                url  = repo.copr_url,
-                            )
-                        )
+                        # do not overwrite download_count updated concurrently
+                        repo.save(update_fields=['copr', 'copr_url'])
                         all_repos.append(repo)
-                        download_count += repo.download_count
-
-            # save repos config
-            with open(self.get_repos_config(), 'w') as f:
-                f.write('\n'.join(repos_config))
-                # despite expectations the file is empty
-                # if I do not call explicitly flush
-                f.flush()
 
             # scl.all_repos are expected to be sorted by name
             all_repos.sort(key=lambda repo: repo.name)
@@ -366,74 +488,169 @@ class SoftwareCollection(models.Model):
             # store newly computed values
             self.all_repos      = all_repos
             self.last_modified  = last_modified
-            self.download_count = download_count
-
-            # unfortunately reposync can not run parallel
-            with Flock(os.open(settings.REPOS_ROOT, 0), LOCK_EX):
-                log = open(os.path.join(self.get_repos_root(), 'reposync.log'), 'w')
-
-                # workaround BZ 1079387
-                call('rm -rf /var/tmp/yum-*', shell=True)
-
-                # remove cache_root
-                try:
-                    shutil.rmtree(self.get_cache_root())
-                except FileNotFoundError:
-                    pass
-
-                # run reposync
-                # TODO replace reposync with another tool,
-                # which is capable of parallel run and preserves *-relese.rpm
-                args = [
-                    'reposync', '--source', '-c', self.get_repos_config(),
-                    '-p', self.get_repos_root(),
-                ]
+
+            # mirror the repos; downloads of all repos share one pool
+            # of workers and the HTTP connections of this process,
+            # no global lock is needed
+            session = get_session()
+            upstream = {}
+            modified = []
+            with open(os.path.join(self.get_repos_root(), 'reposync.log'), 'w') as log, \
+                    ThreadPoolExecutor(max_workers=get_max_workers()) as executor:
                 for repo in self.all_repos:
-                    args += ['-r', repo.name]
-                check_call_log(args, stdout=log, stderr=log, timeout=timeout)
+                    copr_modified = repo.copr.last_modified
+                    # skip repos of unmodified coprs without touching the network
+                    if repo.upstream_checksum and copr_modified \
+                            and repo.upstream_modified == copr_modified:
+                        log.write('{}: copr not modified\n'.format(repo.copr_url))
+                        continue
+                    repo_mirror = RepoMirror(
+                        repo.copr_url, repo.get_repo_dir(), session=session, log=log,
+                    )
+                    repomd = repo_mirror.fetch_repomd()
+                    checksum = hashlib.sha256(repomd).hexdigest()
+                    if checksum != repo.upstream_checksum:
+                        repo_mirror.sync(repomd, executor=executor, timeout=timeout)
+                        modified.append(repo.id)
+                    else:
+                        log.write('{}: repodata not modified\n'.format(repo.copr_url))
+                    upstream[repo.id] = (checksum, copr_modified)
             self.last_synced = datetime.now().replace(tzinfo=utc)
 
-            self.check_repos_content(timeout)
+            self.check_repos_content(timeout, modified=modified)
 
-    def check_repos_content(self, timeout):
-        with self.lock:
-            # check repos content and build repo RPMs
-            for repo in self.repos.all():
-                if not os.path.exists(repo.get_rpmfile_path()):
-                    repo.rpmbuild(timeout)
-                repo.createrepo(timeout)
+            # remember upstream state only once the content is processed,
+            # so that failed syncs are retried next time
+            for repo_id, (checksum, copr_modified) in upstream.items():
+                Repo.objects.filter(id=repo_id).update(
+                    upstream_checksum=checksum, upstream_modified=copr_modified,
+                )
+
+    def check_repos_content(self, timeout, modified=None):
+        """
+        Build missing or outdated release RPMs and refresh metadata and provides of repos.
+        If the list of ids of modified repos is given, the metadata and provides
+        of other repos are considered up to date and are not regenerated.
+        Repos are processed in parallel by up to REPOS_CONTENT_WORKERS threads.
+        """
+        processed = modified is None
+        jobs = []
+        for repo in self.repos.all():
+            repo.scl = self
+            rpmbuild = repo.needs_rpmbuild()
+            if not rpmbuild and modified is not None and repo.id not in modified:
                 repo.last_synced = self.last_synced
-                repo.has_content = len(repo.dump_provides(timeout)) > 0
-                repo.save()
-            self.has_content = (len(self.dump_provides(timeout)) + self.other_repos.count()) > 0
-            self.save()
+                repo.save(update_fields=['last_synced'])
+            else:
+                jobs.append((repo, rpmbuild))
+
+        # repos are processed in parallel, each of them holds only its own lock;
+        # the database is only accessed from this thread
+        errors = []
+        if jobs:
+            max_workers = min(len(jobs), getattr(settings, 'REPOS_CONTENT_WORKERS', CONTENT_WORKERS))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    (repo, rpmbuild, executor.submit(repo.update_content, timeout, rpmbuild))
+                    for repo, rpmbuild in jobs
+                ]
+                for repo, rpmbuild, future in futures:
+                    try:
+                        repo.has_content = future.result()
+                    except Exception as e:
+                        logger.error('Failed to process {}: {}'.format(repo.slug, e))
+                        errors.append(e)
+                        continue
+                    repo.last_synced = self.last_synced
+                    repo.save(update_fields=['last_synced', 'has_content']
+                        + (rpmbuild and ['rpmbuild_hash'] or []))
+                    processed = True
+        if errors:
+            raise errors[0]
+
+        with self.lock:
+            if processed:
+                self.dump_provides(timeout)
+            self.has_content = self.has_provides() or self.other_repos.exists()
+            # download_count is incremented concurrently, it must not be overwritten
+            self.save(update_fields=['last_modified', 'last_synced', 'has_content'])
 
     def dump_provides(self, timeout=None):
         with self.lock:
             repos_root = self.get_repos_root()
-            with open(os.path.join(repos_root, '.provides'), 'w+') as out:
-                call(
-                    "sort -u '{repos_root}'/*/.provides 2> /dev/null".format(
-                        repos_root=repos_root
-                    ),
-                    shell=True, stdout=out, timeout=timeout
+            provides = set()
+            # per-repo provides are sorted and unique, so they are just merged
+            with ExitStack() as stack, open(os.path.join(repos_root, '.provides'), 'w') as out:
+                for provide in merge_unique(
+                    read_provides(stack.enter_context(open(path)))
+                    for path in sorted(glob(os.path.join(repos_root, '*', '.provides')))
+                ):
+                    out.write(provide + '\n')
+                    provides.add(provide)
+            changed = self.update_provides_index(provides)
+            # the content has changed, so have the requires of this collection;
+            # collections requiring changed provides are affected as well
+            affected = {self.id}
+            for names in chunks(sorted(changed)):
+                affected.update(
+                    Require.objects.filter(name__in=names).values_list('scl_id', flat=True)
                 )
-                out.seek(0)
-                return [line.rstrip() for line in out]
+            RelatedRequest.enqueue(affected)
+            return provides
+
+    def has_provides(self):
+        return has_provides(os.path.join(self.get_repos_root(), '.provides'))
+
+    def update_provides_index(self, provides):
+        """ store the provides in database, so that other collections may find them,
+            return names of added and removed provides """
+        current = set(self.provides.values_list('name', flat=True))
+        provides = set(provides)
+        with transaction.atomic():
+            for names in chunks(sorted(current - provides)):
+                self.provides.filter(name__in=names).delete()
+            Provide.objects.bulk_create(
+                [Provide(scl=self, name=name) for name in provides - current],
+                batch_size=CHUNK_SIZE,
+            )
+            ProvidesIndex.objects.update_or_create(scl=self)
+        return current ^ provides
+
+    def update_requires_index(self, requires):
+        """ store the requires in database, so that the collection may be found
+            when some of the required names is (no longer) provided """
+        current = set(self.required_names.values_list('name', flat=True))
+        requires = set(requires)
+        with transaction.atomic():
+            for names in chunks(sorted(current - requires)):
+                self.required_names.filter(name__in=names).delete()
+            Require.objects.bulk_create(
+                [Require(scl=self, name=name) for name in requires - current],
+                batch_size=CHUNK_SIZE,
+            )
+
+    def read_requires(self, timeout=None):
+        return dependency_names(
+            require
+            for repo in self.repos.all()
+            for require in repo.read_dependencies('requires', timeout)
+        )
 
     def find_related(self, timeout=None):
         with self.lock:
-            out = check_output(
-                ("set -o pipefail; "
-                "find '{repos_root}' -name '*.rpm' -exec rpm -qp --nosignature --requires '{{}}' \\; "
-                "| sed 's/ .*//' | sort -u | while read req; do "
-                "egrep -l \"^$req$\" '{all_repos_root}'/*/*/.provides || :; "
-                "done | sed -r -e 's|^{all_repos_root}/||' -e 's|/.provides$||' | sort -u"
-                .format(all_repos_root=settings.REPOS_ROOT, repos_root=self.get_repos_root())),
-                shell=True, universal_newlines=True, timeout=timeout
-            )
-            related_slugs = [slug for slug in out.split() if slug != self.slug]
-            self.requires = SoftwareCollection.objects.filter(slug__in=related_slugs)
+            requires = self.read_requires(timeout)
+            related_ids = set()
+            for names in chunks(requires):
+                related_ids.update(
+                    Provide.objects.filter(name__in=names).values_list('scl_id', flat=True)
+                )
+            related_ids.discard(self.id)
+            # relations to collections, which provides are not indexed yet, are kept
+            current_ids = set(self.requires.values_list('id', flat=True))
+            related_ids.update(current_ids - ProvidesIndex.indexed(current_ids))
+            self.requires.set(related_ids)
+            self.update_requires_index(requires)
+            RelatedRequest.objects.filter(scl=self).delete()
 
     @cached_property
     def lock(self):
@@ -459,11 +676,104 @@ class SoftwareCollection(models.Model):
         if not self.instructions.strip():
             self.instructions = self.get_default_instructions()
         super(SoftwareCollection, self).save(*args, **kwargs)
+        # render the saved texts now rather than within the next request
+        saved = kwargs.get('update_fields') or ('description', 'instructions')
+        deferred = self.get_deferred_fields()
+        if 'description' in saved and 'description' not in deferred:
+            markup.render(self.description)
+            markup.preview(self.description)
+        if 'instructions' in saved and 'instructions' not in deferred:
+            markup.render(self.instructions)
 
 register(SoftwareCollection)
 
 
 
+# priorities of sync requests (lower value is served first)
+SYNC_PRIORITY_USER = 0   # requested by the maintainer or by an admin
+SYNC_PRIORITY_AUTO = 1   # periodic synchronization (auto_sync)
+SYNC_PRIORITY_ALL  = 2   # synchronization of all collections (sclsync --all)
+
+SYNC_PRIORITY_CHOICES = (
+    (SYNC_PRIORITY_USER, _('User request')),
+    (SYNC_PRIORITY_AUTO, _('Auto sync')),
+    (SYNC_PRIORITY_ALL,  _('All collections')),
+)
+
+
+class SyncRequest(models.Model):
+    """ persistent queue of collections waiting for sync, one entry per collection """
+    scl             = models.OneToOneField(SoftwareCollection, related_name='sync_request', on_delete=models.CASCADE)
+    priority        = models.SmallIntegerField(_('Priority'), choices=SYNC_PRIORITY_CHOICES,
+                        default=SYNC_PRIORITY_USER, db_index=True)
+    requested       = models.DateTimeField(_('Requested'), auto_now_add=True)
+
+    class Meta:
+        ordering = ('priority', 'requested')
+
+    def __str__(self):
+        return '{} ({})'.format(self.scl_id, self.get_priority_display())
+
+    @classmethod
+    def enqueue(cls, scl_ids, priority=SYNC_PRIORITY_USER):
+        """ request sync of given collections, duplicate requests are merged
+            keeping the higher priority and the original position in the queue """
+        scl_ids = set(scl_ids)
+        queued = set()
+        for ids in chunks(sorted(scl_ids)):
+            cls.objects.filter(scl_id__in=ids, priority__gt=priority).update(priority=priority)
+            queued.update(cls.objects.filter(scl_id__in=ids).values_list('scl_id', flat=True))
+        cls.objects.bulk_create(
+            [cls(scl_id=scl_id, priority=priority) for scl_id in sorted(scl_ids - queued)],
+            batch_size=CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def enqueue_need_sync(cls, auto_synced_before=None):
+        """ queue collections marked by need_sync, those without auto_sync
+            are requested by the user and have higher priority;
+            if auto_synced_before is given, auto_sync collections
+            synced since then are not queued again """
+        need_sync = SoftwareCollection.objects.filter(need_sync=True)
+        cls.enqueue(
+            need_sync.filter(auto_sync=False).values_list('id', flat=True), SYNC_PRIORITY_USER,
+        )
+        auto_sync = need_sync.filter(auto_sync=True)
+        if auto_synced_before is not None:
+            auto_sync = auto_sync.filter(
+                models.Q(last_synced=None) | models.Q(last_synced__lt=auto_synced_before)
+            )
+        cls.enqueue(auto_sync.values_list('id', flat=True), SYNC_PRIORITY_AUTO)
+
+    @classmethod
+    def schedule(cls, scl_ids=None):
+        """ return queued requests in order of processing
+
+            Requests are served by priority. Within the same priority
+            maintainers take turns, so that a maintainer with many
+            collections does not delay the requests of the others.
+        """
+        requests = cls.objects.select_related('scl').order_by('priority', 'requested', 'id')
+        if scl_ids is not None:
+            requests = sorted(
+                (
+                    request for ids in chunks(sorted(set(scl_ids)))
+                    for request in requests.filter(scl_id__in=ids)
+                ),
+                key=lambda request: (request.priority, request.requested, request.id),
+            )
+        scheduled = []
+        for priority, group in groupby(requests, key=lambda request: request.priority):
+            # queues of maintainers ordered by their oldest request
+            queues = {}
+            for request in group:
+                queues.setdefault(request.scl.maintainer_id, []).append(request)
+            for turn in zip_longest(*queues.values()):
+                scheduled.extend(request for request in turn if request is not None)
+        return scheduled
+
+
 class Repo(models.Model):
     # automatic value (scl.slug/name) used as unique key
     slug            = models.SlugField(max_length=150, editable=False)
@@ -474,6 +784,13 @@ class Repo(models.Model):
     download_count  = models.IntegerField(default=0, editable=False)
     last_synced     = models.DateTimeField(_('Last synced'), null=True, editable=False)
     has_content     = models.BooleanField(_('Has content'), default=False)
+    # state of the upstream repo at the time of the last successful sync
+    upstream_checksum = models.CharField(_('Upstream metadata checksum'), max_length=64,
+                        blank=True, default='', editable=False)
+    upstream_modified = models.DateTimeField(_('Upstream last modified'), null=True, editable=False)
+    # hash of the inputs the current release package was built from
+    rpmbuild_hash   = models.CharField(_('Release package inputs hash'), max_length=64,
+                        blank=True, default='', editable=False)
 
     class Meta:
         # in fact, since slug is made of those and slug is unique,
@@ -544,6 +861,14 @@ class Repo(models.Model):
     def get_download_url(self):
         return reverse('scls:download', kwargs={'slug': self.slug}) + self.rpmfile_symlink
 
+    def count_download(self):
+        """ increment download counters of the repo and its scl atomically in database """
+        with transaction.atomic():
+            Repo.objects.filter(id=self.id).update(download_count=F('download_count') + 1)
+            SoftwareCollection.objects.filter(id=self.scl_id).update(
+                download_count=F('download_count') + 1,
+            )
+
     def get_oses_names_and_logos(self):
         if self.distro == 'epel':
             return [('RHEL {}'.format(self.version), get_icon_url('rhel')),
@@ -558,75 +883,292 @@ class Repo(models.Model):
             os.makedirs(self.get_repo_dir())
             return Flock(os.open(self.get_repo_dir(), 0), LOCK_EX)
 
+    def get_rpmbuild_hash(self):
+        """ return hash of all inputs the release package is built from """
+        return hashlib.sha256(json.dumps([
+            self.rpmname,
+            self.scl.title,
+            self.scl.description,
+            self.get_repo_url(),
+            self.distro_version,
+            VERSION,
+            RELEASE,
+            REPO_CONFIG,
+            get_specfile_digest(),
+            getattr(settings, 'REPOS_RELEASE_BUILDER', 'native'),
+        ]).encode('utf-8')).hexdigest()
+
+    def needs_rpmbuild(self):
+        return self.rpmbuild_hash != self.get_rpmbuild_hash() \
+            or not os.path.exists(self.get_rpmfile_path())
+
     def rpmbuild(self, timeout=None):
+        self.build_release_rpm(timeout)
+        Repo.objects.filter(id=self.id).update(rpmbuild_hash=self.rpmbuild_hash)
+
+    def build_release_rpm(self, timeout=None):
+        """ build the release package and link it, without touching the database """
         with self.lock:
-            log = open(os.path.join(self.get_repo_dir(), 'rpmbuild.log'), 'w')
-            defines = [
-                '-D',         '_topdir {}'.format(settings.RPMBUILD_TOPDIR),
-                '-D',         '_rpmdir {}'.format(self.get_repo_dir()),
-                '-D',            'dist {}'.format(self.distro_version),
-                '-D',        'scl_name {}'.format(self.scl.name),
-                '-D',       'scl_title {}'.format(self.scl.title),
-                '-D', 'scl_description {}'.format(self.scl.description.replace('%','%%')),
-                '-D',       'repo_name {}'.format(self.name),
-                '-D',        'pkg_name {}'.format(self.rpmname),
-                '-D',     'pkg_version {}'.format(VERSION),
-                '-D',     'pkg_release {}'.format(RELEASE),
-                '-D',     'repo_distro {}'.format(self.distro),
-                '-D',       'repo_arch {}'.format(self.arch),
-                '-D',    'repo_baseurl {}'.format(self.get_repo_url()),
-            ]
-            if self.distro_version == 'epel-5':
-                defines += [
-                    '-D', '_source_filedigest_algorithm 1',
-                    '-D', '_binary_filedigest_algorithm 1',
-                    '-D', '_binary_payload w9.gzdio',
-                ]
-            check_call_log(
-                ['rpmbuild', '-ba'] + defines + [ SPECFILE ],
-                stdout=log, stderr=log, timeout=timeout
-            )
+            rpmbuild_hash = self.get_rpmbuild_hash()
+            if getattr(settings, 'REPOS_RELEASE_BUILDER', 'native') == 'native':
+                self._write_release_rpm()
+            else:
+                self._rpmbuild_spec(timeout)
             try:
                 os.unlink(self.get_rpmfile_symlink_path())
             except FileNotFoundError:
                 pass
             os.symlink(self.rpmfile, self.get_rpmfile_symlink_path())
+            self.rpmbuild_hash = rpmbuild_hash
+
+    def _write_release_rpm(self):
+        """ write the release package directly, without running rpmbuild """
+        epel5 = self.distro_version == 'epel-5'
+        os.makedirs(os.path.join(self.get_repo_dir(), 'noarch'), exist_ok=True)
+        config = REPO_CONFIG.format(
+            pkg_name        = self.rpmname,
+            scl_title       = self.scl.title,
+            repo_name       = self.name,
+            repo_baseurl    = self.get_repo_url(),
+        )
+        rpmwriter.write_package(
+            os.path.join(self.get_repo_dir(), 'noarch', self.rpmfile),
+            name            = self.rpmname,
+            version         = VERSION,
+            release         = RELEASE,
+            summary         = '{} Repository Configuration'.format(self.scl.title),
+            description     = self.scl.description.strip(),
+            files           = [rpmwriter.RPMFile(
+                path    = '/etc/yum.repos.d/{}.repo'.format(self.rpmname),
+                content = config.encode('utf-8'),
+                flags   = rpmwriter.RPMFILE_CONFIG | rpmwriter.RPMFILE_NOREPLACE,
+            )],
+            license         = 'BSD',
+            group           = 'System Environment/Base',
+            url             = 'https://www.softwarecollections.org',
+            buildtime       = BUILDTIME,
+            buildhost       = 'www.softwarecollections.org',
+            # rpm on EL5 knows neither sha256 file digests nor header digest
+            digest_algo     = epel5 and rpmwriter.PGPHASHALGO_MD5 or rpmwriter.PGPHASHALGO_SHA256,
+            sha256_signature= not epel5,
+        )
+
+    def _rpmbuild_spec(self, timeout=None):
+        """ build the release package from scl-release.spec using rpmbuild """
+        log = open(os.path.join(self.get_repo_dir(), 'rpmbuild.log'), 'w')
+        defines = [
+            '-D',         '_topdir {}'.format(settings.RPMBUILD_TOPDIR),
+            '-D',         '_rpmdir {}'.format(self.get_repo_dir()),
+            '-D',            'dist {}'.format(self.distro_version),
+            '-D',        'scl_name {}'.format(self.scl.name),
+            '-D',       'scl_title {}'.format(self.scl.title),
+            '-D', 'scl_description {}'.format(self.scl.description.replace('%','%%')),
+            '-D',       'repo_name {}'.format(self.name),
+            '-D',        'pkg_name {}'.format(self.rpmname),
+            '-D',     'pkg_version {}'.format(VERSION),
+            '-D',     'pkg_release {}'.format(RELEASE),
+            '-D',     'repo_distro {}'.format(self.distro),
+            '-D',       'repo_arch {}'.format(self.arch),
+            '-D',    'repo_baseurl {}'.format(self.get_repo_url()),
+        ]
+        if self.distro_version == 'epel-5':
+            defines += [
+                '-D', '_source_filedigest_algorithm 1',
+                '-D', '_binary_filedigest_algorithm 1',
+                '-D', '_binary_payload w9.gzdio',
+            ]
+        check_call_log(
+            ['rpmbuild', '-ba'] + defines + [ SPECFILE ],
+            stdout=log, stderr=log, timeout=timeout
+        )
 
     def createrepo(self, timeout=None):
+        """
+        Update repo metadata using createrepo_c.
+        Checksums of packages are kept in persistent cache dir
+        and metadata of unchanged packages are reused (--update).
+        createrepo_c writes new metadata into .repodata and replaces repodata
+        only on success, so failed runs never touch the existing metadata.
+        """
         with self.lock:
-            log = open(os.path.join(self.get_repo_dir(), 'createrepo.log'), 'w')
-            tries = 5
-            # createrepo_c sometimes fails with those two exit codes:
-            #   - 6: At least one argument of function is bad or non complete
-            #   - 11: Unknown/Unsupported compression type
-            while True:
-                try:
-                    check_call_log([
-                        'createrepo_c', '--database', '--update', '--skip-symlinks',
-                        self.get_repo_dir()
-                    ], stdout=log, stderr=log, timeout=timeout)
-                    break
-                except (OSError, CalledProcessError):
+            repo_dir = self.get_repo_dir()
+            tmp_dir = os.path.join(repo_dir, '.repodata')
+            cache_dir = self.get_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            delay = CREATEREPO_BACKOFF
+            with open(os.path.join(repo_dir, 'createrepo.log'), 'w') as log:
+                for attempt in range(1, CREATEREPO_TRIES + 1):
+                    # remove temporary output of failed or interrupted run
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
                     try:
-                        shutil.rmtree(os.path.join(self.get_repo_dir(), ".repodata"))
-                    except FileNotFoundError:
-                        pass
-                    tries -= 1
-                    if not tries:
-                        raise
+                        check_call_log([
+                            'createrepo_c', '--database', '--update', '--skip-symlinks',
+                            '--cachedir', cache_dir, repo_dir,
+                        ], stdout=log, stderr=log, timeout=timeout)
+                        return
+                    except (OSError, CalledProcessError):
+                        # createrepo_c sometimes fails with those two exit codes:
+                        #   - 6: At least one argument of function is bad or non complete
+                        #   - 11: Unknown/Unsupported compression type
+                        if attempt == CREATEREPO_TRIES:
+                            shutil.rmtree(tmp_dir, ignore_errors=True)
+                            raise
+                        time.sleep(delay)
+                        delay *= 2
+
+    def read_dependencies(self, kind, timeout=None):
+        """
+        Return names of provides or requires of all packages in the repo.
+        They are read from the repo metadata created by createrepo,
+        unless REPOS_DEPENDENCIES_SOURCE setting says otherwise
+        or the metadata are not available.
+        """
+        if getattr(settings, 'REPOS_DEPENDENCIES_SOURCE', 'metadata') == 'metadata':
+            try:
+                return list(repodata.read_dependencies(self.get_repo_dir(), kind))
+            except (OSError, RepoDataError) as e:
+                logger.warning('Failed to read metadata of {}: {}'.format(self.slug, e))
+        return list(rpmheader.scan(self.get_repo_dir(), DEPENDENCY_TAGS[kind], timeout=timeout))
 
     def dump_provides(self, timeout=None):
         with self.lock:
-            repo_dir = self.get_repo_dir()
-            with open(os.path.join(repo_dir, '.provides'), 'w+') as out:
-                check_call(
-                    ("set -o pipefail; "
-                    "find '{repo_dir}' -name '*.rpm' -exec rpm -qp --nosignature --provides '{{}}' \\; "
-                    "| sed 's/ .*//' | sort -u".format(repo_dir=repo_dir)),
-                    shell=True, stdout=out, timeout=timeout
-                )
-                out.seek(0)
-                return [line.rstrip() for line in out]
+            provides = dependency_names(self.read_dependencies('provides', timeout))
+            with open(os.path.join(self.get_repo_dir(), '.provides'), 'w') as out:
+                out.writelines(provide + '\n' for provide in provides)
+            return provides
+
+    def has_provides(self):
+        return has_provides(os.path.join(self.get_repo_dir(), '.provides'))
+
+    def update_content(self, timeout=None, rpmbuild=False):
+        """
+        (Re)build the release package if requested, create repo metadata and dump provides.
+        Nothing is saved to the database, so that this may run in a worker thread.
+        Returns True if the repo has any content.
+        """
+        with _content_slots or ExitStack():
+            if rpmbuild:
+                self.build_release_rpm(timeout)
+            self.createrepo(timeout)
+            self.dump_provides(timeout)
+            return self.has_provides()
+
+
+# repo filter choices of collection lists are cached until any repo changes;
+# the timeout covers processes not sharing the cache (e.g. locmem in development)
+REPO_CHOICES_CACHE_KEY = 'scls:repo-choices'
+REPO_CHOICES_CACHE_TTL = 3600
+
+@receiver(post_save, sender=Repo)
+def invalidate_repo_choices_on_save(sender, instance, created, update_fields=None, **kwargs):
+    # sync saves existing repos with update_fields, which do not change the name
+    if created or update_fields is None or 'name' in update_fields:
+        cache.delete(REPO_CHOICES_CACHE_KEY)
+
+@receiver(post_delete, sender=Repo)
+def invalidate_repo_choices_on_delete(sender, instance, **kwargs):
+    cache.delete(REPO_CHOICES_CACHE_KEY)
+
+
+
+class Provide(models.Model):
+    """ inverted index of provides used to find related collections """
+    scl             = models.ForeignKey(SoftwareCollection, related_name='provides', on_delete=models.CASCADE)
+    name            = models.TextField(_('Name'), db_index=True)
+
+    class Meta:
+        unique_together = (('scl', 'name'),)
+
+    def __str__(self):
+        return '{} provides {}'.format(self.scl_id, self.name)
+
+
+
+class ProvidesIndex(models.Model):
+    """ marks collections, which provides are stored in the index,
+        so that provides not indexed yet are not mistaken for removed ones """
+    scl             = models.OneToOneField(SoftwareCollection, related_name='provides_index', on_delete=models.CASCADE)
+    updated         = models.DateTimeField(_('Updated'), auto_now=True)
+
+    def __str__(self):
+        return '{} provides indexed'.format(self.scl_id)
+
+    @classmethod
+    def indexed(cls, scl_ids):
+        """ return ids of those of given collections, which provides are indexed """
+        indexed = set()
+        for ids in chunks(sorted(set(scl_ids))):
+            indexed.update(cls.objects.filter(scl_id__in=ids).values_list('scl_id', flat=True))
+        return indexed
+
+
+class Require(models.Model):
+    """ inverted index of requires used to find collections affected by changed provides """
+    scl             = models.ForeignKey(SoftwareCollection, related_name='required_names', on_delete=models.CASCADE)
+    name            = models.TextField(_('Name'), db_index=True)
+
+    class Meta:
+        unique_together = (('scl', 'name'),)
+
+    def __str__(self):
+        return '{} requires {}'.format(self.scl_id, self.name)
+
+
+
+class RelatedRequest(models.Model):
+    """ collections, which relations need to be updated, because provides
+        or requires of the collection or provides of its requirements changed """
+    scl             = models.OneToOneField(SoftwareCollection, related_name='related_request', on_delete=models.CASCADE)
+    requested       = models.DateTimeField(_('Requested'), auto_now_add=True)
+
+    def __str__(self):
+        return '{} needs related'.format(self.scl_id)
+
+    @classmethod
+    def enqueue(cls, scl_ids):
+        cls.objects.bulk_create(
+            [cls(scl_id=scl_id) for scl_id in sorted(set(scl_ids))],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def take(cls):
+        """ return ids of requested collections and remove the requests,
+            so that requests made meanwhile are not lost """
+        scl_ids = set(cls.objects.values_list('scl_id', flat=True))
+        for ids in chunks(sorted(scl_ids)):
+            cls.objects.filter(scl_id__in=ids).delete()
+        return scl_ids
+
+    @classmethod
+    @contextmanager
+    def taken(cls):
+        """ take the requests (see take) and put them back,
+            if their processing fails, so that it is retried """
+        scl_ids = cls.take()
+        try:
+            yield scl_ids
+        except BaseException:
+            # collections deleted meanwhile can not be requested again
+            cls.enqueue(
+                scl_id for ids in chunks(sorted(scl_ids))
+                for scl_id in SoftwareCollection.objects.filter(id__in=ids).values_list('id', flat=True)
+            )
+            raise
+
+
+
+class DownloadStat(models.Model):
+    """ number of downloads of release package of the repo per day """
+    repo            = models.ForeignKey(Repo, related_name='download_stats', on_delete=models.CASCADE)
+    date            = models.DateField(_('Date'))
+    count           = models.IntegerField(_('Downloads'), default=0)
+
+    class Meta:
+        unique_together = (('repo', 'date'),)
+
+    def __str__(self):
+        return '{} {}: {}'.format(self.repo_id, self.date, self.count)
 
 
 
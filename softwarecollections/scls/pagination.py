@@ -0,0 +1,200 @@
+"""Keyset (seek) pagination of collection lists
+
+Instead of `OFFSET`, the page is located by the values of the ordering
+columns of the last (or first) collection of the adjacent page,
+passed in an opaque cursor. Any page costs the same as the first one,
+provided the ordering columns are indexed. The ordering must be total,
+so the primary key is always appended as the last ordering column.
+
+The total count is not needed for navigation; it is computed lazily
+and cached, because counting is as expensive as an `OFFSET` scan.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+# Time in seconds to cache the total count of the filtered collections
+COUNT_CACHE_TTL = 300
+
+Ordering = Sequence[str]  # e.g. ("-approved", "title", "id")
+
+
+class InvalidCursor(ValueError):
+    """The cursor can not be decoded or does not match the ordering."""
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keep microseconds of datetimes, the values must be compared exactly."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values: Iterable[Any]) -> str:
+    data = json.dumps(list(values), cls=CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(values, list):
+        raise InvalidCursor("Cursor must contain a list of values")
+    return values
+
+
+def seek(ordering: Ordering, values: Sequence[Any]) -> Q:
+    """Build the condition selecting rows following the given values in the ordering.
+
+    (a, b, id) > (va, vb, vid) is expanded to
+    a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND id > vid),
+    where > is replaced by < for descending columns.
+    """
+
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{"{}__{}".format(name, lookup): value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def reverse_ordering(ordering: Ordering) -> Tuple[str, ...]:
+    return tuple(field[1:] if field.startswith("-") else "-" + field for field in ordering)
+
+
+class KeysetPage(list):
+    """Collections of one page with the cursors of the adjacent pages."""
+
+    keyset = True
+
+    def __init__(self, paginator, items, next_cursor=None, previous_cursor=None):
+        super().__init__(items)
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginate queryset using cursors instead of page numbers.
+
+    Arguments:
+        queryset: Collections to paginate, not ordered.
+        ordering: Ordering columns; the primary key is appended if missing.
+        per_page: Number of collections per page.
+    """
+
+    def __init__(self, queryset: QuerySet, ordering: Ordering, per_page: int):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        if self.ordering[-1].lstrip("-") not in ("id", "pk"):
+            # in the direction of the last column, so that an index may be scanned
+            self.ordering += ("-id",) if self.ordering[-1].startswith("-") else ("id",)
+        self.per_page = int(per_page)
+
+    def get_page(self, after: Optional[str] = None, before: Optional[str] = None) -> KeysetPage:
+        """Return the page following the `after` cursor (or preceding the `before` one).
+
+        Invalid cursors are ignored and the first page is returned.
+        """
+
+        try:
+            if before:
+                return self._page_before(self._values(before))
+            if after:
+                return self._page_after(self._values(after))
+        except InvalidCursor:
+            pass
+        return self._page_after(None)
+
+    def _page_after(self, values):
+        queryset = self.queryset.order_by(*self.ordering)
+        if values is not None:
+            queryset = queryset.filter(seek(self.ordering, values))
+        items = list(queryset[: self.per_page + 1])
+        more = len(items) > self.per_page
+        items = items[: self.per_page]
+        return KeysetPage(
+            self,
+            items,
+            next_cursor=self._cursor(items[-1]) if more else None,
+            previous_cursor=self._cursor(items[0]) if values is not None and items else None,
+        )
+
+    def _page_before(self, values):
+        ordering = reverse_ordering(self.ordering)
+        queryset = self.queryset.order_by(*ordering).filter(seek(ordering, values))
+        items = list(queryset[: self.per_page + 1])
+        more = len(items) > self.per_page
+        items = items[: self.per_page][::-1]
+        if not items:
+            return self._page_after(None)
+        return KeysetPage(
+            self,
+            items,
+            next_cursor=self._cursor(items[-1]),
+            previous_cursor=self._cursor(items[0]) if more else None,
+        )
+
+    def _values(self, cursor):
+        values = decode_cursor(cursor)
+        if len(values) != len(self.ordering):
+            raise InvalidCursor("Cursor does not match the ordering")
+        model = self.queryset.model
+        converted = []
+        for field, value in zip(self.ordering, values):
+            try:
+                model_field = model._meta.get_field(field.lstrip("-"))
+            except FieldDoesNotExist:
+                # annotations (e.g. rank of search results) are plain numbers
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise InvalidCursor("Invalid value of {}".format(field))
+                converted.append(value)
+                continue
+            try:
+                converted.append(model_field.to_python(value))
+            except Exception as e:
+                raise InvalidCursor(str(e))
+        return converted
+
+    def _cursor(self, item):
+        return encode_cursor(getattr(item, field.lstrip("-")) for field in self.ordering)
+
+    @cached_property
+    def count(self) -> int:
+        """Total number of collections, cached for COUNT_CACHE_TTL seconds."""
+
+        sql, params = self.queryset.query.sql_with_params()
+        key = "keyset-count:" + hashlib.sha1(
+            json.dumps([sql, params], cls=CursorEncoder).encode("utf-8")
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, COUNT_CACHE_TTL)
+        return count
@@ -0,0 +1,134 @@
+"""Dependency graph of the whole catalogue
+
+Instead of resolving requirements of each collection separately,
+the provides and requires of all collections are loaded once,
+the complete set of `requires` edges is computed in memory
+and only the difference against the database is written.
+
+The graph is updated incrementally as well: when provides of a collection
+change, the collection and the collections requiring any of the added
+or removed provides (found in the requires index) are queued
+as `RelatedRequest`, and only their edges are recomputed.
+
+Edges to collections, which provides are not indexed yet (see `ProvidesIndex`),
+can not be computed, so they are never removed.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.db import transaction
+
+from .models import CHUNK_SIZE, Provide, ProvidesIndex, SoftwareCollection, chunks
+
+Edge = Tuple[int, int]  # (requiring collection id, required collection id)
+
+
+def load_provides(names: Optional[Iterable[str]] = None) -> Dict[str, Set[int]]:
+    """Load the provides index: provide name -> ids of providing collections.
+
+    Arguments:
+        names: Load only the given provides; the whole index is loaded if not provided.
+    """
+
+    index = defaultdict(set)
+    if names is None:
+        queries = [Provide.objects.all()]
+    else:
+        queries = (Provide.objects.filter(name__in=chunk) for chunk in chunks(sorted(names)))
+    for query in queries:
+        for name, scl_id in query.values_list("name", "scl_id").iterator():
+            index[name].add(scl_id)
+    return index
+
+
+def build_graph(
+    requires: Dict[int, Iterable[str]],
+    provides: Optional[Dict[str, Set[int]]] = None,
+) -> Set[Edge]:
+    """Compute the requires edges between collections.
+
+    Arguments:
+        requires: Requirement names of collections indexed by collection id.
+        provides: The provides index; loaded from database if not provided.
+
+    Returns:
+        Set of edges for all the given collections.
+    """
+
+    if provides is None:
+        provides = load_provides()
+
+    edges = set()
+    for scl_id, names in requires.items():
+        for name in names:
+            edges.update(
+                (scl_id, provider) for provider in provides.get(name, ()) if provider != scl_id
+            )
+    return edges
+
+
+def update_graph(edges: Set[Edge], scl_ids: Iterable[int]) -> Tuple[int, int]:
+    """Store edges of given collections, touching only the changed ones.
+
+    Arguments:
+        edges: The new edges of the collections.
+        scl_ids: Ids of the requiring collections the edges were computed for;
+            edges of other collections are left untouched.
+
+    Returns:
+        Number of added and removed edges.
+        Edges to collections, which provides are not indexed, are not removed.
+    """
+
+    Through = SoftwareCollection.requires.through
+    scl_ids = set(scl_ids)
+
+    current = {}
+    for ids in chunks(sorted(scl_ids)):
+        for pk, source, target in (
+            Through.objects.filter(from_softwarecollection_id__in=ids)
+            .values_list("id", "from_softwarecollection_id", "to_softwarecollection_id")
+            .iterator()
+        ):
+            current[(source, target)] = pk
+
+    added = [edge for edge in edges if edge[0] in scl_ids and edge not in current]
+    missing = {edge: pk for edge, pk in current.items() if edge not in edges}
+    indexed = ProvidesIndex.indexed(target for _source, target in missing)
+    removed = [pk for (_source, target), pk in missing.items() if target in indexed]
+
+    with transaction.atomic():
+        for pks in chunks(removed):
+            Through.objects.filter(id__in=pks).delete()
+        Through.objects.bulk_create(
+            [
+                Through(from_softwarecollection_id=source, to_softwarecollection_id=target)
+                for source, target in added
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+
+    return len(added), len(removed)
+
+
+def update_relations(
+    requires: Dict[int, Iterable[str]],
+    provides: Optional[Dict[str, Set[int]]] = None,
+) -> Tuple[int, int]:
+    """Store requires of the given collections and update their edges.
+
+    Arguments:
+        requires: Requirement names of collections indexed by collection id.
+        provides: The provides index; only the required names are loaded if not provided.
+
+    Returns:
+        Number of added and removed edges.
+    """
+
+    for ids in chunks(sorted(requires)):
+        for scl in SoftwareCollection.objects.filter(id__in=ids):
+            scl.update_requires_index(requires[scl.id])
+    if provides is None:
+        provides = load_provides(set().union(*requires.values()))
+    return update_graph(build_graph(requires, provides), requires.keys())
@@ -0,0 +1,170 @@
+"""Readers for yum repository metadata (repomd.xml and primary.xml)"""
+
+import bz2
+import gzip
+import lzma
+import os
+from typing import BinaryIO, Dict, Iterator, NamedTuple, Optional
+
+from defusedxml.ElementTree import fromstring, iterparse
+
+REPO_NS = "{http://linux.duke.edu/metadata/repo}"
+COMMON_NS = "{http://linux.duke.edu/metadata/common}"
+RPM_NS = "{http://linux.duke.edu/metadata/rpm}"
+
+#: Kinds of package dependencies listed in primary.xml
+DEPENDENCY_KINDS = ("provides", "requires", "conflicts", "obsoletes")
+
+#: Metadata checksum types mapped to hashlib algorithm names
+CHECKSUM_TYPES = {"sha": "sha1", "sha1": "sha1", "md5": "md5"}
+
+
+class RepoDataError(Exception):
+    pass
+
+
+class DataFile(NamedTuple):
+    """Single metadata file listed in repomd.xml"""
+
+    location: str
+    checksum_type: str
+    checksum: str
+
+
+class RepoMD(NamedTuple):
+    """Parsed content of repomd.xml"""
+
+    revision: str
+    data: Dict[str, DataFile]
+
+
+class Package(NamedTuple):
+    """Package entry from primary.xml"""
+
+    location: str
+    checksum_type: str
+    checksum: str
+    size: int
+
+
+def hash_name(checksum_type: str) -> str:
+    """Translate metadata checksum type to hashlib algorithm name."""
+
+    return CHECKSUM_TYPES.get(checksum_type, checksum_type)
+
+
+def parse_repomd(content: bytes) -> RepoMD:
+    """Parse repomd.xml.
+
+    Arguments:
+        content: Raw content of the repomd.xml file.
+
+    Returns:
+        Repository revision and the metadata files indexed by their type.
+    """
+
+    try:
+        root = fromstring(content)
+    except Exception as err:
+        raise RepoDataError("Invalid repomd.xml: {}".format(err)) from err
+
+    data = {}
+    for element in root.iter(REPO_NS + "data"):
+        location = element.find(REPO_NS + "location")
+        checksum = element.find(REPO_NS + "checksum")
+        if location is None or checksum is None:
+            continue
+        data[element.get("type")] = DataFile(
+            location=location.get("href"),
+            checksum_type=checksum.get("type"),
+            checksum=checksum.text.strip(),
+        )
+
+    revision = root.findtext(REPO_NS + "revision", default="").strip()
+    return RepoMD(revision=revision, data=data)
+
+
+def open_compressed(fileobj: BinaryIO, location: str) -> BinaryIO:
+    """Wrap fileobj in decompressor selected by suffix of the location."""
+
+    if location.endswith(".gz"):
+        return gzip.GzipFile(fileobj=fileobj)
+    if location.endswith(".xz"):
+        return lzma.LZMAFile(fileobj)
+    if location.endswith(".bz2"):
+        return bz2.BZ2File(fileobj)
+    return fileobj
+
+
+def iter_packages(stream: BinaryIO) -> Iterator[Package]:
+    """Iterate over packages listed in (uncompressed) primary.xml stream.
+
+    The document is parsed incrementally, so that the memory consumption
+    does not grow with the size of the repository.
+    """
+
+    for _event, element in iterparse(stream):
+        if element.tag != COMMON_NS + "package":
+            continue
+        location = element.find(COMMON_NS + "location")
+        checksum = element.find(COMMON_NS + "checksum")
+        size = element.find(COMMON_NS + "size")
+        if location is not None and checksum is not None:
+            yield Package(
+                location=location.get("href"),
+                checksum_type=checksum.get("type"),
+                checksum=checksum.text.strip(),
+                size=int(size.get("package")) if size is not None else -1,
+            )
+        element.clear()
+
+
+def find_primary(repomd: RepoMD) -> Optional[DataFile]:
+    """Return the primary.xml data file from parsed repomd.xml."""
+
+    return repomd.data.get("primary")
+
+
+def iter_dependencies(stream: BinaryIO, kind: str) -> Iterator[str]:
+    """Iterate over names of dependencies listed in (uncompressed) primary.xml.
+
+    Arguments:
+        stream: The primary.xml content.
+        kind: One of DEPENDENCY_KINDS.
+
+    Yields:
+        Names of the dependencies of all packages (possibly with duplicates).
+    """
+
+    if kind not in DEPENDENCY_KINDS:
+        raise ValueError("Unknown dependency kind: {}".format(kind))
+
+    path = "{c}format/{r}{kind}/{r}entry".format(c=COMMON_NS, r=RPM_NS, kind=kind)
+    for _event, element in iterparse(stream):
+        if element.tag != COMMON_NS + "package":
+            continue
+        for entry in element.iterfind(path):
+            yield entry.get("name")
+        element.clear()
+
+
+def read_dependencies(repo_dir: str, kind: str) -> Iterator[str]:
+    """Read names of dependencies from metadata of local repository.
+
+    Arguments:
+        repo_dir: The repository directory (containing repodata/repomd.xml).
+        kind: One of DEPENDENCY_KINDS.
+
+    Yields:
+        Names of the dependencies of all packages (possibly with duplicates).
+    """
+
+    with open(os.path.join(repo_dir, "repodata", "repomd.xml"), "rb") as repomd_file:
+        primary = find_primary(parse_repomd(repomd_file.read()))
+    if primary is None:
+        raise RepoDataError("No primary metadata in {}".format(repo_dir))
+
+    with open(os.path.join(repo_dir, primary.location), "rb") as primary_file:
+        yield from iter_dependencies(
+            open_compressed(primary_file, primary.location), kind
+        )
@@ -0,0 +1,172 @@
+"""Minimal in-process reader of RPM package headers
+
+Only the lead and the header structures at the beginning of the file
+are read (through mmap); the payload is never touched.
+"""
+
+import logging
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+LEAD_SIZE = 96
+LEAD_MAGIC = b"\xed\xab\xee\xdb"
+HEADER_MAGIC = b"\x8e\xad\xe8\x01"
+HEADER_PREAMBLE = struct.Struct(">4s4xII")
+INDEX_ENTRY = struct.Struct(">iiii")
+
+# Header tags
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+RPMTAG_RELEASE = 1002
+RPMTAG_ARCH = 1022
+RPMTAG_PROVIDENAME = 1047
+RPMTAG_REQUIRENAME = 1049
+
+# Header data types
+RPM_CHAR_TYPE = 1
+RPM_INT8_TYPE = 2
+RPM_INT16_TYPE = 3
+RPM_INT32_TYPE = 4
+RPM_INT64_TYPE = 5
+RPM_STRING_TYPE = 6
+RPM_BIN_TYPE = 7
+RPM_STRING_ARRAY_TYPE = 8
+RPM_I18NSTRING_TYPE = 9
+
+INT_FORMATS = {
+    RPM_CHAR_TYPE: "B",
+    RPM_INT8_TYPE: "B",
+    RPM_INT16_TYPE: "H",
+    RPM_INT32_TYPE: "I",
+    RPM_INT64_TYPE: "Q",
+}
+
+Value = Union[str, bytes, List[str], List[int]]
+
+
+class RPMHeaderError(Exception):
+    pass
+
+
+def _read_strings(data, offset: int, count: int) -> List[str]:
+    strings = []
+    for _ in range(count):
+        end = data.find(b"\0", offset)
+        if end < 0:
+            raise RPMHeaderError("Unterminated string in header")
+        strings.append(data[offset:end].decode("utf-8", errors="replace"))
+        offset = end + 1
+    return strings
+
+
+def _parse_header(data, offset: int, tags: Optional[Iterable[int]] = None):
+    """Parse header structure starting at offset.
+
+    Returns:
+        Tuple of values of requested tags and the offset of the header end.
+    """
+
+    try:
+        magic, count, size = HEADER_PREAMBLE.unpack_from(data, offset)
+    except struct.error as err:
+        raise RPMHeaderError("Truncated header") from err
+    if magic != HEADER_MAGIC:
+        raise RPMHeaderError("Bad header magic")
+
+    index = offset + HEADER_PREAMBLE.size
+    store = index + count * INDEX_ENTRY.size
+    end = store + size
+    if end > len(data):
+        raise RPMHeaderError("Truncated header")
+
+    wanted = None if tags is None else set(tags)
+    values = {}
+    for position in range(index, store, INDEX_ENTRY.size):
+        tag, kind, start, number = INDEX_ENTRY.unpack_from(data, position)
+        if wanted is not None and tag not in wanted:
+            continue
+        start += store
+        if kind in (RPM_STRING_ARRAY_TYPE, RPM_I18NSTRING_TYPE):
+            values[tag] = _read_strings(data, start, number)
+        elif kind == RPM_STRING_TYPE:
+            values[tag] = _read_strings(data, start, 1)[0]
+        elif kind == RPM_BIN_TYPE:
+            values[tag] = bytes(data[start : start + number])
+        elif kind in INT_FORMATS:
+            try:
+                values[tag] = list(
+                    struct.unpack_from(">{}{}".format(number, INT_FORMATS[kind]), data, start)
+                )
+            except struct.error as err:
+                raise RPMHeaderError("Corrupted header entry {}".format(tag)) from err
+    return values, end
+
+
+def read_header(path: str, tags: Optional[Iterable[int]] = None) -> Dict[int, Value]:
+    """Read the main header of RPM package.
+
+    Arguments:
+        path: Path to the RPM file.
+        tags: Tags to read; all tags are read if not specified.
+
+    Returns:
+        Values of the (requested) tags present in the header.
+    """
+
+    with open(path, "rb") as rpmfile:
+        try:
+            data = mmap.mmap(rpmfile.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as err:  # empty file
+            raise RPMHeaderError("Not an RPM file: {}".format(path)) from err
+        with data:
+            if data[:4] != LEAD_MAGIC:
+                raise RPMHeaderError("Not an RPM file: {}".format(path))
+            # signature header is padded to 8 byte boundary
+            _signature, end = _parse_header(data, LEAD_SIZE, tags=())
+            header, _end = _parse_header(data, end + (-end % 8), tags)
+            return header
+
+
+def find_rpms(directory: str) -> Iterator[str]:
+    """Find all RPM files in directory tree."""
+
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith(".rpm"):
+                yield os.path.join(root, name)
+
+
+def scan(
+    directory: str,
+    tag: int,
+    timeout: Optional[float] = None,
+    max_workers: Optional[int] = None,
+) -> Iterator[str]:
+    """Read values of string array tag from all RPM files in directory tree.
+
+    Arguments:
+        directory: The root of the directory tree.
+        tag: The tag to read, e.g. RPMTAG_PROVIDENAME.
+        timeout: Time limit in seconds for the whole scan.
+        max_workers: Number of threads reading the files.
+
+    Yields:
+        Values of the tag (possibly with duplicates).
+        Files which can not be read are logged and skipped.
+    """
+
+    def read(path):
+        try:
+            return read_header(path, tags=(tag,)).get(tag, [])
+        except (OSError, RPMHeaderError) as err:
+            logger.warning("Failed to read %s: %s", path, err)
+            return []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for values in executor.map(read, find_rpms(directory), timeout=timeout):
+            yield from values
@@ -0,0 +1,338 @@
+"""Minimal in-process writer of noarch RPM packages
+
+Writes the lead, the signature header, the main header and gzipped cpio
+payload of a package containing just a few regular files, which is all
+the release packages of the repos need. The output depends only on the
+arguments, so the same input always gives the same package.
+"""
+
+import gzip
+import hashlib
+import os
+import posixpath
+import struct
+from io import BytesIO
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+
+from .rpmheader import (
+    HEADER_MAGIC,
+    INDEX_ENTRY,
+    LEAD_MAGIC,
+    RPM_BIN_TYPE,
+    RPM_I18NSTRING_TYPE,
+    RPM_INT16_TYPE,
+    RPM_INT32_TYPE,
+    RPM_STRING_ARRAY_TYPE,
+    RPM_STRING_TYPE,
+)
+
+LEAD = struct.Struct(">4sBBhh66shh16s")
+HEADER_PREAMBLE = struct.Struct(">4s4xII")
+RPMSIGTYPE_HEADERSIG = 5
+RPMLEAD_OS_LINUX = 1
+
+# Region tags
+RPMTAG_HEADERSIGNATURES = 62
+RPMTAG_HEADERIMMUTABLE = 63
+RPMTAG_HEADERI18NTABLE = 100
+
+# Signature tags
+RPMSIGTAG_SHA1 = 269
+RPMSIGTAG_SHA256 = 273
+RPMSIGTAG_SIZE = 1000
+RPMSIGTAG_MD5 = 1004
+RPMSIGTAG_PAYLOADSIZE = 1007
+
+# Header tags
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+RPMTAG_RELEASE = 1002
+RPMTAG_SUMMARY = 1004
+RPMTAG_DESCRIPTION = 1005
+RPMTAG_BUILDTIME = 1006
+RPMTAG_BUILDHOST = 1007
+RPMTAG_SIZE = 1009
+RPMTAG_LICENSE = 1014
+RPMTAG_GROUP = 1016
+RPMTAG_URL = 1020
+RPMTAG_OS = 1021
+RPMTAG_ARCH = 1022
+RPMTAG_FILESIZES = 1028
+RPMTAG_FILEMODES = 1030
+RPMTAG_FILERDEVS = 1033
+RPMTAG_FILEMTIMES = 1034
+RPMTAG_FILEDIGESTS = 1035
+RPMTAG_FILELINKTOS = 1036
+RPMTAG_FILEFLAGS = 1037
+RPMTAG_FILEUSERNAME = 1039
+RPMTAG_FILEGROUPNAME = 1040
+RPMTAG_SOURCERPM = 1044
+RPMTAG_FILEVERIFYFLAGS = 1045
+RPMTAG_PROVIDENAME = 1047
+RPMTAG_REQUIREFLAGS = 1048
+RPMTAG_REQUIRENAME = 1049
+RPMTAG_REQUIREVERSION = 1050
+RPMTAG_FILEDEVICES = 1095
+RPMTAG_FILEINODES = 1096
+RPMTAG_FILELANGS = 1097
+RPMTAG_PROVIDEFLAGS = 1112
+RPMTAG_PROVIDEVERSION = 1113
+RPMTAG_DIRINDEXES = 1116
+RPMTAG_BASENAMES = 1117
+RPMTAG_DIRNAMES = 1118
+RPMTAG_PAYLOADFORMAT = 1124
+RPMTAG_PAYLOADCOMPRESSOR = 1125
+RPMTAG_PAYLOADFLAGS = 1126
+RPMTAG_FILEDIGESTALGO = 5011
+
+# File flags
+RPMFILE_CONFIG = 1 << 0
+RPMFILE_NOREPLACE = 1 << 4
+
+# Dependency flags
+RPMSENSE_LESS = 1 << 1
+RPMSENSE_EQUAL = 1 << 3
+RPMSENSE_RPMLIB = 1 << 24
+RPMSENSE_CONFIG = 1 << 28
+
+# File digest algorithms
+PGPHASHALGO_MD5 = 1
+PGPHASHALGO_SHA256 = 8
+DIGESTS = {PGPHASHALGO_MD5: hashlib.md5, PGPHASHALGO_SHA256: hashlib.sha256}
+
+ALIGNMENT = {RPM_INT16_TYPE: 2, RPM_INT32_TYPE: 4}
+
+Entry = Tuple[int, int, object]  # (tag, type, value)
+
+
+class RPMFile(NamedTuple):
+    """Regular file of the package."""
+
+    path: str  # absolute path of the installed file
+    content: bytes
+    mode: int = 0o100644
+    flags: int = 0  # RPMFILE_* flags
+
+
+def _encode(kind: int, value) -> Tuple[bytes, int]:
+    """Encode the value of header entry, return the data and the count."""
+
+    if kind == RPM_STRING_TYPE:
+        return value.encode("utf-8") + b"\0", 1
+    if kind in (RPM_STRING_ARRAY_TYPE, RPM_I18NSTRING_TYPE):
+        return b"".join(item.encode("utf-8") + b"\0" for item in value), len(value)
+    if kind == RPM_INT32_TYPE:
+        data = struct.pack(">{}I".format(len(value)), *(v & 0xFFFFFFFF for v in value))
+        return data, len(value)
+    if kind == RPM_INT16_TYPE:
+        return struct.pack(">{}H".format(len(value)), *(v & 0xFFFF for v in value)), len(value)
+    if kind == RPM_BIN_TYPE:
+        return bytes(value), len(value)
+    raise ValueError("Unsupported header data type: {}".format(kind))
+
+
+def build_header(entries: Iterable[Entry], region_tag: int) -> bytes:
+    """Build header structure with all the entries in one immutable region.
+
+    Arguments:
+        entries: The header entries.
+        region_tag: RPMTAG_HEADERSIGNATURES or RPMTAG_HEADERIMMUTABLE.
+
+    Returns:
+        The header including the magic.
+    """
+
+    index = []
+    store = bytearray()
+    for tag, kind, value in sorted(entries, key=lambda entry: entry[0]):
+        data, count = _encode(kind, value)
+        store.extend(b"\0" * (-len(store) % ALIGNMENT.get(kind, 1)))
+        index.append((tag, kind, len(store), count))
+        store.extend(data)
+    # the region trailer refers back to all index entries including the region tag
+    index.insert(0, (region_tag, RPM_BIN_TYPE, len(store), 16))
+    store.extend(INDEX_ENTRY.pack(region_tag, RPM_BIN_TYPE, -len(index) * INDEX_ENTRY.size, 16))
+    return b"".join(
+        [HEADER_PREAMBLE.pack(HEADER_MAGIC, len(index), len(store))]
+        + [INDEX_ENTRY.pack(*entry) for entry in index]
+        + [bytes(store)]
+    )
+
+
+def build_cpio(files: Sequence[RPMFile], mtime: int) -> bytes:
+    """Build cpio archive (newc format) with files prefixed by "./"."""
+
+    def member(name: str, mode: int, nlink: int, content: bytes, ino: int) -> bytes:
+        name = name.encode("utf-8") + b"\0"
+        fields = (ino, mode, 0, 0, nlink, mtime, len(content), 0, 0, 0, 0, len(name), 0)
+        header = b"070701" + b"".join(b"%08X" % field for field in fields) + name
+        return header + b"\0" * (-len(header) % 4) + content + b"\0" * (-len(content) % 4)
+
+    members = [
+        member("." + rpmfile.path, rpmfile.mode, 1, rpmfile.content, ino)
+        for ino, rpmfile in enumerate(files, 1)
+    ]
+    return b"".join(members + [member("TRAILER!!!", 0, 1, b"", 0)])
+
+
+def _dependencies(tag_names: int, tag_flags: int, tag_versions: int, deps) -> List[Entry]:
+    deps = sorted(deps)
+    return [
+        (tag_names, RPM_STRING_ARRAY_TYPE, [name for name, _flags, _version in deps]),
+        (tag_flags, RPM_INT32_TYPE, [flags for _name, flags, _version in deps]),
+        (tag_versions, RPM_STRING_ARRAY_TYPE, [version for _name, _flags, version in deps]),
+    ]
+
+
+def gzip_compress(data: bytes) -> bytes:
+    """Compress data reproducibly (gzip.compress accepts mtime only since Python 3.8)."""
+
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=9, mtime=0) as gz:
+        gz.write(data)
+    return buffer.getvalue()
+
+
+def build_package(
+    name: str,
+    version: str,
+    release: str,
+    summary: str,
+    description: str,
+    files: Sequence[RPMFile],
+    *,
+    license: str,
+    group: str,
+    url: str,
+    buildtime: int,
+    buildhost: str = "localhost",
+    digest_algo: int = PGPHASHALGO_SHA256,
+    sha256_signature: bool = True
+) -> bytes:
+    """Build noarch RPM package.
+
+    Arguments:
+        name, version, release, summary, description: The package metadata.
+        files: Regular files of the package.
+        license, group, url: The package metadata.
+        buildtime: Build time and modification time of the files (for reproducibility).
+        buildhost: Build host.
+        digest_algo: File digest algorithm (PGPHASHALGO_MD5 for old rpm, e.g. on EL5).
+        sha256_signature: Whether to include SHA256 header digest (unknown to old rpm).
+
+    Returns:
+        Content of the RPM file.
+    """
+
+    files = sorted(files)
+    dirnames = sorted({posixpath.dirname(rpmfile.path) + "/" for rpmfile in files})
+    evr = "{}-{}".format(version, release)
+    payload = build_cpio(files, buildtime)
+    compressed = gzip_compress(payload)
+
+    provides = {(name, RPMSENSE_EQUAL, evr)}
+    rpmlib = RPMSENSE_LESS | RPMSENSE_EQUAL | RPMSENSE_RPMLIB
+    requires = {
+        ("rpmlib(CompressedFileNames)", rpmlib, "3.0.4-1"),
+        ("rpmlib(PayloadFilesHavePrefix)", rpmlib, "4.0-1"),
+    }
+    if digest_algo != PGPHASHALGO_MD5:
+        requires.add(("rpmlib(FileDigests)", rpmlib, "4.6.0-1"))
+    if any(rpmfile.flags & RPMFILE_CONFIG for rpmfile in files):
+        provides.add(("config({})".format(name), RPMSENSE_EQUAL | RPMSENSE_CONFIG, evr))
+        requires.add(("config({})".format(name), RPMSENSE_EQUAL | RPMSENSE_CONFIG, evr))
+
+    digest = DIGESTS[digest_algo]
+    entries = [
+        (RPMTAG_HEADERI18NTABLE, RPM_STRING_ARRAY_TYPE, ["C"]),
+        (RPMTAG_NAME, RPM_STRING_TYPE, name),
+        (RPMTAG_VERSION, RPM_STRING_TYPE, version),
+        (RPMTAG_RELEASE, RPM_STRING_TYPE, release),
+        (RPMTAG_SUMMARY, RPM_I18NSTRING_TYPE, [summary]),
+        (RPMTAG_DESCRIPTION, RPM_I18NSTRING_TYPE, [description]),
+        (RPMTAG_BUILDTIME, RPM_INT32_TYPE, [buildtime]),
+        (RPMTAG_BUILDHOST, RPM_STRING_TYPE, buildhost),
+        (RPMTAG_SIZE, RPM_INT32_TYPE, [sum(len(rpmfile.content) for rpmfile in files)]),
+        (RPMTAG_LICENSE, RPM_STRING_TYPE, license),
+        (RPMTAG_GROUP, RPM_I18NSTRING_TYPE, [group]),
+        (RPMTAG_URL, RPM_STRING_TYPE, url),
+        (RPMTAG_OS, RPM_STRING_TYPE, "linux"),
+        (RPMTAG_ARCH, RPM_STRING_TYPE, "noarch"),
+        (RPMTAG_FILESIZES, RPM_INT32_TYPE, [len(rpmfile.content) for rpmfile in files]),
+        (RPMTAG_FILEMODES, RPM_INT16_TYPE, [rpmfile.mode for rpmfile in files]),
+        (RPMTAG_FILERDEVS, RPM_INT16_TYPE, [0 for rpmfile in files]),
+        (RPMTAG_FILEMTIMES, RPM_INT32_TYPE, [buildtime for rpmfile in files]),
+        (
+            RPMTAG_FILEDIGESTS,
+            RPM_STRING_ARRAY_TYPE,
+            [digest(rpmfile.content).hexdigest() for rpmfile in files],
+        ),
+        (RPMTAG_FILELINKTOS, RPM_STRING_ARRAY_TYPE, ["" for rpmfile in files]),
+        (RPMTAG_FILEFLAGS, RPM_INT32_TYPE, [rpmfile.flags for rpmfile in files]),
+        (RPMTAG_FILEUSERNAME, RPM_STRING_ARRAY_TYPE, ["root" for rpmfile in files]),
+        (RPMTAG_FILEGROUPNAME, RPM_STRING_ARRAY_TYPE, ["root" for rpmfile in files]),
+        (RPMTAG_SOURCERPM, RPM_STRING_TYPE, "{}-{}.src.rpm".format(name, evr)),
+        (RPMTAG_FILEVERIFYFLAGS, RPM_INT32_TYPE, [-1 for rpmfile in files]),
+        (RPMTAG_FILEDEVICES, RPM_INT32_TYPE, [1 for rpmfile in files]),
+        (RPMTAG_FILEINODES, RPM_INT32_TYPE, list(range(1, len(files) + 1))),
+        (RPMTAG_FILELANGS, RPM_STRING_ARRAY_TYPE, ["" for rpmfile in files]),
+        (
+            RPMTAG_DIRINDEXES,
+            RPM_INT32_TYPE,
+            [dirnames.index(posixpath.dirname(rpmfile.path) + "/") for rpmfile in files],
+        ),
+        (
+            RPMTAG_BASENAMES,
+            RPM_STRING_ARRAY_TYPE,
+            [posixpath.basename(rpmfile.path) for rpmfile in files],
+        ),
+        (RPMTAG_DIRNAMES, RPM_STRING_ARRAY_TYPE, dirnames),
+        (RPMTAG_PAYLOADFORMAT, RPM_STRING_TYPE, "cpio"),
+        (RPMTAG_PAYLOADCOMPRESSOR, RPM_STRING_TYPE, "gzip"),
+        (RPMTAG_PAYLOADFLAGS, RPM_STRING_TYPE, "9"),
+    ]
+    entries += _dependencies(
+        RPMTAG_PROVIDENAME, RPMTAG_PROVIDEFLAGS, RPMTAG_PROVIDEVERSION, provides
+    )
+    entries += _dependencies(
+        RPMTAG_REQUIRENAME, RPMTAG_REQUIREFLAGS, RPMTAG_REQUIREVERSION, requires
+    )
+    if digest_algo != PGPHASHALGO_MD5:
+        entries.append((RPMTAG_FILEDIGESTALGO, RPM_INT32_TYPE, [digest_algo]))
+    header = build_header(entries, RPMTAG_HEADERIMMUTABLE)
+
+    signature_entries = [
+        (RPMSIGTAG_SHA1, RPM_STRING_TYPE, hashlib.sha1(header).hexdigest()),
+        (RPMSIGTAG_SIZE, RPM_INT32_TYPE, [len(header) + len(compressed)]),
+        (RPMSIGTAG_MD5, RPM_BIN_TYPE, hashlib.md5(header + compressed).digest()),
+        (RPMSIGTAG_PAYLOADSIZE, RPM_INT32_TYPE, [len(payload)]),
+    ]
+    if sha256_signature:
+        signature_entries.append(
+            (RPMSIGTAG_SHA256, RPM_STRING_TYPE, hashlib.sha256(header).hexdigest())
+        )
+    signature = build_header(signature_entries, RPMTAG_HEADERSIGNATURES)
+
+    lead = LEAD.pack(
+        LEAD_MAGIC,
+        3,  # major version
+        0,  # minor version
+        0,  # binary package
+        0,  # noarch
+        "{}-{}".format(name, evr).encode("utf-8")[:65],
+        RPMLEAD_OS_LINUX,
+        RPMSIGTYPE_HEADERSIG,
+        b"",
+    )
+    # signature header is padded to 8 byte boundary
+    return b"".join([lead, signature, b"\0" * (-len(signature) % 8), header, compressed])
+
+
+def write_package(path: str, *args, **kwargs) -> None:
+    """Build the package (see build_package) and write it atomically to path."""
+
+    content = build_package(*args, **kwargs)
+    tmp = path + ".part"
+    with open(tmp, "wb") as rpmfile:
+        rpmfile.write(content)
+    os.replace(tmp, path)
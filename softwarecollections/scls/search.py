@@ -0,0 +1,115 @@
+"""Full-text search of collections
+
+The searched columns (name, title and optionally description) are indexed
+by the database, so the search does not need to scan the whole table:
+
+- PostgreSQL uses a GIN index over a weighted `tsvector` expression,
+- SQLite uses an FTS5 table kept up to date by triggers.
+
+Both indexes are created by a migration. With any other database
+(or SQLite without FTS5) the search falls back to `LIKE` predicates.
+Matching collections are annotated with `search_rank` (higher is more relevant).
+"""
+
+import re
+from functools import lru_cache
+from typing import List
+
+from django.db import connection
+from django.db.models import FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+RANK = "search_rank"
+
+WORD_RE = re.compile(r"\w+")
+
+# PostgreSQL: the expression must match the indexed one to use the index;
+# {table} is the (optional) qualifier of the columns
+PG_VECTOR = (
+    "(setweight(to_tsvector('simple'::regconfig, coalesce({table}\"name\", '')), 'A')"
+    " || setweight(to_tsvector('simple'::regconfig, coalesce({table}\"title\", '')), 'B')"
+    " || setweight(to_tsvector('simple'::regconfig, coalesce({table}\"description\", '')), 'C'))"
+)
+PG_INDEX = "scls_softwarecollection_search"
+
+# SQLite: external content FTS5 table with rowid equal to the collection id
+FTS_TABLE = "scls_softwarecollection_fts"
+FTS_COLUMNS = ("name", "title", "description")
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def split_words(query: str) -> List[str]:
+    """Return words of the query, without any operators of the search syntax."""
+
+    return WORD_RE.findall(query)
+
+
+def has_fts5() -> bool:
+    """Check, whether the SQLite database contains the FTS5 table."""
+
+    return _has_fts5(connection.settings_dict["NAME"])
+
+
+@lru_cache(maxsize=None)
+def _has_fts5(name: str) -> bool:
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def search(queryset: QuerySet, query: str, description: bool = False) -> QuerySet:
+    """Filter collections matching any word of the query (as prefix).
+
+    Arguments:
+        queryset: Collections to search in.
+        query: The searched words.
+        description: Search in description as well as in name and title.
+
+    Returns:
+        Matching collections annotated with their relevance.
+    """
+
+    words = split_words(query)
+    if not words:
+        return queryset.annotate(**{RANK: Value(0.0, output_field=FloatField())})
+    if connection.vendor == "postgresql":
+        return search_postgresql(queryset, words, description)
+    if connection.vendor == "sqlite" and has_fts5():
+        return search_sqlite(queryset, words, description)
+    return search_contains(queryset, words, description)
+
+
+def search_postgresql(queryset: QuerySet, words: List[str], description: bool) -> QuerySet:
+    weights = "ABC" if description else "AB"
+    tsquery = " | ".join("{}:*{}".format(word.lower(), weights) for word in words)
+    vector = PG_VECTOR.format(table='"scls_softwarecollection".')
+    match = "{} @@ to_tsquery('simple'::regconfig, %s)".format(vector)
+    rank = "ts_rank({}, to_tsquery('simple'::regconfig, %s))".format(vector)
+    return queryset.annotate(**{RANK: RawSQL(rank, [tsquery], output_field=FloatField())}).extra(
+        where=[match], params=[tsquery]
+    )
+
+
+def search_sqlite(queryset: QuerySet, words: List[str], description: bool) -> QuerySet:
+    columns = FTS_COLUMNS if description else FTS_COLUMNS[:2]
+    match = "{{{}}} : ({})".format(
+        " ".join(columns), " OR ".join('"{}"*'.format(word) for word in words)
+    )
+    # bm25() returns lower values for better matches
+    rank = (
+        "SELECT -bm25({table}, {weights}) FROM {table}"
+        " WHERE {table} MATCH %s AND rowid = scls_softwarecollection.id"
+    ).format(table=FTS_TABLE, weights=", ".join(str(weight) for weight in FTS_WEIGHTS))
+    matching = "scls_softwarecollection.id IN (SELECT rowid FROM {table} WHERE {table} MATCH %s)".format(
+        table=FTS_TABLE
+    )
+    return queryset.annotate(**{RANK: RawSQL(rank, [match], output_field=FloatField())}).extra(
+        where=[matching], params=[match]
+    )
+
+
+def search_contains(queryset: QuerySet, words: List[str], description: bool) -> QuerySet:
+    condition = Q()
+    for word in words:
+        condition |= Q(name__contains=word) | Q(title__contains=word)
+        if description:
+            condition |= Q(description__contains=word)
+    return queryset.filter(condition).annotate(**{RANK: Value(0.0, output_field=FloatField())})
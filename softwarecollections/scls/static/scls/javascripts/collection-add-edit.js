@@ -2,38 +2,79 @@ $(function() {
     // we'll use a timer to load repo list whenever user stops typing
     // for 0.6 seconds (this number just feels right ;))
     var timer;
-    // remember last synced copr username, so that we don't refresh
+    // remember last synced copr username and prefix, so that we don't refresh
     // unnecessarily, e.g. after a blur that follows keyup
-    var last_synced_username;
+    var last_synced_query;
     var last_sync_successful;
+    // number of projects loaded at once
+    var per_page = 100;
 
-    $("#id_copr_username").on("keyup blur", function() {
-        // coprnames_url has to be defined in template, since it's processed
+    var $select = $("#id_copr_name");
+    // projects are filtered on server-side by the prefix typed here
+    var $filter = $("<input>").attr({
+        "type": "text",
+        "id": "id_copr_name_filter",
+        "class": "form-control",
+        "placeholder": "Type the beginning of the project name to filter the list"
+    });
+    // further pages are loaded only on demand
+    var $more = $("<a>").attr("href", "#").text("Load more projects").hide();
+    $select.before($filter).after($more);
+
+    var current_query = function() {
+        return $("#id_copr_username").val() + "\n" + $filter.val();
+    };
+
+    var load_page = function(page) {
+        var curr_name = $("#id_copr_username").val();
+        var curr_query = current_query();
+        var url = coprsearch_url.replace("__copr_username__", encodeURIComponent(curr_name));
+        $more.hide();
+        $.get(url, {"q": $filter.val(), "page": page, "per_page": per_page}, function(data) {
+            if (current_query() != curr_query) {
+                return
+            }
+            if (page == 1) {
+                $select.empty();
+            }
+            for (i in data.results) {
+                $select.append(
+                    $("<option>").attr("value", data.results[i])
+                        .text(data.results[i])
+                );
+            }
+            if (data.next) {
+                $more.data("page", data.next).show();
+            }
+            // only set last_sync* if we were successful
+            last_synced_query = curr_query
+            last_sync_successful = true
+        }, "json");
+    };
+
+    $more.on("click", function(event) {
+        event.preventDefault();
+        load_page($more.data("page"));
+    });
+
+    $("#id_copr_username").add($filter).on("keyup blur", function() {
+        // coprsearch_url has to be defined in template, since it's processed
         // on server-side
         if (timer) {
             clearTimeout(timer);
         }
         timer = setTimeout(function() {
-            var curr_name = $("#id_copr_username").val()
-            if (last_sync_successful && last_synced_username == curr_name) {
+            if (last_sync_successful && last_synced_query == current_query()) {
                 return
             } else {
                 last_sync_successful = false
             }
-            var url = coprnames_url.replace("__copr_username__", curr_name);
-            var $select = $("#id_copr_name");
-            $select.empty();
-            $.get(url, function(projects) {
-                for (i in projects) {
-                    $select.append(
-                        $("<option>").attr("value", projects[i])
-                            .text(projects[i])
-                    );
-                }
-                // only set last_sync* if we were successful
-                last_synced_username = curr_name
-                last_sync_successful = true
-            }, "json");
+            if (!$("#id_copr_username").val()) {
+                $select.empty();
+                $more.hide();
+                return
+            }
+            load_page(1);
         }, 600);
     });
 });
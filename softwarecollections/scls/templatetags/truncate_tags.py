@@ -1,8 +1,12 @@
 """Featured truncate filters."""
 
 from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 from django.utils.text import Truncator
 
+from ..markup import MORE
+
 
 register = template.Library()
 
@@ -83,3 +87,19 @@ def truncate(parser, token):
 
     return TruncateNode(value, num, mode, stop)
 
+
+
+@register.filter
+def readmore(value, url):
+    """
+    Replaces the placeholder left in pre-truncated HTML
+    (see ``SoftwareCollection.description_preview_html``)
+    with the link to the whole text.
+
+    Example:
+
+        {{ obj.description_preview_html | readmore:obj.get_absolute_url }}
+
+    """
+    link = format_html("... <a href='{}'>[more]</a>", url)
+    return mark_safe(value.replace(MORE, link))
@@ -13,6 +13,7 @@ urlpatterns = [
     url(r'^tag/(?P<name>.*)/$',                     views.list_tag,     name='list_tag'),
     url(r'^new/$',                                  views.new,          name='new'),
     url(r'^coprnames/(?P<copr_username>[^/]+)?/?$', views.coprnames,    name='coprnames'),
+    url(r'^coprsearch/(?P<copr_username>[^/]+)/$', views.coprsearch,   name='coprsearch'),
     url(r'^(?P<slug>[^/]+/[^/]+)/$',                views.detail,       name='detail'),
     url(r'^(?P<slug>[^/]+/[^/]+)/edit/$',           views.edit,         name='edit'),
     url(r'^(?P<slug>[^/]+/[^/]+)/acl/$',            views.acl,          name='acl'),
@@ -1,42 +1,64 @@
+import hashlib
 import json
+import logging
+import os
+from urllib.parse import quote
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied, ObjectDoesNotExist
 from django.core.mail import mail_managers
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.urls import reverse
 from django.db import DatabaseError
-from django.db.models import Q
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.cache import never_cache
 from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, DetailView, UpdateView
-from softwarecollections.copr import CoprProxy
+from softwarecollections.copr import CachedCoprProxy, CoprException
 from tagging.models import Tag
 from libravatar import libravatar_url
 
+from . import downloads, search
 from .forms import (
     FilterForm, CreateForm, UpdateForm, DeleteForm, RateForm,
     CollaboratorsForm, CoprsForm, ReposForm, ReviewReqForm, SyncReqForm,
-    ComplainForm
+    ComplainForm, ORDER_BY_RELEVANCE,
 )
-from .models import Copr, SoftwareCollection, Repo, Score
+from .models import Copr, SoftwareCollection, Repo, Score, SyncRequest, SYNC_PRIORITY_USER
+from .pagination import KeysetPaginator
 
+logger = logging.getLogger(__name__)
 
-def _list(request, template, queryset, dictionary, **kwargs):
+
+# columns used by scls/softwarecollection_preview.html and by the ordering of lists
+PREVIEW_FIELDS = (
+    'id', 'slug', 'title', 'description', 'policy', 'approved', 'score', 'score_count',
+    'download_count', 'create_date', 'maintainer__username',
+    'maintainer__first_name', 'maintainer__last_name',
+)
+
+
+def _list(request, template, queryset, dictionary, keyset=False, **kwargs):
+    # load the maintainers with the collections and skip unused (large) columns
+    queryset      = queryset.select_related('maintainer').only(*PREVIEW_FIELDS)
     filter_form   = FilterForm(data=request.GET)
+    searching     = False
     if filter_form.is_valid():
         if filter_form.cleaned_data['search']:
-            search = Q()
-            for word in filter_form.cleaned_data['search'].split():
-                search |= Q(name__contains=word) | Q(title__contains=word)
-                if filter_form.cleaned_data['search_desc']:
-                    search |= Q(description__contains=word)
-            queryset = queryset.filter(search)
+            queryset = search.search(
+                queryset,
+                filter_form.cleaned_data['search'],
+                filter_form.cleaned_data['search_desc'],
+            )
+            searching = True
         if filter_form.cleaned_data['approved']:
             queryset = queryset.filter(approved=True)
         if filter_form.cleaned_data['policy']:
@@ -51,20 +73,38 @@ def _list(request, template, queryset, dictionary, **kwargs):
         per_page = filter_form.cleaned_data['per_page'] or \
                    filter_form.fields['per_page'].initial
         order_by = filter_form.cleaned_data['order_by'] or \
+                   (searching and ORDER_BY_RELEVANCE) or \
                    filter_form.fields['order_by'].initial
     else:
         per_page = filter_form.fields['per_page'].initial
         order_by = filter_form.fields['order_by'].initial
-    paginator = Paginator(queryset.order_by('-approved', order_by), per_page)
-    page = request.GET.get('page')
-    try:
-        collections = paginator.page(page)
-    except PageNotAnInteger:
-        # If page is not an integer, deliver first page.
-        collections = paginator.page(1)
-    except EmptyPage:
-        # If page is out of range (e.g. 9999), deliver last page of results.
-        collections = paginator.page(paginator.num_pages)
+    if order_by == ORDER_BY_RELEVANCE:
+        # the most relevant first, then the most recent
+        order_by = ('-' + search.RANK, '-create_date') if searching else \
+                   (filter_form.fields['order_by'].initial,)
+    else:
+        order_by = (order_by,)
+    # links to numbered pages keep working in the keyset mode
+    if keyset and getattr(settings, 'LIST_PAGINATION', 'offset') == 'keyset' \
+            and 'page' not in request.GET:
+        # seek to the page instead of counting and skipping the preceding ones;
+        # the ordering columns must not be NULL to be compared
+        if '-score' in order_by:
+            queryset = queryset.annotate(score_key=Coalesce('score', Value(0)))
+            order_by = tuple('-score_key' if o == '-score' else o for o in order_by)
+        paginator = KeysetPaginator(queryset, ('-approved',) + order_by, per_page)
+        collections = paginator.get_page(request.GET.get('after'), request.GET.get('before'))
+    else:
+        paginator = Paginator(queryset.order_by('-approved', *order_by), per_page)
+        page = request.GET.get('page')
+        try:
+            collections = paginator.page(page)
+        except PageNotAnInteger:
+            # If page is not an integer, deliver first page.
+            collections = paginator.page(1)
+        except EmptyPage:
+            # If page is out of range (e.g. 9999), deliver last page of results.
+            collections = paginator.page(paginator.num_pages)
     dictionary['collections'] = collections
     dictionary['filter_form'] = filter_form
     dictionary['paginator']   = paginator
@@ -73,7 +113,7 @@ def _list(request, template, queryset, dictionary, **kwargs):
 
 def list_all(request, **kwargs):
     queryset = SoftwareCollection.objects.filter(has_content=True)
-    return _list(request, 'scls/list_all.html', queryset, {}, **kwargs)
+    return _list(request, 'scls/list_all.html', queryset, {}, keyset=True, **kwargs)
 
 
 @login_required
@@ -91,7 +131,7 @@ def list_user(request, username, **kwargs):
         gravatar = ""
     queryset = user.softwarecollection_set.filter(has_content=True)
     dictionary = {'user': user, "gravatar": gravatar}
-    return _list(request, 'scls/list_user.html', queryset, dictionary, **kwargs)
+    return _list(request, 'scls/list_user.html', queryset, dictionary, keyset=True, **kwargs)
 
 
 def list_tag(request, name, **kwargs):
@@ -102,17 +142,51 @@ def list_tag(request, name, **kwargs):
         tag.name = name
     queryset = SoftwareCollection.tagged.with_all(tag).filter(has_content=True)
     dictionary = {'tag': tag}
-    return _list(request, 'scls/list_tag.html', queryset, dictionary, **kwargs)
+    return _list(request, 'scls/list_tag.html', queryset, dictionary, keyset=True, **kwargs)
 
 
 def coprnames(request, copr_username, **kwargs):
     if copr_username:
-        coprnames = CoprProxy().coprnames(copr_username)
+        coprnames = CachedCoprProxy().coprnames(copr_username)
     else:
         coprnames = []
     return HttpResponse(json.dumps(sorted(coprnames)), content_type='application/json')
 
 
+COPRSEARCH_PER_PAGE = 20
+COPRSEARCH_MAX_PER_PAGE = 100
+
+def coprsearch(request, copr_username, **kwargs):
+    """
+    return page of copr names starting with the prefix given as GET parameter q
+    the list of coprs is served from the cache (and refreshed in background)
+    """
+    try:
+        coprnames = CachedCoprProxy().coprnames(copr_username)
+    except CoprException:
+        coprnames = []
+    prefix = request.GET.get('q', '').lower()
+    try:
+        per_page = min(int(request.GET.get('per_page', COPRSEARCH_PER_PAGE)), COPRSEARCH_MAX_PER_PAGE)
+    except ValueError:
+        per_page = COPRSEARCH_PER_PAGE
+    paginator = Paginator(
+        sorted(name for name in coprnames if name.lower().startswith(prefix)),
+        max(per_page, 1),
+    )
+    page = paginator.get_page(request.GET.get('page'))
+    response = JsonResponse({
+        'results':  page.object_list,
+        'count':    paginator.count,
+        'page':     page.number,
+        'next':     page.has_next() and page.next_page_number() or None,
+    })
+    # let browsers revalidate the response cheaply using If-None-Match
+    response['ETag'] = '"{}"'.format(hashlib.md5(response.content).hexdigest())
+    patch_cache_control(response, private=True, no_cache=True)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
 class Detail(DetailView):
     model = SoftwareCollection
     context_object_name = 'scl'
@@ -301,6 +375,7 @@ class SyncReq(UpdateView):
             raise PermissionDenied()
 
     def form_valid(self, form):
+        SyncRequest.enqueue([self.object.id], SYNC_PRIORITY_USER)
         messages.success(self.request, _('The synchronization has been requested.'))
         return super(SyncReq, self).form_valid(form)
 
@@ -334,13 +409,47 @@ class Complain(UpdateView):
 complain = Complain.as_view()
 
 
+def _download_response(repo):
+    """ return response serving the release package according to DOWNLOAD_MODE """
+    mode = settings.DOWNLOAD_MODE
+    if mode == 'redirect':
+        return HttpResponseRedirect(repo.get_rpmfile_url())
+    path = repo.get_rpmfile_symlink_path()
+    if mode == 'x-sendfile':
+        # the file is sent by the front-end server (e.g. Apache with mod_xsendfile)
+        response = HttpResponse(content_type='application/x-rpm')
+        response['X-Sendfile'] = path
+    elif mode == 'x-accel-redirect':
+        # the file is sent by the front-end server (nginx) from the internal location
+        response = HttpResponse(content_type='application/x-rpm')
+        response['X-Accel-Redirect'] = '{}/{}'.format(
+            settings.DOWNLOAD_ACCEL_PREFIX.rstrip('/'),
+            quote(os.path.relpath(path, str(settings.REPOS_ROOT))),
+        )
+    elif mode == 'stream':
+        # the file is streamed by the application server (wsgi.file_wrapper if available)
+        try:
+            response = FileResponse(open(path, 'rb'), content_type='application/x-rpm')
+        except FileNotFoundError:
+            raise Http404()
+    else:
+        raise ImproperlyConfigured('Unknown DOWNLOAD_MODE: {}'.format(mode))
+    return response
+
+
 def download(request, slug):
-    repo = get_object_or_404(Repo, slug=slug)
-    repo.download_count+=1
-    repo.save()
-    repo.scl.download_count+=1
-    repo.scl.save()
-    return HttpResponseRedirect(repo.get_rpmfile_url())
+    repo = get_object_or_404(Repo.objects.select_related('scl__maintainer'), slug=slug)
+    response = _download_response(repo)
+    if settings.DOWNLOAD_STATS_BUFFER:
+        # aggregated later by scldownloads, no database write is needed
+        try:
+            downloads.record(settings.DOWNLOAD_STATS_BUFFER, repo.id)
+        except OSError as e:
+            logger.warning('Failed to record download of {}: {}'.format(repo.slug, e))
+            repo.count_download()
+    else:
+        repo.count_download()
+    return response
 
 
 @require_POST
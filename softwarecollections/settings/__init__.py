@@ -70,6 +70,12 @@ SERVER_EMAIL = "SoftwareCollections @ {} <admin@softwarecollections.org>".format
 COPR_URL = "https://copr.fedorainfracloud.org"
 COPR_API_URL = COPR_URL + "/api"
 COPR_COPRS_URL = COPR_URL + "/coprs"
+# Copr API responses are cached for COPR_CACHE_TTL seconds,
+# then served for up to COPR_CACHE_STALE seconds while being refreshed
+COPR_CACHE_TTL = 300
+COPR_CACHE_STALE = 86400
+# missing Copr projects are remembered for COPR_CACHE_NEGATIVE_TTL seconds
+COPR_CACHE_NEGATIVE_TTL = 60
 
 # Database
 # https://docs.djangoproject.com/en/1.9/ref/settings/#databases
@@ -141,8 +147,40 @@ REPOS_ROOT = BASE_DIR / "htdocs" / "repos"
 # URL prefix for repo.
 REPOS_URL = "/repos/"
 
-# Absolute path to the directory used by yum cache
-YUM_CACHE_ROOT = Path("/tmp/softwarecollections-yum-cache")
+# Number of concurrent package downloads when mirroring repos of one collection
+REPOS_MIRROR_WORKERS = 4
+
+# Number of repos of one collection processed (createrepo etc.) at a time
+REPOS_CONTENT_WORKERS = 4
+
+# Where to read provides/requires of synced packages from:
+# "metadata" (repodata created by createrepo_c) or "rpm" (package headers)
+REPOS_DEPENDENCIES_SOURCE = "metadata"
+
+# How release packages are served by the download view:
+# "redirect" to REPOS_URL, "x-sendfile" or "x-accel-redirect" header
+# for the front-end server, or "stream" the file (development)
+DOWNLOAD_MODE = env.load_string("SCL_DOWNLOAD_MODE", default="redirect")
+
+# Internal location of REPOS_ROOT used with "x-accel-redirect" mode
+DOWNLOAD_ACCEL_PREFIX = "/internal/repos/"
+
+# Absolute path to the file download events are appended to;
+# the events are aggregated by "scldownloads" command.
+# If not set, download counters are updated directly in the database.
+DOWNLOAD_STATS_BUFFER = env.load_path(envvar="SCL_DOWNLOAD_STATS_BUFFER")
+
+# Pagination of collection lists: "offset" (numbered pages)
+# or "keyset" (cursors, constant cost of any page)
+LIST_PAGINATION = env.load_string("SCL_LIST_PAGINATION", default="offset")
+
+# How release packages of repos are built: "native" (written directly)
+# or "rpmbuild" (from scl-release.spec)
+REPOS_RELEASE_BUILDER = "native"
+
+# Absolute path to the directory used by createrepo_c cache of package checksums;
+# it should persist between syncs (and reboots) to make metadata updates fast
+YUM_CACHE_ROOT = BASE_DIR / "cache"
 
 # Absolute path to the directory to be used as rpm _topdir
 RPMBUILD_TOPDIR = Path("/tmp/softwarecollections-rpmbuild")
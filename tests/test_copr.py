@@ -0,0 +1,198 @@
+"""Tests for the Copr API client"""
+
+import json
+
+import pytest
+from softwarecollections import copr
+
+API_URL = "https://copr.example.com/api"
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.text = json.dumps(data)
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        raise RuntimeError("HTTP {}".format(self.status_code))
+
+
+class FakeSession:
+    """Serves project details, honouring If-None-Match."""
+
+    def __init__(self, projects):
+        self.projects = projects
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, dict(headers or {})))
+        username, name = url[len(API_URL) :].split("/")[2:4]
+        if (username, name) not in self.projects:
+            return FakeResponse(404)
+        etag = '"{}-{}-{}"'.format(username, name, self.projects[(username, name)])
+        if (headers or {}).get("If-None-Match") == etag:
+            return FakeResponse(304)
+        detail = dict(self.projects[(username, name)], name=name)
+        return FakeResponse(200, {"detail": detail}, {"ETag": etag})
+
+
+@pytest.fixture(autouse=True)
+def conditional_cache(monkeypatch):
+    cache = copr.ConditionalCache()
+    monkeypatch.setattr(copr, "_conditional_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def session():
+    return FakeSession(
+        {
+            ("hhorak", "mariadb100"): {"last_modified": 1},
+            ("hhorak", "rpmquality"): {"last_modified": 2},
+        }
+    )
+
+
+def test_conditional_request(session):
+    """Unmodified responses are served from the conditional cache"""
+
+    proxy = copr.CoprProxy(API_URL, session=session)
+
+    first = proxy.coprdetail("hhorak", "mariadb100")
+    first["last_modified"] = 42
+    second = proxy.coprdetail("hhorak", "mariadb100")
+
+    assert second == {"name": "mariadb100", "username": "hhorak", "last_modified": 1}
+    assert "If-None-Match" not in session.requests[0][1]
+    assert session.requests[1][1]["If-None-Match"].startswith('"hhorak-mariadb100-')
+
+
+def test_conditional_cache_is_bounded():
+    """Least recently used entries are dropped"""
+
+    cache = copr.ConditionalCache(size=2)
+    cache.set("a", "1", None, {})
+    cache.set("b", "2", None, {})
+    cache.get("a")
+    cache.set("c", "3", None, {})
+
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_coprdetails(session):
+    """Details of many coprs are fetched at once, failures are left out"""
+
+    proxy = copr.CoprProxy(API_URL, session=session)
+
+    details = proxy.coprdetails(
+        [("hhorak", "mariadb100"), ("hhorak", "rpmquality"), ("hhorak", "missing")]
+    )
+
+    assert set(details) == {("hhorak", "mariadb100"), ("hhorak", "rpmquality")}
+    assert details[("hhorak", "rpmquality")]["last_modified"] == 2
+
+
+def test_coprdetail_failure(session):
+    """Failed requests are reported as CoprException"""
+
+    proxy = copr.CoprProxy(API_URL, session=session)
+
+    with pytest.raises(copr.CoprException):
+        proxy.coprdetail("hhorak", "missing")
+
+
+def test_session_is_shared():
+    """Proxies share one pooled session per process"""
+
+    assert copr.CoprProxy().session is copr.CoprProxy().session
+
+
+@pytest.fixture
+def cached_proxy(session, monkeypatch):
+    from django.core.cache import cache
+
+    cache.clear()
+    monkeypatch.setattr(copr, "run_in_background", lambda func, *args: func(*args))
+    return copr.CachedCoprProxy(API_URL, session=session)
+
+
+def test_cached_response(cached_proxy, session):
+    """Fresh responses are served from the shared cache"""
+
+    cached_proxy.coprdetail("hhorak", "mariadb100")
+    detail = copr.CachedCoprProxy(API_URL, session=session).coprdetail("hhorak", "mariadb100")
+
+    assert detail["last_modified"] == 1
+    assert len(session.requests) == 1
+
+
+def test_stale_response_is_revalidated(cached_proxy, session, monkeypatch):
+    """Expired responses are served and refreshed in the background"""
+
+    monkeypatch.setattr(copr, "COPR_CACHE_TTL", -1)
+    cached_proxy.coprdetail("hhorak", "mariadb100")
+    session.projects[("hhorak", "mariadb100")] = {"last_modified": 3}
+    monkeypatch.setattr(copr, "COPR_CACHE_TTL", 300)
+
+    stale = cached_proxy.coprdetail("hhorak", "mariadb100")
+    refreshed = cached_proxy.coprdetail("hhorak", "mariadb100")
+
+    assert stale["last_modified"] == 1
+    assert refreshed["last_modified"] == 3
+    assert len(session.requests) == 2
+
+
+def test_missing_copr_is_remembered(cached_proxy, session):
+    """404 responses are cached as well"""
+
+    for _ in range(2):
+        with pytest.raises(copr.CoprNotFound):
+            cached_proxy.coprdetail("hhorak", "missing")
+
+    assert len(session.requests) == 1
+
+
+def test_fresh_proxy_updates_cache(cached_proxy, session):
+    """Fresh proxy always asks Copr and writes the result through"""
+
+    cached_proxy.coprdetail("hhorak", "mariadb100")
+    session.projects[("hhorak", "mariadb100")] = {"last_modified": 3}
+
+    fresh = copr.CachedCoprProxy(API_URL, session=session, fresh=True)
+    assert fresh.coprdetail("hhorak", "mariadb100")["last_modified"] == 3
+    assert cached_proxy.coprdetail("hhorak", "mariadb100")["last_modified"] == 3
+
+
+@pytest.fixture
+def coprnames(monkeypatch):
+    names = ["mariadb100", "mariadb55", "MariaDB-galera", "rpmquality"]
+    monkeypatch.setattr(copr.CachedCoprProxy, "coprnames", lambda proxy, username: names)
+    return names
+
+
+def test_coprsearch_prefix(client, coprnames):
+    """Copr names are filtered by prefix and paginated server-side"""
+
+    response = client.get("/en/scls/coprsearch/hhorak/", {"q": "maria", "per_page": 2})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": ["MariaDB-galera", "mariadb100"],
+        "count": 3,
+        "page": 1,
+        "next": 2,
+    }
+
+
+def test_coprsearch_not_modified(client, coprnames):
+    """Unchanged results are revalidated using If-None-Match"""
+
+    url = "/en/scls/coprsearch/hhorak/"
+    etag = client.get(url)["ETag"]
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+    coprnames.append("new")
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
@@ -0,0 +1,151 @@
+"""Tests for downloads of release packages"""
+
+import os
+from datetime import date, datetime
+
+import pytest
+from django.utils import timezone
+from softwarecollections.scls import downloads
+from softwarecollections.scls.models import Copr, Repo, SoftwareCollection
+
+
+@pytest.fixture
+def repo(db):
+    scl = SoftwareCollection.objects.get(name="rpmquality")
+    return Repo.objects.create(
+        slug=scl.slug + "/epel-7-x86_64",
+        scl=scl,
+        copr=Copr.objects.get(pk=1),
+        name="epel-7-x86_64",
+        copr_url="https://copr.example.com/epel-7-x86_64",
+    )
+
+
+def test_download_is_counted(client, repo, django_assert_max_num_queries):
+    """Download increments both counters without loading and saving the objects"""
+
+    scl_count = repo.scl.download_count
+
+    with django_assert_max_num_queries(5) as context:
+        response = client.get("/en/scls/{}/download/".format(repo.slug))
+    statements = [query["sql"].split()[0] for query in context.captured_queries]
+
+    assert response.status_code == 302
+    assert response["Location"].endswith(repo.rpmfile)
+    assert (statements.count("SELECT"), statements.count("UPDATE")) == (1, 2)
+    assert Repo.objects.get(id=repo.id).download_count == 1
+    assert SoftwareCollection.objects.get(id=repo.scl_id).download_count == scl_count + 1
+
+
+def test_download_is_buffered(client, repo, settings, tmpdir, django_assert_max_num_queries):
+    """With buffer configured, download is only appended to the buffer"""
+
+    settings.DOWNLOAD_STATS_BUFFER = str(tmpdir.join("downloads"))
+
+    with django_assert_max_num_queries(1):
+        response = client.get("/en/scls/{}/download/".format(repo.slug))
+
+    assert response.status_code == 302
+    assert tmpdir.join("downloads").read() == "{} {}\n".format(repo.id, timezone.localdate())
+
+
+def test_download_date_is_local(repo, settings, tmpdir, monkeypatch):
+    """Downloads are recorded for the day in the configured time zone"""
+
+    settings.TIME_ZONE = "Europe/Prague"
+    monkeypatch.setattr(
+        timezone, "now", lambda: datetime(2020, 1, 1, 23, 30, tzinfo=timezone.utc)
+    )
+
+    downloads.record(str(tmpdir.join("downloads")), repo.id)
+
+    assert tmpdir.join("downloads").read() == "{} 2020-01-02\n".format(repo.id)
+
+
+def test_flush_buffer(repo, tmpdir):
+    """Buffered downloads are aggregated per repo and day"""
+
+    path = str(tmpdir.join("downloads"))
+    scl_count = repo.scl.download_count
+    tmpdir.join("downloads.1").write("{} 2020-01-01\n".format(repo.id))
+    for _ in range(3):
+        downloads.record(path, repo.id)
+    downloads.record(path, 0)
+    tmpdir.join("downloads").write("garbage\n", mode="a")
+
+    assert downloads.flush(path, grace=0) == 4
+    assert downloads.flush(path, grace=0) == 0
+    assert tmpdir.listdir() == []
+    assert dict(repo.download_stats.values_list("date", "count")) == {
+        date(2020, 1, 1): 1,
+        timezone.localdate(): 3,
+    }
+    assert Repo.objects.get(id=repo.id).download_count == 4
+    assert SoftwareCollection.objects.get(id=repo.scl_id).download_count == scl_count + 4
+
+
+def test_flush_counts_buffer_once(repo, tmpdir, monkeypatch):
+    """Buffer is stored and removed together, a failed run is repeated once"""
+
+    path = str(tmpdir.join("downloads"))
+    downloads.record(path, repo.id)
+
+    def unlink(path):
+        raise OSError("interrupted")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(downloads.os, "unlink", unlink)
+        with pytest.raises(OSError):
+            downloads.flush(path, grace=0)
+
+    assert Repo.objects.get(id=repo.id).download_count == 0
+    assert downloads.flush(path, grace=0) == 1
+    assert Repo.objects.get(id=repo.id).download_count == 1
+    assert tmpdir.listdir() == []
+
+
+@pytest.fixture
+def rpmfile(repo, settings, tmpdir):
+    settings.REPOS_ROOT = str(tmpdir.mkdir("repos"))
+    path = tmpdir.join("repos", repo.scl.slug, repo.name, "noarch", repo.rpmfile)
+    path.write_binary(b"release package", ensure=True)
+    os.symlink(repo.rpmfile, repo.get_rpmfile_symlink_path())
+    return path
+
+
+@pytest.mark.parametrize(
+    "mode,header,value",
+    [
+        ("x-sendfile", "X-Sendfile", "{root}/{slug}/epel-7-x86_64/noarch/{symlink}"),
+        (
+            "x-accel-redirect",
+            "X-Accel-Redirect",
+            "/internal/repos/{slug}/epel-7-x86_64/noarch/{symlink}",
+        ),
+    ],
+)
+def test_download_served_by_frontend(client, repo, rpmfile, settings, mode, header, value):
+    """Front-end server is asked to send the package in the same response"""
+
+    settings.DOWNLOAD_MODE = mode
+
+    response = client.get("/en/scls/{}/download/".format(repo.slug))
+
+    assert response.status_code == 200
+    assert response[header] == value.format(
+        root=settings.REPOS_ROOT, slug=repo.scl.slug, symlink=repo.rpmfile_symlink
+    )
+    assert Repo.objects.get(id=repo.id).download_count == 1
+
+
+def test_download_streamed(client, repo, rpmfile, settings):
+    """In stream mode, the package is sent by the application"""
+
+    settings.DOWNLOAD_MODE = "stream"
+
+    response = client.get("/en/scls/{}/download/".format(repo.slug))
+
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"release package"
+    rpmfile.remove()
+    assert client.get("/en/scls/{}/download/".format(repo.slug)).status_code == 404
@@ -0,0 +1,97 @@
+"""Tests for the number of queries of collection lists and the cached filter choices"""
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from softwarecollections.scls import search
+from softwarecollections.scls.forms import get_repo_choices
+from softwarecollections.scls.models import (
+    REPO_CHOICES_CACHE_KEY,
+    Copr,
+    Repo,
+    SoftwareCollection,
+)
+
+# filter form repo choices (cached), the page of collections and the (cached) total count
+QUERY_BUDGET = 3
+
+
+@pytest.fixture
+def scls(db):
+    User = get_user_model()
+    for n in range(60):
+        maintainer = User.objects.create(
+            username="user{}".format(n), first_name="User", last_name=str(n)
+        )
+        SoftwareCollection.objects.create(
+            name="scl{}".format(n),
+            slug="user{}/scl{}".format(n, n),
+            title="Collection {}".format(n),
+            description="**Description** of collection {}".format(n),
+            maintainer=maintainer,
+            has_content=True,
+            score=n % 5 + 1,
+            score_count=1,
+        )
+    cache.clear()
+    # presence of the search index is detected once per process
+    search.has_fts5()
+
+
+@pytest.mark.parametrize("per_page", [10, 25, 50])
+@pytest.mark.parametrize("order_by", ["-create_date", "-score", "title"])
+def test_list_query_budget(client, scls, per_page, order_by, django_assert_max_num_queries):
+    """The number of queries does not depend on the number of listed collections"""
+
+    with django_assert_max_num_queries(QUERY_BUDGET):
+        response = client.get("/en/scls/", {"per_page": per_page, "order_by": order_by})
+
+    collections = response.context["collections"]
+    assert len(collections) == per_page
+    assert collections[0].maintainer.get_full_name() in response.content.decode()
+
+
+def test_search_query_budget(client, scls, django_assert_max_num_queries):
+    """Search results are listed within the same budget"""
+
+    with django_assert_max_num_queries(QUERY_BUDGET):
+        response = client.get("/en/scls/", {"search": "collection", "search_desc": "on"})
+
+    assert len(response.context["collections"]) == 10
+
+
+@pytest.fixture
+def repo_choices(db):
+    cache.clear()
+    return get_repo_choices
+
+
+def test_repo_choices_are_cached(repo_choices, django_assert_num_queries):
+    """Repo filter choices are computed once"""
+
+    repo_choices()
+
+    with django_assert_num_queries(0):
+        assert repo_choices()[0] == ("", "All repos")
+
+
+def test_repo_choices_follow_repos(repo_choices):
+    """New and deleted repos invalidate the choices, updates of existing repos do not"""
+
+    scl = SoftwareCollection.objects.get(name="rpmquality")
+    assert "epel-7-x86_64" not in dict(repo_choices())
+
+    repo = Repo.objects.create(
+        slug=scl.slug + "/epel-7-x86_64",
+        scl=scl,
+        copr=Copr.objects.get(pk=1),
+        name="epel-7-x86_64",
+        copr_url="https://copr.example.com/epel-7-x86_64",
+    )
+    assert dict(repo_choices())["epel-7-x86_64"] == "Epel 7 - x86_64"
+
+    repo.save(update_fields=["copr", "copr_url"])
+    assert cache.get(REPO_CHOICES_CACHE_KEY) is not None
+
+    repo.delete()
+    assert "epel-7-x86_64" not in dict(repo_choices())
@@ -0,0 +1,68 @@
+"""Tests for the cached rendering of Markdown texts"""
+
+import pytest
+from django.core.cache import cache
+from softwarecollections.scls import markup
+from softwarecollections.scls.models import SoftwareCollection
+from softwarecollections.scls.templatetags.truncate_tags import readmore
+
+
+@pytest.fixture
+def scl(db):
+    cache.clear()
+    markup.render.cache_clear()
+    markup.preview.cache_clear()
+    return SoftwareCollection.objects.get(name="rpmquality")
+
+
+def test_render_is_safe(scl):
+    """Raw HTML is stripped except for the (trusted) policy text"""
+
+    assert markup.render("**bold** <script>x</script>") == (
+        "<p><strong>bold</strong> [HTML_REMOVED]x[HTML_REMOVED]</p>\n"
+    )
+    assert scl.policy_text_html.startswith("<p><strong>")
+
+
+def test_preview_is_truncated(scl):
+    """Long descriptions are cut off with a link to the collection"""
+
+    scl.description = "word " * 60
+    html = readmore(markup.preview(scl.description), "/scl/")
+
+    assert html.count("word") == markup.PREVIEW_WORDS
+    assert html.endswith("... <a href='/scl/'>[more]</a></p>")
+    assert markup.MORE not in readmore(markup.preview("short"), "/scl/")
+
+
+def test_rendered_on_save(scl, monkeypatch):
+    """Saved texts are rendered once and served from the cache"""
+
+    scl.description = "New **description**"
+    scl.save()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rendered again")
+
+    monkeypatch.setattr(markup.markdown2, "markdown", fail)
+    markup.render.cache_clear()
+    markup.preview.cache_clear()
+
+    assert scl.description_html == "<p>New <strong>description</strong></p>\n"
+    assert "<strong>description</strong>" in scl.description_preview_html
+    assert scl.instructions_html
+
+
+def test_templates_use_rendered_html(client, scl):
+    """Detail and list pages show the rendered description"""
+
+    SoftwareCollection.objects.update(has_content=True)
+    scl.description = "Checks the **quality** of packages"
+    scl.save()
+
+    detail = client.get(scl.get_absolute_url()).content.decode()
+    listing = client.get("/en/scls/").content.decode()
+
+    assert "<strong>quality</strong>" in detail
+    assert "<strong>quality</strong>" in listing
+    assert markup.MORE not in listing
@@ -0,0 +1,212 @@
+"""Tests for native yum repository mirroring"""
+
+import gzip
+import hashlib
+import json
+from io import BytesIO
+
+import pytest
+from softwarecollections.scls import mirror
+from softwarecollections.scls.repodata import iter_packages, parse_repomd
+
+BASEURL = "https://copr.example.com/results/user/project/epel-7-x86_64"
+
+PACKAGES = {
+    "00001-foo/foo-1.0-1.el7.noarch.rpm": b"foo package content",
+    "00001-foo/foo-1.0-1.el7.src.rpm": b"foo source package",
+    "00002-bar/bar-2.0-1.el7.x86_64.rpm": b"bar package content" * 100,
+}
+
+PACKAGE_TEMPLATE = """
+<package type="rpm">
+  <name>{name}</name>
+  <checksum type="sha256" pkgid="YES">{checksum}</checksum>
+  <size package="{size}" installed="0" archive="0"/>
+  <location href="{location}"/>
+</package>"""
+
+
+def make_primary(packages):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<metadata xmlns="http://linux.duke.edu/metadata/common" '
+        'xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="{}">{}\n'
+        "</metadata>\n".format(
+            len(packages),
+            "".join(
+                PACKAGE_TEMPLATE.format(
+                    name=location.rsplit("/", 1)[-1].split("-")[0],
+                    checksum=hashlib.sha256(content).hexdigest(),
+                    size=len(content),
+                    location=location,
+                )
+                for location, content in packages.items()
+            ),
+        )
+    ).encode("utf-8")
+
+
+def make_repomd(primary_location, primary):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<repomd xmlns="http://linux.duke.edu/metadata/repo">\n'
+        "  <revision>1580000000</revision>\n"
+        '  <data type="primary">\n'
+        '    <checksum type="sha256">{}</checksum>\n'
+        '    <location href="{}"/>\n'
+        "  </data>\n"
+        "</repomd>\n".format(hashlib.sha256(primary).hexdigest(), primary_location)
+    ).encode("utf-8")
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.raw = BytesIO(content)
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        return iter([self.content])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeSession:
+    def __init__(self, files):
+        self.files = files
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return FakeResponse(self.files[url])
+
+
+@pytest.fixture
+def session():
+    primary = gzip.compress(make_primary(PACKAGES))
+    files = {
+        BASEURL + "/repodata/repomd.xml": make_repomd(
+            "repodata/primary.xml.gz", primary
+        ),
+        BASEURL + "/repodata/primary.xml.gz": primary,
+    }
+    files.update(
+        {BASEURL + "/" + location: content for location, content in PACKAGES.items()}
+    )
+    return FakeSession(files)
+
+
+def test_parse_repomd():
+    """repomd.xml provides revision and location of primary metadata"""
+
+    repomd = parse_repomd(make_repomd("repodata/primary.xml.gz", b""))
+
+    assert repomd.revision == "1580000000"
+    assert repomd.data["primary"].location == "repodata/primary.xml.gz"
+
+
+def test_iter_packages():
+    """All packages are read from primary.xml"""
+
+    packages = list(iter_packages(BytesIO(make_primary(PACKAGES))))
+
+    assert {pkg.location for pkg in packages} == set(PACKAGES)
+    assert all(pkg.size == len(PACKAGES[pkg.location]) for pkg in packages)
+
+
+def test_mirror_downloads_all_packages(tmpdir, session):
+    """Empty mirror downloads every package of the repository"""
+
+    downloaded = mirror.RepoMirror(BASEURL, str(tmpdir), session=session).sync()
+
+    assert len(downloaded) == len(PACKAGES)
+    for location, content in PACKAGES.items():
+        assert tmpdir.join(location).read_binary() == content
+
+
+def test_mirror_skips_current_packages(tmpdir, session):
+    """Only missing or changed packages are downloaded"""
+
+    tmpdir.join("00001-foo/foo-1.0-1.el7.noarch.rpm").write_binary(
+        PACKAGES["00001-foo/foo-1.0-1.el7.noarch.rpm"], ensure=True
+    )
+    tmpdir.join("00002-bar/bar-2.0-1.el7.x86_64.rpm").write_binary(
+        b"truncated", ensure=True
+    )
+
+    downloaded = mirror.RepoMirror(BASEURL, str(tmpdir), session=session).sync()
+
+    assert {pkg.location for pkg in downloaded} == {
+        "00001-foo/foo-1.0-1.el7.src.rpm",
+        "00002-bar/bar-2.0-1.el7.x86_64.rpm",
+    }
+
+
+def test_mirror_downloads_rebuilt_packages(tmpdir, session):
+    """Package rebuilt with the same name and size is downloaded again"""
+
+    location = "00001-foo/foo-1.0-1.el7.noarch.rpm"
+    mirror.RepoMirror(BASEURL, str(tmpdir), session=session).sync()
+    rebuilt = dict(PACKAGES)
+    rebuilt[location] = PACKAGES[location].upper()
+    primary = gzip.compress(make_primary(rebuilt))
+    session.files[BASEURL + "/repodata/primary.xml.gz"] = primary
+    session.files[BASEURL + "/" + location] = rebuilt[location]
+
+    downloaded = mirror.RepoMirror(BASEURL, str(tmpdir), session=session).sync(
+        make_repomd("repodata/primary.xml.gz", primary)
+    )
+
+    assert [pkg.location for pkg in downloaded] == [location]
+    assert tmpdir.join(location).read_binary() == rebuilt[location]
+
+
+def test_mirror_verifies_packages_once(tmpdir, session, monkeypatch):
+    """Checksums of packages mirrored before are computed only once"""
+
+    for location, content in PACKAGES.items():
+        tmpdir.join(location).write_binary(content, ensure=True)
+    assert mirror.RepoMirror(BASEURL, str(tmpdir), session=session).sync() == []
+
+    monkeypatch.setattr(mirror.hashlib, "new", None)
+
+    assert mirror.RepoMirror(BASEURL, str(tmpdir), session=session).sync() == []
+    assert set(json.loads(tmpdir.join(mirror.CHECKSUMS_FILE).read())) == set(PACKAGES)
+
+
+def test_mirror_rejects_corrupted_package(tmpdir, session):
+    """Package with unexpected checksum is never stored in the mirror"""
+
+    location = "00001-foo/foo-1.0-1.el7.noarch.rpm"
+    session.files[BASEURL + "/" + location] = b"corrupted package content"
+
+    with pytest.raises(mirror.MirrorError):
+        mirror.RepoMirror(BASEURL, str(tmpdir), session=session).sync()
+
+    assert not tmpdir.join(location).check()
+    assert not tmpdir.join(location + ".part").check()
+
+
+def test_mirror_rejects_location_outside_destination(tmpdir, session):
+    """Package location cannot point outside of the mirror directory"""
+
+    repo = mirror.RepoMirror(BASEURL, str(tmpdir.join("repo")), session=session)
+
+    with pytest.raises(mirror.MirrorError):
+        repo._path("../other-repo/evil.rpm")
+
+
+def test_session_is_shared_per_process(monkeypatch):
+    """Syncs of one worker reuse its session, forked workers get their own"""
+
+    session = mirror.get_session()
+
+    assert mirror.get_session() is session
+    monkeypatch.setattr(mirror.os, "getpid", lambda: -1)
+    assert mirror.get_session() is not session
@@ -0,0 +1,140 @@
+"""Tests for keyset pagination of collection lists"""
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from softwarecollections.scls.models import SoftwareCollection
+from softwarecollections.scls.pagination import KeysetPaginator, encode_cursor
+
+COUNT = 23
+
+
+@pytest.fixture
+def scls(db):
+    user = get_user_model().objects.create(username="pager")
+    for n in range(COUNT):
+        scl = SoftwareCollection.objects.create(
+            name="scl{}".format(n),
+            slug="pager/scl{}".format(n),
+            title="Collection {}".format(n % 5),
+            description="description",
+            maintainer=user,
+            has_content=True,
+            approved=n % 3 == 0,
+            score=n % 4 or None,
+        )
+        scl.collaborators.add(user)
+    return SoftwareCollection.objects.filter(maintainer=user)
+
+
+def walk(paginator):
+    """Collect all pages following the next cursors"""
+
+    pages = [paginator.get_page()]
+    while pages[-1].has_next():
+        pages.append(paginator.get_page(after=pages[-1].next_cursor))
+    return pages
+
+
+@pytest.mark.parametrize(
+    "ordering", [("-approved", "title"), ("-approved", "-create_date"), ("-approved", "-score")]
+)
+def test_pages_follow_ordering(scls, ordering):
+    """Pages together contain all collections in the order of the ordering"""
+
+    if "-score" in ordering:
+        # NULL scores are not comparable, the views use the same annotation
+        scls = scls.annotate(score_key=Coalesce("score", Value(0)))
+        ordering = ("-approved", "-score_key")
+    paginator = KeysetPaginator(scls, ordering, 10)
+
+    pages = walk(paginator)
+
+    assert [len(page) for page in pages] == [10, 10, 3]
+    assert [scl.id for page in pages for scl in page] == list(
+        scls.order_by(*paginator.ordering).values_list("id", flat=True)
+    )
+    assert not pages[0].has_previous()
+    assert paginator.ordering[-1] == ("-id" if ordering[-1].startswith("-") else "id")
+
+
+def test_previous_page(scls):
+    """Previous cursor leads back to the same page"""
+
+    paginator = KeysetPaginator(scls, ("-approved", "title"), 10)
+    first, second, third = walk(paginator)
+
+    assert list(paginator.get_page(before=third.previous_cursor)) == list(second)
+    assert list(paginator.get_page(before=second.previous_cursor)) == list(first)
+    assert not paginator.get_page(before=second.previous_cursor).has_previous()
+
+
+def test_invalid_cursor(scls):
+    """Broken or foreign cursors lead to the first page"""
+
+    paginator = KeysetPaginator(scls, ("-approved", "title"), 10)
+    first = list(paginator.get_page())
+
+    assert list(paginator.get_page(after="garbage!")) == first
+    assert list(paginator.get_page(after=encode_cursor([1, 2]))) == first
+    assert list(paginator.get_page(after=encode_cursor([True, "x", "not an id"]))) == first
+
+
+def test_deep_page_does_not_count(scls, django_assert_num_queries):
+    """Any page is fetched by a single query"""
+
+    paginator = KeysetPaginator(scls, ("-approved", "title"), 10)
+    cursor = walk(paginator)[1].next_cursor
+
+    with django_assert_num_queries(1):
+        page = paginator.get_page(after=cursor)
+
+    assert len(page) == 3
+
+
+def test_count_is_cached(scls, django_assert_num_queries):
+    """Total count is computed once for the same filter"""
+
+    cache.clear()
+    assert KeysetPaginator(scls, ("title",), 10).count == COUNT
+    with django_assert_num_queries(0):
+        assert KeysetPaginator(scls, ("title",), 10).count == COUNT
+
+
+def test_list_view_cursors(client, scls, settings):
+    """Collection list links the next page by a cursor"""
+
+    settings.LIST_PAGINATION = "keyset"
+    response = client.get("/en/scls/user/pager/", {"per_page": 10, "order_by": "-score"})
+    collections = response.context["collections"]
+    following = client.get(
+        "/en/scls/user/pager/",
+        {"per_page": 10, "order_by": "-score", "after": collections.next_cursor},
+    ).context["collections"]
+
+    assert collections.keyset
+    assert len(collections) == 10
+    assert "after=" + collections.next_cursor in response.content.decode()
+    assert not {scl.id for scl in collections} & {scl.id for scl in following}
+
+
+def test_offset_pagination(client, scls):
+    """Numbered pages are the default"""
+
+    response = client.get("/en/scls/user/pager/", {"per_page": 10, "page": 3})
+
+    assert response.context["collections"].number == 3
+    assert len(response.context["collections"]) == 3
+
+
+def test_numbered_links_in_keyset_mode(client, scls, settings):
+    """Existing links to numbered pages keep working with cursors enabled"""
+
+    settings.LIST_PAGINATION = "keyset"
+
+    response = client.get("/en/scls/user/pager/", {"per_page": 10, "page": 2})
+
+    assert response.context["collections"].number == 2
+    assert len(response.context["collections"]) == 10
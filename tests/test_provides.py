@@ -0,0 +1,200 @@
+"""Tests for the provides index and related collections"""
+
+from importlib import import_module
+
+import pytest
+from django.apps import apps
+from softwarecollections.scls.models import (
+    Copr,
+    Provide,
+    ProvidesIndex,
+    RelatedRequest,
+    Repo,
+    SoftwareCollection,
+)
+from softwarecollections.scls.relations import build_graph, update_graph, update_relations
+
+
+@pytest.fixture
+def repos_root(tmpdir, settings):
+    settings.REPOS_ROOT = str(tmpdir.mkdir("repos"))
+    return settings.REPOS_ROOT
+
+
+@pytest.fixture
+def scls(db):
+    return {scl.name: scl for scl in SoftwareCollection.objects.all()}
+
+
+def test_provides_index_is_updated(scls):
+    """Only changes of provides are written to the index"""
+
+    scl = scls["rpmquality"]
+
+    scl.update_provides_index(["foo", "bar"])
+    first = {p.name: p.id for p in scl.provides.all()}
+    changed = scl.update_provides_index(["foo", "baz"])
+    second = {p.name: p.id for p in scl.provides.all()}
+
+    assert set(second) == {"foo", "baz"}
+    assert changed == {"bar", "baz"}
+    assert first["foo"] == second["foo"]
+
+
+def test_find_related(scls, repos_root, monkeypatch):
+    """Collections providing the requirements are found via the index"""
+
+    scl = scls["rpmquality"]
+    Repo.objects.create(
+        slug=scl.slug + "/epel-7-x86_64",
+        scl=scl,
+        copr=Copr.objects.get(pk=1),
+        name="epel-7-x86_64",
+        copr_url="https://copr.example.com/epel-7-x86_64",
+    )
+    monkeypatch.setattr(
+        Repo,
+        "read_dependencies",
+        lambda repo, kind, timeout=None: ["mariadb-server >= 10.0", "rpmquality", "bash"],
+    )
+    scls["mariadb100"].update_provides_index(["mariadb-server", "mariadb"])
+    scls["mariadb-galera-5.5-ci"].update_provides_index(["galera"])
+    scl.update_provides_index(["rpmquality"])
+
+    scl.find_related()
+
+    assert list(scl.requires.all()) == [scls["mariadb100"]]
+    assert Provide.objects.filter(name="mariadb").count() == 1
+
+
+def test_graph_update_writes_only_differences(scls):
+    """Whole-catalogue graph is computed in memory and only the diff is stored"""
+
+    rpmquality, mariadb, galera = (
+        scls["rpmquality"],
+        scls["mariadb100"],
+        scls["mariadb-galera-5.5-ci"],
+    )
+    rpmquality.requires.set([galera])
+    galera.update_provides_index(["galera"])
+    provides = {"mariadb": {mariadb.id}, "galera": {galera.id}, "rpmquality": {rpmquality.id}}
+    requires = {
+        rpmquality.id: ["mariadb", "rpmquality"],
+        mariadb.id: ["galera"],
+        galera.id: [],
+    }
+
+    edges = build_graph(requires, provides)
+    added, removed = update_graph(edges, requires.keys())
+
+    assert edges == {(rpmquality.id, mariadb.id), (mariadb.id, galera.id)}
+    assert (added, removed) == (2, 1)
+    assert list(rpmquality.requires.all()) == [mariadb]
+    assert list(galera.required_by.all()) == [mariadb]
+    assert update_graph(edges, requires.keys()) == (0, 0)
+
+
+def test_dump_provides_merges_repos(scls, repos_root, tmpdir):
+    """Collection provides are merged from sorted per-repo provides"""
+
+    scl = scls["rpmquality"]
+    root = tmpdir.join("repos", scl.slug)
+    root.join("epel-7-x86_64", ".provides").write("bar\nfoo\n", ensure=True)
+    root.join("fedora-30-x86_64", ".provides").write("baz\nfoo\nqux\n", ensure=True)
+    root.join("empty", ".provides").write("", ensure=True)
+
+    provides = scl.dump_provides()
+
+    assert root.join(".provides").read() == "bar\nbaz\nfoo\nqux\n"
+    assert provides == {"bar", "baz", "foo", "qux"}
+    assert set(scl.provides.values_list("name", flat=True)) == provides
+    assert scl.has_provides()
+
+
+def test_has_provides_without_provides(scls, repos_root, tmpdir):
+    """Collection without (dumped) provides has no provides"""
+
+    scl = scls["rpmquality"]
+
+    assert not scl.has_provides()
+    scl.dump_provides()
+    assert not scl.has_provides()
+
+
+def test_changed_provides_request_related(scls, repos_root, tmpdir):
+    """Collections requiring added or removed provides are queued for relations"""
+
+    scl = scls["rpmquality"]
+    scls["mariadb100"].update_requires_index(["bar", "unrelated"])
+    scls["mariadb-galera-5.5-ci"].update_requires_index(["foo"])
+    scl.update_provides_index(["foo", "bar"])
+    tmpdir.join("repos", scl.slug, "epel-7-x86_64", ".provides").write("foo\n", ensure=True)
+
+    scl.dump_provides()
+
+    assert set(RelatedRequest.objects.values_list("scl_id", flat=True)) == {
+        scl.id,
+        scls["mariadb100"].id,
+    }
+
+
+def test_update_relations_of_affected(scls):
+    """Only edges of the given collections are recomputed and requires are stored"""
+
+    rpmquality, mariadb, galera = (
+        scls["rpmquality"],
+        scls["mariadb100"],
+        scls["mariadb-galera-5.5-ci"],
+    )
+    galera.requires.set([rpmquality])
+    mariadb.update_provides_index(["mariadb"])
+    galera.update_provides_index(["galera"])
+
+    added, removed = update_relations({rpmquality.id: ["mariadb", "galera", "bash"]})
+
+    assert (added, removed) == (2, 0)
+    assert set(rpmquality.requires.all()) == {mariadb, galera}
+    assert list(galera.requires.all()) == [rpmquality]
+    assert set(rpmquality.required_names.values_list("name", flat=True)) == {
+        "mariadb",
+        "galera",
+        "bash",
+    }
+
+
+def test_edges_to_unindexed_collections_are_kept(scls, repos_root, monkeypatch):
+    """Missing provides of collections not indexed yet do not remove their relations"""
+
+    rpmquality, mariadb, galera = (
+        scls["rpmquality"],
+        scls["mariadb100"],
+        scls["mariadb-galera-5.5-ci"],
+    )
+    rpmquality.requires.set([mariadb, galera])
+    monkeypatch.setattr(
+        SoftwareCollection, "read_requires", lambda scl, timeout=None: ["mariadb", "galera"]
+    )
+
+    assert update_relations({rpmquality.id: ["mariadb", "galera"]}) == (0, 0)
+    rpmquality.find_related()
+    assert set(rpmquality.requires.all()) == {mariadb, galera}
+
+    # galera is indexed and provides nothing required
+    galera.update_provides_index(["galera-server"])
+    assert update_relations({rpmquality.id: ["mariadb", "galera"]}) == (0, 1)
+    assert list(rpmquality.requires.all()) == [mariadb]
+
+
+def test_migration_indexes_dumped_provides(scls, repos_root, tmpdir):
+    """Provides dumped before the index existed are loaded from the .provides files"""
+
+    migration = import_module("softwarecollections.scls.migrations.0013_providesindex")
+    rpmquality, mariadb = scls["rpmquality"], scls["mariadb100"]
+    tmpdir.join("repos", rpmquality.slug, ".provides").write("bar\nfoo\n", ensure=True)
+    Provide.objects.create(scl=mariadb, name="mariadb")
+    ProvidesIndex.objects.all().delete()
+
+    migration.index_provides(apps, None)
+
+    assert set(rpmquality.provides.values_list("name", flat=True)) == {"bar", "foo"}
+    assert ProvidesIndex.indexed(scl.id for scl in scls.values()) == {rpmquality.id, mariadb.id}
@@ -0,0 +1,75 @@
+"""Tests for reading package dependencies from repository metadata"""
+
+import gzip
+
+import pytest
+from softwarecollections.scls import repodata
+
+PRIMARY = b"""<?xml version="1.0" encoding="UTF-8"?>
+<metadata xmlns="http://linux.duke.edu/metadata/common"
+          xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="2">
+<package type="rpm">
+  <name>foo</name>
+  <location href="foo-1.0-1.noarch.rpm"/>
+  <format>
+    <rpm:provides>
+      <rpm:entry name="foo" flags="EQ" epoch="0" ver="1.0" rel="1"/>
+      <rpm:entry name="config(foo)"/>
+    </rpm:provides>
+    <rpm:requires>
+      <rpm:entry name="bash"/>
+    </rpm:requires>
+  </format>
+</package>
+<package type="rpm">
+  <name>bar</name>
+  <location href="bar-1.0-1.x86_64.rpm"/>
+  <format>
+    <rpm:provides>
+      <rpm:entry name="bar"/>
+    </rpm:provides>
+    <rpm:requires>
+      <rpm:entry name="foo" flags="GE" ver="1.0"/>
+      <rpm:entry name="bash"/>
+    </rpm:requires>
+  </format>
+</package>
+</metadata>
+"""
+
+REPOMD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<repomd xmlns="http://linux.duke.edu/metadata/repo">
+  <revision>1580000000</revision>
+  <data type="primary">
+    <checksum type="sha256">0123456789abcdef</checksum>
+    <location href="repodata/0123-primary.xml.gz"/>
+  </data>
+</repomd>
+"""
+
+
+@pytest.fixture
+def repo_dir(tmpdir):
+    tmpdir.join("repodata/repomd.xml").write_binary(REPOMD, ensure=True)
+    tmpdir.join("repodata/0123-primary.xml.gz").write_binary(gzip.compress(PRIMARY))
+    return tmpdir
+
+
+@pytest.mark.parametrize(
+    "kind,expected",
+    [
+        ("provides", ["foo", "config(foo)", "bar"]),
+        ("requires", ["bash", "foo", "bash"]),
+    ],
+)
+def test_read_dependencies(repo_dir, kind, expected):
+    """Dependencies of all packages are read from local primary.xml"""
+
+    assert list(repodata.read_dependencies(str(repo_dir), kind)) == expected
+
+
+def test_read_dependencies_without_metadata(tmpdir):
+    """Missing metadata are reported"""
+
+    with pytest.raises(FileNotFoundError):
+        list(repodata.read_dependencies(str(tmpdir), "provides"))
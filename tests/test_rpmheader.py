@@ -0,0 +1,115 @@
+"""Tests for in-process RPM header reader"""
+
+import struct
+
+import pytest
+from softwarecollections.scls import rpmheader
+
+
+def make_header(entries):
+    """Serialize header structure from (tag, type, count, data) entries."""
+
+    index, store = b"", b""
+    for tag, kind, count, data in entries:
+        index += struct.pack(">iiii", tag, kind, len(store), count)
+        store += data
+    return (
+        rpmheader.HEADER_MAGIC
+        + b"\0" * 4
+        + struct.pack(">II", len(entries), len(store))
+        + index
+        + store
+    )
+
+
+def make_rpm(name, provides, requires):
+    """Minimal RPM file with the given dependencies and dummy payload."""
+
+    def string_array(values):
+        return b"".join(value.encode("utf-8") + b"\0" for value in values)
+
+    lead = rpmheader.LEAD_MAGIC + b"\0" * (rpmheader.LEAD_SIZE - 4)
+    # signature with odd size to exercise the padding
+    signature = make_header([(1000, rpmheader.RPM_BIN_TYPE, 3, b"sig")])
+    signature += b"\0" * (-len(signature) % 8)
+    header = make_header(
+        [
+            (rpmheader.RPMTAG_NAME, rpmheader.RPM_STRING_TYPE, 1, string_array([name])),
+            (
+                rpmheader.RPMTAG_PROVIDENAME,
+                rpmheader.RPM_STRING_ARRAY_TYPE,
+                len(provides),
+                string_array(provides),
+            ),
+            (
+                rpmheader.RPMTAG_REQUIRENAME,
+                rpmheader.RPM_STRING_ARRAY_TYPE,
+                len(requires),
+                string_array(requires),
+            ),
+        ]
+    )
+    return lead + signature + header + b"payload is never read"
+
+
+def make_corrupted_rpm():
+    """RPM file with integer entry pointing past the end of the file."""
+
+    lead = rpmheader.LEAD_MAGIC + b"\0" * (rpmheader.LEAD_SIZE - 4)
+    signature = make_header([])
+    header = make_header(
+        [(rpmheader.RPMTAG_PROVIDENAME, rpmheader.RPM_INT32_TYPE, 1000, b"\0" * 4)]
+    )
+    return lead + signature + header
+
+
+@pytest.fixture
+def repo_dir(tmpdir):
+    tmpdir.join("foo/foo-1.0-1.noarch.rpm").write_binary(
+        make_rpm("foo", ["foo", "config(foo)"], ["bash", "rpmlib(CompressedFileNames)"]),
+        ensure=True,
+    )
+    tmpdir.join("bar/bar-1.0-1.x86_64.rpm").write_binary(
+        make_rpm("bar", ["bar", "libbar.so.1()(64bit)"], ["foo"]), ensure=True
+    )
+    tmpdir.join("bar/broken.rpm").write_binary(b"not an rpm", ensure=True)
+    tmpdir.join("bar/truncated.rpm").write_binary(
+        make_rpm("truncated", ["truncated"], [])[: rpmheader.LEAD_SIZE + 40], ensure=True
+    )
+    tmpdir.join("bar/corrupted.rpm").write_binary(make_corrupted_rpm(), ensure=True)
+    tmpdir.join("repodata/repomd.xml").write_binary(b"<repomd/>", ensure=True)
+    return tmpdir
+
+
+def test_read_header(repo_dir):
+    """Requested tags are read from the main header"""
+
+    header = rpmheader.read_header(
+        str(repo_dir.join("foo/foo-1.0-1.noarch.rpm")),
+        tags=(rpmheader.RPMTAG_NAME, rpmheader.RPMTAG_PROVIDENAME),
+    )
+
+    assert header == {
+        rpmheader.RPMTAG_NAME: "foo",
+        rpmheader.RPMTAG_PROVIDENAME: ["foo", "config(foo)"],
+    }
+
+
+def test_read_header_rejects_other_files(repo_dir):
+    """Files which are not RPM packages are reported"""
+
+    for name in ("broken", "truncated", "corrupted"):
+        with pytest.raises(rpmheader.RPMHeaderError):
+            rpmheader.read_header(str(repo_dir.join("bar/{}.rpm".format(name))))
+
+
+def test_scan_directory(repo_dir):
+    """All packages in directory tree are scanned, broken ones are skipped"""
+
+    provides = rpmheader.scan(str(repo_dir), rpmheader.RPMTAG_PROVIDENAME)
+    requires = rpmheader.scan(str(repo_dir), rpmheader.RPMTAG_REQUIRENAME)
+
+    assert sorted(provides) == sorted(
+        ["foo", "config(foo)", "bar", "libbar.so.1()(64bit)"]
+    )
+    assert sorted(requires) == sorted(["bash", "rpmlib(CompressedFileNames)", "foo"])
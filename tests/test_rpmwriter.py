@@ -0,0 +1,212 @@
+"""Tests for native writer of release packages"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import subprocess
+
+import pytest
+from softwarecollections.scls import rpmheader, rpmwriter
+from softwarecollections.scls.models import Copr, Repo, SoftwareCollection
+from softwarecollections.scls.rpmheader import LEAD_SIZE, _parse_header
+
+REPO_FILE = rpmwriter.RPMFile(
+    path="/etc/yum.repos.d/test.repo",
+    content=b"[test]\nbaseurl=https://example.com/\n",
+    flags=rpmwriter.RPMFILE_CONFIG | rpmwriter.RPMFILE_NOREPLACE,
+)
+
+
+def build(**kwargs):
+    options = dict(
+        license="BSD",
+        group="System Environment/Base",
+        url="https://example.com",
+        buildtime=1399248000,
+    )
+    options.update(kwargs)
+    return rpmwriter.build_package(
+        "test-release", "1", "2", "Summary", "Description", [REPO_FILE], **options
+    )
+
+
+def split(package):
+    """Split the package into signature, header and payload."""
+
+    signature, end = _parse_header(package, LEAD_SIZE)
+    start = end + (-end % 8)
+    header, end = _parse_header(package, start)
+    return signature, package[start:end], package[end:]
+
+
+def read_cpio(archive):
+    members, offset = {}, 0
+    while True:
+        fields = [int(archive[offset + 6 + 8 * i : offset + 14 + 8 * i], 16) for i in range(13)]
+        name_start = offset + 110
+        name = archive[name_start : name_start + fields[11] - 1].decode()
+        data_start = name_start + fields[11]
+        data_start += -data_start % 4
+        if name == "TRAILER!!!":
+            return members
+        members[name] = (fields[1], archive[data_start : data_start + fields[6]])
+        offset = data_start + fields[6]
+        offset += -offset % 4
+
+
+def test_package_is_readable(tmpdir):
+    """Written package has the expected header and payload"""
+
+    path = str(tmpdir.join("test-release-1-2.noarch.rpm"))
+    rpmwriter.write_package(
+        path,
+        "test-release",
+        "1",
+        "2",
+        "Summary",
+        "Description",
+        [REPO_FILE],
+        license="BSD",
+        group="System Environment/Base",
+        url="https://example.com",
+        buildtime=1399248000,
+    )
+
+    header = rpmheader.read_header(path)
+    assert header[rpmheader.RPMTAG_NAME] == "test-release"
+    assert header[rpmwriter.RPMTAG_ARCH] == "noarch"
+    assert header[rpmwriter.RPMTAG_SOURCERPM] == "test-release-1-2.src.rpm"
+    assert header[rpmwriter.RPMTAG_BASENAMES] == ["test.repo"]
+    assert header[rpmwriter.RPMTAG_DIRNAMES] == ["/etc/yum.repos.d/"]
+    assert header[rpmwriter.RPMTAG_FILEDIGESTS] == [hashlib.sha256(REPO_FILE.content).hexdigest()]
+    assert header[rpmheader.RPMTAG_PROVIDENAME] == ["config(test-release)", "test-release"]
+    assert "rpmlib(FileDigests)" in header[rpmheader.RPMTAG_REQUIRENAME]
+    assert not os.path.exists(path + ".part")
+
+
+@pytest.mark.skipif(
+    not (shutil.which("rpm") and shutil.which("rpm2cpio") and shutil.which("cpio")),
+    reason="rpm tools are not available",
+)
+def test_package_is_accepted_by_rpm(tmpdir):
+    """Written package is queried and unpacked by the rpm tools"""
+
+    path = str(tmpdir.join("test-release-1-2.noarch.rpm"))
+    with open(path, "wb") as f:
+        f.write(build())
+
+    query = subprocess.check_output(
+        ["rpm", "-qp", "--nosignature", "--qf", "%{NAME}-%{VERSION}-%{RELEASE}.%{ARCH}", path]
+    )
+    subprocess.check_call(
+        "rpm2cpio {} | cpio -idm --quiet".format(path), shell=True, cwd=str(tmpdir)
+    )
+
+    assert query.decode() == "test-release-1-2.noarch"
+    assert tmpdir.join("etc/yum.repos.d/test.repo").read_binary() == REPO_FILE.content
+
+
+def test_signature_and_payload():
+    """Signature digests match and payload contains the files"""
+
+    package = build()
+    signature, header, payload = split(package)
+
+    assert package[:4] == rpmheader.LEAD_MAGIC
+    assert signature[rpmwriter.RPMSIGTAG_SIZE] == [len(header) + len(payload)]
+    assert signature[rpmwriter.RPMSIGTAG_MD5] == hashlib.md5(header + payload).digest()
+    assert signature[rpmwriter.RPMSIGTAG_SHA1] == hashlib.sha1(header).hexdigest()
+    assert signature[rpmwriter.RPMSIGTAG_SHA256] == hashlib.sha256(header).hexdigest()
+    assert read_cpio(gzip.decompress(payload)) == {
+        "./etc/yum.repos.d/test.repo": (0o100644, REPO_FILE.content)
+    }
+
+
+def test_region_trailer():
+    """Region trailer refers back to all index entries"""
+
+    _signature, header, _payload = split(build())
+    count, size = int.from_bytes(header[8:12], "big"), int.from_bytes(header[12:16], "big")
+    tag, kind, offset, length = rpmheader.INDEX_ENTRY.unpack_from(header, 16)
+    trailer = rpmheader.INDEX_ENTRY.unpack_from(header, 16 + count * 16 + offset)
+
+    assert (tag, kind, offset + length) == (rpmwriter.RPMTAG_HEADERIMMUTABLE, 7, size)
+    assert trailer == (rpmwriter.RPMTAG_HEADERIMMUTABLE, 7, -count * 16, 16)
+
+
+def test_epel5_variant():
+    """Packages for old rpm use md5 file digests and no sha256 header digest"""
+
+    signature, header, _payload = split(
+        build(digest_algo=rpmwriter.PGPHASHALGO_MD5, sha256_signature=False)
+    )
+    values, _end = _parse_header(header, 0)
+
+    assert rpmwriter.RPMSIGTAG_SHA256 not in signature
+    assert rpmwriter.RPMTAG_FILEDIGESTALGO not in values
+    assert values[rpmwriter.RPMTAG_FILEDIGESTS] == [hashlib.md5(REPO_FILE.content).hexdigest()]
+    assert "rpmlib(FileDigests)" not in values[rpmheader.RPMTAG_REQUIRENAME]
+
+
+def test_reproducible():
+    """Same input gives the same package"""
+
+    assert build() == build()
+    assert build() != build(buildtime=0)
+
+
+@pytest.mark.parametrize(
+    "name,digests",
+    [("epel-7-x86_64", hashlib.sha256), ("epel-5-x86_64", hashlib.md5)],
+)
+def test_repo_release_package(db, settings, tmpdir, name, digests):
+    """Release package of repo is written natively and linked"""
+
+    settings.REPOS_ROOT = str(tmpdir)
+    scl = SoftwareCollection.objects.get(name="rpmquality")
+    repo = Repo.objects.create(
+        slug="{}/{}".format(scl.slug, name),
+        scl=scl,
+        copr=Copr.objects.get(pk=1),
+        name=name,
+        copr_url="https://copr.example.com/" + name,
+    )
+
+    repo.rpmbuild()
+
+    header = rpmheader.read_header(repo.get_rpmfile_symlink_path())
+    config = "".join(
+        [
+            "[{}]\n".format(repo.rpmname),
+            "name={} - {}\n".format(scl.title, name),
+            "baseurl=https://www.softwarecollections.org/repos/{}/{}\n".format(scl.slug, name),
+            "enabled=1\ngpgcheck=0\n",
+        ]
+    )
+    assert header[rpmheader.RPMTAG_NAME] == repo.rpmname
+    assert header[rpmwriter.RPMTAG_FILEDIGESTS] == [digests(config.encode()).hexdigest()]
+    assert header[rpmwriter.RPMTAG_FILEFLAGS] == [17]
+
+
+def test_rebuild_only_when_inputs_change(db, settings, tmpdir):
+    """Release package is rebuilt exactly when its inputs change"""
+
+    settings.REPOS_ROOT = str(tmpdir)
+    scl = SoftwareCollection.objects.get(name="rpmquality")
+    repo = Repo.objects.create(
+        slug=scl.slug + "/epel-7-x86_64",
+        scl=scl,
+        copr=Copr.objects.get(pk=1),
+        name="epel-7-x86_64",
+        copr_url="https://copr.example.com/epel-7-x86_64",
+    )
+    assert repo.needs_rpmbuild()
+
+    repo.rpmbuild()
+
+    repo = Repo.objects.get(id=repo.id)
+    assert repo.rpmbuild_hash
+    assert not repo.needs_rpmbuild()
+    repo.scl.title = "New title"
+    assert repo.needs_rpmbuild()
@@ -0,0 +1,86 @@
+"""Tests for the full-text search of collections"""
+
+import pytest
+from softwarecollections.scls import search
+from softwarecollections.scls.models import SoftwareCollection
+
+
+@pytest.fixture
+def scls(db):
+    return SoftwareCollection.objects.all()
+
+
+def names(queryset):
+    return sorted(scl.name for scl in queryset)
+
+
+def test_fts5_index_is_used(scls):
+    """SQLite test database has the FTS5 index created by migration"""
+
+    assert search.has_fts5()
+
+
+def test_search_by_prefix(scls):
+    """Any word of the query matches as a prefix of a word in name or title"""
+
+    assert names(search.search(scls, "maria")) == ["mariadb-galera-5.5-ci", "mariadb100"]
+    assert names(search.search(scls, "galera rpmq")) == ["mariadb-galera-5.5-ci", "rpmquality"]
+    assert names(search.search(scls, "example")) == []
+
+
+def test_search_description(scls):
+    """Description is searched only on demand"""
+
+    assert names(search.search(scls, "example", description=True)) == ["rpmquality"]
+
+
+def test_search_ignores_syntax(scls):
+    """Operators of the search syntax are not interpreted"""
+
+    assert names(search.search(scls, 'maria" OR NOT*')) == ["mariadb-galera-5.5-ci", "mariadb100"]
+    assert names(search.search(scls, "*")) == names(scls)
+
+
+def test_search_rank(scls):
+    """Match in the title outranks match in the description"""
+
+    SoftwareCollection.objects.filter(name="mariadb100").update(title="Example database")
+
+    results = search.search(scls, "example", description=True).order_by("-" + search.RANK)
+
+    assert [scl.name for scl in results] == ["mariadb100", "rpmquality"]
+
+
+def test_index_follows_changes(scls):
+    """Updated and deleted collections are reindexed"""
+
+    scl = SoftwareCollection.objects.get(name="rpmquality")
+    scl.title = "Quality checker"
+    scl.save()
+
+    assert names(search.search(scls, "checker")) == ["rpmquality"]
+    scl.delete()
+    assert names(search.search(scls, "checker")) == []
+
+
+def test_fallback_search(scls, monkeypatch):
+    """Databases without index are searched by substrings"""
+
+    monkeypatch.setattr(search, "has_fts5", lambda: False)
+
+    assert names(search.search(scls, "db100 rpm")) == ["mariadb100", "rpmquality"]
+
+
+def test_list_ordered_by_relevance(client, scls):
+    """Search results are ordered by relevance by default"""
+
+    SoftwareCollection.objects.update(has_content=True)
+    SoftwareCollection.objects.filter(name="rpmquality").update(title="Galera quality")
+
+    response = client.get("/en/scls/", {"search": "galera"})
+
+    assert response.status_code == 200
+    assert [scl.name for scl in response.context["collections"]] == [
+        "mariadb-galera-5.5-ci",
+        "rpmquality",
+    ]
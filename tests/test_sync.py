@@ -0,0 +1,236 @@
+"""Tests for processing content of synced repos"""
+
+import os
+import shutil
+import threading
+import time
+from subprocess import CalledProcessError
+
+import pytest
+from softwarecollections.scls import models
+from softwarecollections.scls.models import Copr, Repo, SoftwareCollection
+
+NAMES = ["epel-6-x86_64", "epel-7-x86_64", "fedora-30-x86_64"]
+
+
+@pytest.fixture
+def scl(db, settings, tmpdir):
+    settings.REPOS_ROOT = str(tmpdir)
+    scl = SoftwareCollection.objects.get(name="rpmquality")
+    for name in NAMES:
+        Repo.objects.create(
+            slug="{}/{}".format(scl.slug, name),
+            scl=scl,
+            copr=Copr.objects.get(pk=1),
+            name=name,
+            copr_url="https://copr.example.com/" + name,
+        )
+    return scl
+
+
+@pytest.fixture
+def running(monkeypatch):
+    """Replace createrepo by a slow step recording the concurrency."""
+
+    state = {"now": 0, "max": 0, "createrepo": [], "dump_provides": []}
+    lock = threading.Lock()
+
+    def createrepo(repo, timeout=None):
+        with lock:
+            state["createrepo"].append(repo.name)
+            state["now"] += 1
+            state["max"] = max(state["max"], state["now"])
+        time.sleep(0.05)
+        with lock:
+            state["now"] -= 1
+        if repo.name == state.get("fail"):
+            raise RuntimeError("createrepo failed")
+
+    monkeypatch.setattr(Repo, "createrepo", createrepo)
+    monkeypatch.setattr(
+        Repo, "dump_provides", lambda repo, timeout=None: state["dump_provides"].append(repo.name)
+    )
+    monkeypatch.setattr(Repo, "has_provides", lambda repo: True)
+    return state
+
+
+def test_repos_are_processed_in_parallel(scl, running):
+    """All repos are processed at once and saved afterwards"""
+
+    scl.check_repos_content(timeout=None)
+
+    assert running["max"] == len(NAMES)
+    for repo in scl.repos.all():
+        assert repo.has_content
+        assert repo.rpmbuild_hash == repo.get_rpmbuild_hash()
+
+
+def test_content_slots_are_respected(scl, running, monkeypatch):
+    """Shared semaphore limits the number of repos processed at a time"""
+
+    monkeypatch.setattr(models, "_content_slots", threading.BoundedSemaphore(1))
+
+    scl.check_repos_content(timeout=None)
+
+    assert running["max"] == 1
+
+
+def test_failed_repo_is_reported(scl, running):
+    """Failure of one repo does not prevent saving the others"""
+
+    running["fail"] = "epel-7-x86_64"
+
+    with pytest.raises(RuntimeError):
+        scl.check_repos_content(timeout=None)
+
+    assert set(scl.repos.filter(has_content=True).values_list("name", flat=True)) == {
+        "epel-6-x86_64",
+        "fedora-30-x86_64",
+    }
+
+
+@pytest.fixture
+def createrepo_c(monkeypatch):
+    """Fake createrepo_c, which fails the given number of times."""
+
+    state = {"failures": 0, "calls": [], "delays": []}
+
+    def check_call(args, **kwargs):
+        state["calls"].append(args)
+        repo_dir = args[-1]
+        os.makedirs(os.path.join(repo_dir, ".repodata"))
+        if len(state["calls"]) <= state["failures"]:
+            raise CalledProcessError(6, args)
+        shutil.rmtree(os.path.join(repo_dir, "repodata"), ignore_errors=True)
+        os.rename(os.path.join(repo_dir, ".repodata"), os.path.join(repo_dir, "repodata"))
+
+    monkeypatch.setattr(models, "check_call", check_call)
+    monkeypatch.setattr(models.time, "sleep", state["delays"].append)
+    return state
+
+
+@pytest.fixture
+def repo(scl, settings, tmpdir):
+    settings.YUM_CACHE_ROOT = str(tmpdir.join("cache"))
+    repo = scl.repos.get(name="epel-7-x86_64")
+    os.makedirs(os.path.join(repo.get_repo_dir(), "repodata"))
+    return repo
+
+
+def test_createrepo_retries_with_backoff(repo, createrepo_c):
+    """Failed runs are retried after growing delays, using persistent cache"""
+
+    createrepo_c["failures"] = 2
+
+    repo.createrepo()
+
+    assert createrepo_c["delays"] == [1, 2]
+    assert createrepo_c["calls"][-1][-3:] == [
+        "--cachedir",
+        repo.get_cache_dir(),
+        repo.get_repo_dir(),
+    ]
+    assert "--update" in createrepo_c["calls"][-1]
+    assert os.path.isdir(repo.get_cache_dir())
+    assert sorted(os.listdir(repo.get_repo_dir())) == ["createrepo.log", "repodata"]
+
+
+def test_createrepo_failure_keeps_metadata(repo, createrepo_c):
+    """Only the temporary output is removed when all attempts fail"""
+
+    createrepo_c["failures"] = models.CREATEREPO_TRIES
+    open(os.path.join(repo.get_repo_dir(), "repodata", "repomd.xml"), "w").close()
+
+    with pytest.raises(CalledProcessError):
+        repo.createrepo()
+
+    assert len(createrepo_c["calls"]) == models.CREATEREPO_TRIES
+    assert createrepo_c["delays"] == [1, 2, 4, 8]
+    assert os.listdir(os.path.join(repo.get_repo_dir(), "repodata")) == ["repomd.xml"]
+    assert not os.path.exists(os.path.join(repo.get_repo_dir(), ".repodata"))
+
+
+@pytest.fixture
+def upstream(scl, running, monkeypatch):
+    """Fake Copr details and mirror recording the synced repos."""
+
+    copr = Copr.objects.get(pk=1)
+    scl.coprs.add(copr)
+    state = {"last_modified": 1399248000, "repomd": b"<repomd/>", "synced": [], "hook": None}
+
+    def prefetch_copr_details(coprs):
+        for copr in coprs:
+            copr.detail = {
+                "last_modified": state["last_modified"],
+                "yum_repos": {name: "https://copr.example.com/" + name for name in NAMES},
+            }
+
+    class RepoMirror:
+        def __init__(self, url, repo_dir, session=None, log=None):
+            self.url = url
+
+        def fetch_repomd(self):
+            return state["repomd"]
+
+        def sync(self, repomd, executor=None, timeout=None):
+            state["synced"].append(self.url)
+            if state["hook"]:
+                state["hook"]()
+
+    monkeypatch.setattr(models, "prefetch_copr_details", prefetch_copr_details)
+    monkeypatch.setattr(models, "RepoMirror", RepoMirror)
+    return state
+
+
+def test_sync_keeps_concurrent_downloads(scl, upstream):
+    """Downloads counted while the collection is synced are not lost"""
+
+    def download():
+        repo = scl.repos.get(name="epel-7-x86_64")
+        repo.count_download()
+
+    upstream["hook"] = download
+
+    scl.sync()
+
+    assert SoftwareCollection.objects.get(id=scl.id).download_count == len(NAMES)
+    assert scl.repos.get(name="epel-7-x86_64").download_count == len(NAMES)
+
+
+def test_unchanged_repos_are_skipped(scl, upstream, running):
+    """Repos are not processed again unless the copr or the repodata changed"""
+
+    scl.sync()
+    assert sorted(running["createrepo"]) == NAMES
+    assert len(upstream["synced"]) == len(NAMES)
+    assert sorted(running["dump_provides"]) == NAMES
+    del upstream["synced"][:], running["createrepo"][:], running["dump_provides"][:]
+
+    # copr not modified
+    SoftwareCollection.objects.get(id=scl.id).sync()
+    # copr modified, but the repodata is the same
+    upstream["last_modified"] += 60
+    SoftwareCollection.objects.get(id=scl.id).sync()
+
+    assert upstream["synced"] == []
+    assert running["createrepo"] == []
+    assert running["dump_provides"] == []
+
+
+def test_failed_sync_is_retried(scl, upstream, running):
+    """Upstream state is stored only once the content is processed"""
+
+    running["fail"] = "epel-7-x86_64"
+
+    with pytest.raises(RuntimeError):
+        scl.sync()
+
+    assert set(scl.repos.values_list("upstream_checksum", "upstream_modified")) == {("", None)}
+
+    # next run mirrors all the repos again
+    running["fail"] = None
+    del upstream["synced"][:]
+    SoftwareCollection.objects.get(id=scl.id).sync()
+
+    assert len(upstream["synced"]) == len(NAMES)
+    assert not scl.repos.filter(upstream_checksum="").exists()
@@ -0,0 +1,169 @@
+"""Tests for the resident sync daemon"""
+
+import logging
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from flock import LOCK_EX, Flock
+from softwarecollections.scls.management.commands import sclrelated, sclsyncd
+from softwarecollections.scls.models import RelatedRequest, SoftwareCollection, SyncRequest
+
+
+class FakeResult:
+    def __init__(self, func, args):
+        try:
+            self.value, self.error = func(*args), None
+        except Exception as e:
+            self.value, self.error = None, e
+
+    def ready(self):
+        return True
+
+    def wait(self):
+        pass
+
+    def get(self):
+        if self.error:
+            raise self.error
+        return self.value
+
+
+class FakePool:
+    """Runs the jobs synchronously in the calling process."""
+
+    def __init__(self, processes, initializer=None, initargs=()):
+        self.processes = processes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def apply_async(self, func, args):
+        return FakeResult(func, args)
+
+    def map(self, func, iterable):
+        return [func(args) for args in iterable]
+
+
+@pytest.fixture(autouse=True)
+def root_logger():
+    """The command configures logging, restore it for the other tests."""
+
+    root = logging.getLogger()
+    level, handlers = root.level, root.handlers[:]
+    yield root
+    root.setLevel(level)
+    root.handlers[:] = handlers
+
+
+@pytest.fixture
+def synced(db, monkeypatch):
+    """Replace the sync of collections by recording its order."""
+
+    synced = []
+
+    def sync(args):
+        request, timeout = args
+        SyncRequest.objects.filter(pk=request.pk).delete()
+        synced.append(request.scl.slug)
+        if request.scl.name == "mariadb100":
+            raise RuntimeError("sync failed")
+        SoftwareCollection.objects.filter(pk=request.scl_id).update(need_sync=False)
+        RelatedRequest.enqueue([request.scl_id])
+        return request.scl.slug, 0
+
+    monkeypatch.setattr(sclsyncd, "Pool", FakePool)
+    monkeypatch.setattr(sclsyncd, "sync", sync)
+    monkeypatch.setattr(sclrelated, "read_requires", lambda args: (args[0].id, set()))
+    monkeypatch.setattr(sclsyncd, "prefetch_copr_details", lambda coprs: None)
+    return synced
+
+
+def run(tmpdir, **options):
+    options.setdefault("max_procs", 1)
+    call_command("sclsyncd", once=True, lockfile=str(tmpdir.join("lock")), **options)
+
+
+def test_queue_is_drained(synced, tmpdir):
+    """Queued collections are synced in order of the queue, failures are survived"""
+
+    run(tmpdir)
+
+    assert synced == [
+        "hhorak/mariadb-galera-5.5-ci",
+        "hhorak/mariadb100",
+        "hhorak/rpmquality",
+    ]
+    status = sclsyncd.get_status()
+    assert (status["synced"], status["failed"], status["queued"]) == (2, 1, 0)
+    assert status["running"] == []
+    assert status["related"] is not None
+    assert not RelatedRequest.objects.exists()
+
+
+def test_failed_collection_is_not_retried_at_once(synced, tmpdir):
+    """Failed sync is retried after the auto sync interval"""
+
+    run(tmpdir, max_procs=3)
+
+    assert synced.count("hhorak/mariadb100") == 1
+    assert SyncRequest.objects.filter(scl__name="mariadb100").exists()
+
+
+def test_single_instance(synced, tmpdir):
+    """The daemon refuses to start while another one holds the lock"""
+
+    with open(str(tmpdir.join("lock")), "w") as lockfile, Flock(lockfile, LOCK_EX):
+        with pytest.raises(CommandError):
+            run(tmpdir)
+
+    assert synced == []
+
+
+def test_failed_relations_are_retried(synced, tmpdir, monkeypatch):
+    """Requests of relations are put back when the update fails"""
+
+    calls = []
+
+    def update_relations(requires, provides=None):
+        calls.append(set(requires))
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        return 0, 0
+
+    monkeypatch.setattr(sclrelated, "update_relations", update_relations)
+
+    run(tmpdir)
+
+    assert len(calls) == 2
+    assert calls[0] == calls[1] == set(
+        SoftwareCollection.objects.exclude(name="mariadb100").values_list("id", flat=True)
+    )
+    assert not RelatedRequest.objects.exists()
+
+
+def test_failing_polls_are_reported_once(synced, tmpdir, monkeypatch):
+    """Admins are notified of the first failure, not of every poll"""
+
+    polls = []
+    logged = {"exception": 0, "warning": 0}
+
+    def close_old_connections():
+        polls.append(None)
+        if len(polls) <= 3:
+            raise RuntimeError("database unavailable")
+
+    def count(level):
+        return lambda *args, **kwargs: logged.update({level: logged[level] + 1})
+
+    monkeypatch.setattr(sclsyncd, "close_old_connections", close_old_connections)
+    monkeypatch.setattr(sclsyncd.logger, "exception", count("exception"))
+    monkeypatch.setattr(sclsyncd.logger, "warning", count("warning"))
+
+    run(tmpdir)
+
+    assert logged == {"exception": 1, "warning": 2}
+    assert len(synced) == 3
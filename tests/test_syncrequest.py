@@ -0,0 +1,91 @@
+"""Tests for the queue of sync requests"""
+
+from functools import partial
+
+import pytest
+from django.contrib.auth import get_user_model
+from softwarecollections.scls import models
+from softwarecollections.scls.models import (
+    SYNC_PRIORITY_ALL,
+    SYNC_PRIORITY_AUTO,
+    SYNC_PRIORITY_USER,
+    SoftwareCollection,
+    SyncRequest,
+)
+
+
+@pytest.fixture
+def scls(db):
+    """Example collections of one maintainer and two collections of another one"""
+
+    scls = list(SoftwareCollection.objects.order_by("id"))
+    other = get_user_model().objects.create(username="other")
+    for name in ("first", "second"):
+        scls.append(
+            SoftwareCollection.objects.create(
+                name=name, slug="other/" + name, title=name, description=name, maintainer=other
+            )
+        )
+    return scls
+
+
+def test_duplicate_requests_are_merged(scls):
+    """Each collection is queued once with the highest requested priority"""
+
+    SyncRequest.enqueue([scls[0].id, scls[1].id], SYNC_PRIORITY_ALL)
+    SyncRequest.enqueue([scls[0].id], SYNC_PRIORITY_USER)
+    SyncRequest.enqueue([scls[0].id, scls[1].id], SYNC_PRIORITY_AUTO)
+
+    assert dict(SyncRequest.objects.values_list("scl_id", "priority")) == {
+        scls[0].id: SYNC_PRIORITY_USER,
+        scls[1].id: SYNC_PRIORITY_AUTO,
+    }
+
+
+def test_schedule_by_priority_and_maintainer(scls):
+    """Higher priority goes first, maintainers take turns within a priority"""
+
+    hhorak = scls[:3]
+    other = scls[3:]
+    SyncRequest.enqueue([scl.id for scl in hhorak], SYNC_PRIORITY_AUTO)
+    SyncRequest.enqueue([scl.id for scl in other], SYNC_PRIORITY_AUTO)
+    SyncRequest.enqueue([hhorak[2].id], SYNC_PRIORITY_USER)
+
+    scheduled = [request.scl for request in SyncRequest.schedule()]
+
+    assert scheduled == [hhorak[2], hhorak[0], other[0], hhorak[1], other[1]]
+
+
+def test_schedule_selected(scls):
+    """Only requests of the given collections are scheduled"""
+
+    SyncRequest.enqueue([scl.id for scl in scls], SYNC_PRIORITY_ALL)
+
+    assert [request.scl for request in SyncRequest.schedule([scls[1].id])] == [scls[1]]
+
+
+def test_many_collections_are_chunked(scls, monkeypatch):
+    """Collections are queued and scheduled in chunks of bound variables"""
+
+    monkeypatch.setattr(models, "chunks", partial(models.chunks, size=2))
+    SyncRequest.enqueue([scl.id for scl in scls[1:]], SYNC_PRIORITY_ALL)
+    SyncRequest.enqueue([scl.id for scl in scls], SYNC_PRIORITY_AUTO)
+
+    assert dict(SyncRequest.objects.values_list("scl_id", "priority")) == {
+        scl.id: SYNC_PRIORITY_AUTO for scl in scls
+    }
+    assert [request.scl for request in SyncRequest.schedule([scl.id for scl in scls])] == [
+        request.scl for request in SyncRequest.schedule()
+    ]
+
+
+def test_sync_req_view_enqueues(client, scls):
+    """Sync requested by the maintainer is queued with user priority"""
+
+    scl = scls[0]
+    client.force_login(scl.maintainer)
+
+    response = client.post("/en/scls/{}/sync_req/".format(scl.slug), {"need_sync": "1"})
+
+    assert response.status_code == 302
+    assert scl.sync_request.priority == SYNC_PRIORITY_USER